@@ -27,7 +27,6 @@ __date__ = "13/05/2019"
 import os
 import sys
 import json
-import logging
 import pathlib
 import argparse
 
@@ -42,14 +41,13 @@ else:
 edna2TopLevelDir = projectHome / 'edna2'
 sys.path.insert(0, str(edna2TopLevelDir))
 
-from edna2.utils import UtilsLogging
-
 # Parse command line
 
 parser = argparse.ArgumentParser()
 
 parser.add_argument(action='store',
                     dest='taskName',
+                    nargs='?',
                     help='Name of EDNA2 task')
 
 parser.add_argument('--inData', action='store',
@@ -73,6 +71,20 @@ parser.add_argument('--warning', action='store_true',
 parser.add_argument('--error', action='store_true',
                     help='Error log level')
 
+parser.add_argument('--serve', action='store_true',
+                    help='Run as a service accepting task requests on a Unix socket')
+
+parser.add_argument('--socket', action='store',
+                    dest='socketPath',
+                    help='Unix socket of the service (default from the config)')
+
+parser.add_argument('--maxWorkers', action='store',
+                    dest='maxWorkers', type=int,
+                    help='Maximum number of tasks run at the same time by the service')
+
+parser.add_argument('--useService', action='store_true',
+                    help='Send the task to the service if it is running')
+
 results = parser.parse_args()
 
 taskName = results.taskName
@@ -82,36 +94,66 @@ outDataFile = results.outDataFile
 debugLogLevel = results.debug
 warningLogLevel = results.warning
 errorLogLevel = results.error
+serve = results.serve
+socketPath = results.socketPath
+useService = results.useService or socketPath is not None
 
-if taskName is None:
+if taskName is None and not serve:
     parser.print_help()
     sys.exit(1)
 elif (inData is None and inDataFile is None) or \
      (inData is not None and inDataFile is not None):
     inData = '{}'
+elif inDataFile is not None:
+    with open(str(inDataFile)) as f:
+        inData = f.read()
 
-# Set up logging
+# Log level, the logging is only set up when running the task or the service
 
 if errorLogLevel:
-    logger = UtilsLogging.getLogger('ERROR')
+    logLevel = 'ERROR'
 elif warningLogLevel:
-    logger = UtilsLogging.getLogger('WARNING')
+    logLevel = 'WARNING'
 elif debugLogLevel:
-    logger = UtilsLogging.getLogger('DEBUG')
+    logLevel = 'DEBUG'
 else:
-    logger = UtilsLogging.getLogger('INFO')
-
-# Load and run EDNA2 task
-tasks = __import__('tasks.{0}'.format(taskName))
-tasksModule = getattr(tasks, taskName)
-TaskClass = getattr(tasksModule, taskName)
-
-task = TaskClass(inData=json.loads(inData))
-task.execute()
-if task.isFailure():
-    logger.error("Error when executing {0}!".format(taskName))
+    logLevel = 'INFO'
+
+from edna2.utils import UtilsService
+
+if serve:
+    from edna2.utils import UtilsLogging
+    logger = UtilsLogging.getLogger(logLevel)
+    UtilsService.serve(socketPath=socketPath, maxWorkers=results.maxWorkers)
+    sys.exit(0)
+
+if useService and UtilsService.isServerRunning(socketPath):
+    # Run the task in the service, the logging is done by the server
+    response = UtilsService.executeTask(taskName, json.loads(inData),
+                                        socketPath=socketPath)
+    isFailure = response['isFailure']
+    taskOutData = response.get('outData')
+    if 'error' in response:
+        print(response['error'], file=sys.stderr)
+    if isFailure:
+        print("Error when executing {0}!".format(taskName), file=sys.stderr)
 else:
-    outData = json.dumps(task.outData, indent=4)
+    # Load and run EDNA2 task, only the module defining it is imported
+    from edna2.utils import UtilsLogging
+    from edna2.utils import UtilsTaskRegistry
+    logger = UtilsLogging.getLogger(logLevel)
+    TaskClass = UtilsTaskRegistry.getTaskClass(taskName)
+
+    task = TaskClass(inData=json.loads(inData))
+    task.execute()
+    task.waitForWriteBack()
+    isFailure = task.isFailure()
+    taskOutData = task.outData
+    if isFailure:
+        logger.error("Error when executing {0}!".format(taskName))
+
+if not isFailure:
+    outData = json.dumps(taskOutData, indent=4)
     if outDataFile is None:
         print(outData)
     else:
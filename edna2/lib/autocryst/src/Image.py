@@ -29,7 +29,8 @@ import logging
 import numpy as np
 import os
 import json
-import fabio
+
+from edna2.utils import UtilsCBF
 
 
 logger = logging.getLogger('autoCryst')
@@ -52,43 +53,36 @@ class CBFreader(object):
         return
 
     def read_cbfheaders(self):
+        # Only the header block is read, see UtilsCBF
+        cbfHeader = UtilsCBF.readHeader(self.cbf_file)
         self.headers['filename'] = self.cbf_file
         self.headers['dimension'] = []
-        fh = open(self.cbf_file, 'rb')
-        for record in fh:
-            if b'X-Binary-Size-Padding' in record:
-                break
-            if b'Pixel_size' in record:
-                self.headers['pixel_size'] = float(record.decode().split()[2])
-            if b'Detector_distance' in record:
-                self.headers['detector_distance'] = float(record.decode().split()[2])
-            if b'Wavelength' in record:
-                self.headers['photon_energy'] = 12398 / float(record.decode().split()[2])
-            if b'Beam_xy' in record:
-                beam = map(float, record.decode().replace('(', '').replace(')', '').replace(',', '').split()[2:4])
-                beam = list(beam)
-                self.headers['beam_center_x'] = beam[0]
-                self.headers['beam_center_y'] = beam[1]
-            if b'Detector:' in record:
-                self.headers['detector_name'] = record.decode().replace(',', '').split()[2:4]
-            if b'Exposure_time' in record:
-                self.headers['exposure'] = float(record.decode().split()[2])
-            if b'Start_angle' in record:
-                self.headers['starting_angle'] = float(record.decode().split()[2])
-            if b'Angle_increment' in record:
-                self.headers['oscillation_range'] = float(record.decode().split()[2])
-            if b'X-Binary-Size-Fastest-Dimension' in record:
-                self.headers['dimension'].append(int(record.decode().split()[1]))
-            if b'X-Binary-Size-Second-Dimension' in record:
-                self.headers['dimension'].append(int(record.decode().split()[1]))
-            else:
-                pass
-        fh.close()
+        if cbfHeader.pixelSizeX is not None:
+            self.headers['pixel_size'] = cbfHeader.pixelSizeX
+        if cbfHeader.detectorDistance is not None:
+            self.headers['detector_distance'] = cbfHeader.detectorDistance
+        if cbfHeader.wavelength is not None:
+            self.headers['photon_energy'] = 12398 / cbfHeader.wavelength
+        if cbfHeader.beamX is not None:
+            self.headers['beam_center_x'] = cbfHeader.beamX
+            self.headers['beam_center_y'] = cbfHeader.beamY
+        if cbfHeader.detector is not None:
+            self.headers['detector_name'] = cbfHeader.getDetectorName()
+        if cbfHeader.exposureTime is not None:
+            self.headers['exposure'] = cbfHeader.exposureTime
+        if cbfHeader.startAngle is not None:
+            self.headers['starting_angle'] = cbfHeader.startAngle
+        if cbfHeader.angleIncrement is not None:
+            self.headers['oscillation_range'] = cbfHeader.angleIncrement
+        if cbfHeader.fastDimension is not None:
+            self.headers['dimension'].append(cbfHeader.fastDimension)
+        if cbfHeader.slowDimension is not None:
+            self.headers['dimension'].append(cbfHeader.slowDimension)
         return
 
     def read_cbfdata(self):
-        handler = fabio.open(self.cbf_file)
-        self.data = handler.data.flatten()
+        # Decoded by fabio if installed, see UtilsCBF.readImage
+        self.data = UtilsCBF.readImage(self.cbf_file).ravel()
         return
 
     '''
@@ -280,10 +280,10 @@ class AutoCrystFEL(object):
         return command
 
     @staticmethod
-    def write_cell_file(cellinfo):
+    def write_cell_file(cellinfo, cellfile='auto.cell'):
         #  Method to write out crystFEL formatted *.cell file, compatible with other crystFEL programs
         try:
-            cwrite = open('auto.cell', 'w')
+            cwrite = open(cellfile, 'w')
             cwrite.write('CrystFEL unit cell file version 1.0\n\n')
             cwrite.write('lattice_type = %s\n' % cellinfo['lattice'])
             cwrite.write('centering = %s\n' % cellinfo['centering'])
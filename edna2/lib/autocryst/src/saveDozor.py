@@ -38,7 +38,7 @@ import base64
 
 import edna2.lib.autocryst.src.dozor_input as di
 from edna2.lib.autocryst.src.Image import CBFreader
-import edna2.lib.autocryst.ext.fast_array_ext as af
+from edna2.utils import UtilsCBF
 
 logger = logging.getLogger('autoCryst')
 
@@ -321,7 +321,8 @@ class Dozor(object):
             Dozor.stacks['ypos_arr'][i, 0:dozor_lst_dict[i]['nPeaks']] = dozor_lst_dict[i]['PeakYPosRaw']
             Dozor.stacks['peak_int_arr'][i, 0:dozor_lst_dict[i]['nPeaks']] = dozor_lst_dict[i]['PeakTotalIntensity']
         
-        Dozor.stacks['data_stack_3d'] = af.stack3d(cbf_ar, imagesize[0], imagesize[1]) 
+        # Each image is read into its slice of the stack
+        Dozor.stacks['data_stack_3d'] = UtilsCBF.readStack(list(cbf_ar))
         Dozor.stacks['data_stack_3d'] = Dozor.stacks['data_stack_3d'].reshape(size_3d)
         return
 
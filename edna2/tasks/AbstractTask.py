@@ -25,41 +25,217 @@ __date__ = "21/04/2019"
 
 import os
 import json
-import pathlib
+import time
+import asyncio
+import functools
 import traceback
-import jsonschema
+import concurrent.futures
+import threading
 import subprocess
 import multiprocessing
 
 from edna2.utils import UtilsPath
+from edna2.utils import UtilsAsync
+from edna2.utils import UtilsSlurm
+from edna2.utils import UtilsSchema
+from edna2.utils import UtilsScratch
+from edna2.utils import UtilsCache
+from edna2.utils import UtilsConfig
 from edna2.utils import UtilsLogging
+from edna2.utils import UtilsMetrics
+from edna2.utils import UtilsProfile
+from edna2.utils import UtilsTrace
+from edna2.utils import UtilsTransport
 
 logger = UtilsLogging.getLogger()
 
+# Available executors for running a task
+EXECUTOR_PROCESS = 'process'
+EXECUTOR_THREAD = 'thread'
+EXECUTOR_INLINE = 'inline'
+EXECUTOR_ASYNC = 'async'
+LIST_EXECUTOR = [EXECUTOR_PROCESS, EXECUTOR_THREAD, EXECUTOR_INLINE,
+                 EXECUTOR_ASYNC]
+DEFAULT_EXECUTOR = EXECUTOR_PROCESS
+
+# Persistence of inData and outData, see getPersistInOutData
+PERSIST_DIRECTORY = 'directory'
+PERSIST_RUN = 'run'
+PERSIST_NONE = 'none'
+LIST_PERSIST = [PERSIST_DIRECTORY, PERSIST_RUN, PERSIST_NONE]
+RUN_RECORD_FILE_NAME = 'inOutData.jsonl'
+
+# Messages sent from an EDNA2Process child to its parent
+MESSAGE_PARTIAL = 'partial'
+MESSAGE_RESULT = 'result'
+
+# Interval for polling the log file when streaming command line output
+DEFAULT_STREAM_POLL_INTERVAL = 0.1  # seconds
+
 
 class EDNA2Process(multiprocessing.Process):
     """
     See https://stackoverflow.com/a/33599967.
+
+    When the target has finished the child sends one message back to the
+    parent containing the exception (if any) and the value returned by
+    the optional 'getResult' callable. Partial results sent by the child
+    with 'send' before that are passed to the optional 'onPartialResult'
+    callable in the parent while it waits for the final message.
     """
 
     def __init__(self, *args, **kwargs):
+        self._getResult = kwargs.pop('getResult', None)
+        self._onPartialResult = kwargs.pop('onPartialResult', None)
         multiprocessing.Process.__init__(self, *args, **kwargs)
-        self._pconn, self._cconn = multiprocessing.Pipe()
+        self._pconn, self._cconn = multiprocessing.Pipe(duplex=False)
         self._exception = None
+        self._result = None
+        self._hasReceived = False
+
+    def start(self):
+        multiprocessing.Process.start(self)
+        # Only the child should keep the sending end open, otherwise
+        # the parent would never see the end of the pipe
+        self._cconn.close()
 
     def run(self):
+        exception = None
         try:
             multiprocessing.Process.run(self)
-            self._cconn.send(None)
         except Exception as e:
             tb = traceback.format_exc()
-            self._cconn.send((e, tb))
+            exception = (e, tb)
+        result = None
+        if self._getResult is not None:
+            result = self._getResult()
+        try:
+            self._cconn.send((MESSAGE_RESULT, (exception, result)))
+        except Exception as e:
+            # For example an exception which cannot be pickled
+            tb = traceback.format_exc()
+            self._cconn.send(
+                (MESSAGE_RESULT, ((RuntimeError(str(exception or e)), tb),
+                                  None)))
         return
 
+    def send(self, partialResult):
+        # Called in the child process
+        self._cconn.send((MESSAGE_PARTIAL, partialResult))
+
+    def receive(self):
+        # The message must be read before joining, a large message would
+        # otherwise block the child
+        if not self._hasReceived:
+            self._hasReceived = True
+            while True:
+                try:
+                    messageType, message = self._pconn.recv()
+                except EOFError:
+                    messageType = MESSAGE_RESULT
+                    message = (
+                        (RuntimeError(
+                            'Process exited without sending results'), ''),
+                        None
+                    )
+                if messageType == MESSAGE_RESULT:
+                    break
+                if self._onPartialResult is not None:
+                    try:
+                        self._onPartialResult(message)
+                    except Exception as e:
+                        logger.exception(e)
+            self._exception, self._result = message
+            self._pconn.close()
+
+    def join(self, timeout=None):
+        self.receive()
+        multiprocessing.Process.join(self, timeout)
+
+    @property
+    def exception(self):
+        return self._exception
+
+    @property
+    def result(self):
+        return self._result
+
+
+class EDNA2Thread(threading.Thread):
+    """
+    Thread with the same exception handling as EDNA2Process.
+    """
+
+    def __init__(self, *args, **kwargs):
+        threading.Thread.__init__(self, *args, **kwargs)
+        self.daemon = True
+        self._exception = None
+
+    def run(self):
+        try:
+            threading.Thread.run(self)
+        except Exception as e:
+            tb = traceback.format_exc()
+            self._exception = (e, tb)
+
+    @property
+    def exception(self):
+        return self._exception
+
+
+class EDNA2Inline(object):
+    """
+    Runs the target in the calling thread when started, provides the same
+    interface as EDNA2Process and EDNA2Thread.
+    """
+
+    def __init__(self, target=None, args=()):
+        self._target = target
+        self._args = args
+        self._exception = None
+
+    def start(self):
+        try:
+            self._target(*self._args)
+        except Exception as e:
+            tb = traceback.format_exc()
+            self._exception = (e, tb)
+
+    def join(self):
+        pass
+
+    @property
+    def exception(self):
+        return self._exception
+
+
+class EDNA2Async(object):
+    """
+    Runs a coroutine in the event loop shared by the process (see
+    UtilsAsync), provides the same interface as EDNA2Process and
+    EDNA2Thread.
+    """
+
+    def __init__(self, target=None):
+        self._target = target
+        self._exception = None
+        self.future = None
+
+    def start(self):
+        self.future = UtilsAsync.submit(self._run())
+
+    async def _run(self):
+        try:
+            await self._target()
+        except Exception as e:
+            tb = traceback.format_exc()
+            self._exception = (e, tb)
+
+    def join(self):
+        self.future.result()
+
     @property
     def exception(self):
-        if self._pconn.poll():
-            self._exception = self._pconn.recv()
         return self._exception
 
 
@@ -68,60 +244,175 @@ class AbstractTask(object):
     Parent task to all EDNA2 tasks.
     """
     def __init__(self, inData):
-        self._dictInOut = multiprocessing.Manager().dict()
+        # inData and outData are kept as JSON strings, each access decodes
+        # a new object which the caller may modify
+        self._dictInOut = {}
         self._dictInOut['inData'] = json.dumps(inData, default=str)
         self._dictInOut['outData'] = json.dumps({})
         self._dictInOut['isFailure'] = False
-        self._process = EDNA2Process(target=self.executeRun, args=())
+        self._process = None
+        self._executor = None
+        self._useCache = None
+        self._cacheKey = None
+        self._cacheEvent = None
+        self._cacheThread = None
+        self._hasProcessResult = False
+        self._isCacheHit = False
+        self._partialResultCallback = None
+        self._metrics = {}
+        self._traceContext = None
         self._workingDirectory = None
+        self._parentDirectory = None
+        self._useScratch = False
+        self._sharedDirectory = None
+        self._writeBackFuture = None
         self._logFileName = None
-        self._schemaPath = pathlib.Path(__file__).parents[1] / 'schema'
-        self._persistInOutData = True
+        self._schemaPath = UtilsSchema.SCHEMA_PATH
+        self._persistInOutData = None
         self._oldDir = os.getcwd()
 
     def getSchemaUrl(self, schemaName):
-        return 'file://' + str(self._schemaPath / schemaName)
+        return UtilsSchema.getSchemaUrl(schemaName)
 
     def executeRun(self):
+        isProcess = self._executor == EXECUTOR_PROCESS
+        if isProcess:
+            # The metrics of sub-tasks are sent to the parent process
+            UtilsMetrics.startForwarding()
+        usage = UtilsMetrics.getUsage(perThread=not isProcess)
+        try:
+            with UtilsTrace.taskSpan(self, self._traceContext):
+                inData = self.prepareRun()
+                # The current directory is process wide, only change it
+                # if the task runs in its own process and its working
+                # directory already exists (it isn't created for this)
+                if isProcess and self._workingDirectory is not None:
+                    self._oldDir = os.getcwd()
+                    os.chdir(str(self._workingDirectory))
+                    try:
+                        with UtilsProfile.profile(self):
+                            outData = self.run(inData)
+                    finally:
+                        os.chdir(self._oldDir)
+                else:
+                    with UtilsProfile.profile(self):
+                        outData = self.run(inData)
+                self.finishRun(outData)
+        except Exception:
+            if self.getPersistInOutData() == PERSIST_RUN:
+                self.writeRunRecord(None)
+            raise
+        finally:
+            self._metrics.update(UtilsMetrics.getUsageDifference(
+                usage, UtilsMetrics.getUsage(perThread=not isProcess)))
+            # A task process must not exit before its results are written
+            self.startWriteBack()
+            if isProcess:
+                self.waitForWriteBack()
+
+    async def executeRunAsync(self):
+        # Several tasks share the thread of the event loop, only the
+        # wall time is measured
+        startTime = time.perf_counter()
+        try:
+            with UtilsTrace.taskSpan(self, self._traceContext):
+                inData = self.prepareRun()
+                outData = await self.runAsync(inData)
+                self.finishRun(outData)
+        finally:
+            self._metrics['wallTime'] = time.perf_counter() - startTime
+            self.startWriteBack()
+
+    async def runAsync(self, inData):
+        """
+        Asynchronous version of run, used by the 'async' executor. Tasks
+        waiting on I/O should override it, by default run is executed in
+        the default thread pool of the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.run, inData)
+
+    def prepareRun(self):
+        """
+        Validates inData and creates the working directory, returns inData
+        """
         inData = self.getInData()
         hasValidInDataSchema = False
-        hasValidOutDataSchema = False
-        if self.getInDataSchema() is not None:
-            instance = inData
-            schema = self.getInDataSchema()
-            try:
-                jsonschema.validate(instance=instance, schema=schema)
-                hasValidInDataSchema = True
-            except Exception as e:
-                logger.exception(e)
-        else:
+        try:
+            with UtilsTrace.span('validateInData'):
+                UtilsSchema.validate(self, 'inData', inData)
             hasValidInDataSchema = True
-        if hasValidInDataSchema:
-            self._workingDirectory = UtilsPath.getWorkingDirectory(self, inData)
-            self.writeInputData(inData)
-            self._oldDir = os.getcwd()
-            os.chdir(str(self._workingDirectory))
-            outData = self.run(inData)
-            os.chdir(self._oldDir)
-        else:
+        except Exception as e:
+            logger.exception(e)
+        if not hasValidInDataSchema:
             raise RuntimeError("Schema validation error for inData")
-        if self.getOutDataSchema() is not None:
-            instance = outData
-            schema = self.getOutDataSchema()
-            try:
-                jsonschema.validate(instance=instance, schema=schema)
-                hasValidOutDataSchema = True
-            except Exception as e:
-                logger.exception(e)
-        else:
+        # The working directory is only created when needed, see
+        # getWorkingDirectory
+        self._workingDirectory = None
+        self._sharedDirectory = None
+        self._writeBackFuture = None
+        self._parentDirectory = UtilsPath.getParentDirectory(inData)
+        # Jobs submitted to the cluster can't see a node local directory
+        self._useScratch = UtilsScratch.isScratchEnabled(self) and \
+            not inData.get('doSubmit', False)
+        self.writeInputData(inData)
+        return inData
+
+    def finishRun(self, outData):
+        """
+        Validates and writes outData
+        """
+        if self._sharedDirectory is not None:
+            # Paths to result files are valid once they have been moved
+            outData = json.loads(json.dumps(outData, default=str).replace(
+                str(self._workingDirectory), str(self._sharedDirectory)))
+        hasValidOutDataSchema = False
+        try:
+            with UtilsTrace.span('validateOutData'):
+                UtilsSchema.validate(self, 'outData', outData)
             hasValidOutDataSchema = True
+        except Exception as e:
+            logger.exception(e)
         if hasValidOutDataSchema:
-            self.writeOutputData(outData)
+            with UtilsTrace.span('writeOutData'):
+                self.writeOutputData(outData)
         else:
             raise RuntimeError("Schema validation error for outData")
-        if not os.listdir(str(self._workingDirectory)):
+        if self._workingDirectory is not None and \
+                self._sharedDirectory is None and \
+                not os.listdir(str(self._workingDirectory)):
             os.rmdir(str(self._workingDirectory))
 
+    def getResultFilePatterns(self):
+        """
+        Returns the glob patterns of the files moved from the scratch
+        directory to the working directory: the 'scratch_results' entry
+        in the task config (comma separated), otherwise the files written
+        by AbstractTask. Tasks add their own result files.
+        """
+        scratchResults = UtilsConfig.get(self, 'scratch_results')
+        if scratchResults is not None:
+            return [pattern.strip() for pattern in scratchResults.split(',')]
+        return list(UtilsScratch.LIST_DEFAULT_RESULT)
+
+    def startWriteBack(self):
+        # Starts moving the results from the scratch directory, the
+        # working directory is the shared one from now on
+        if self._sharedDirectory is not None:
+            self._writeBackFuture = UtilsScratch.getCopier().submit(
+                self._workingDirectory, self._sharedDirectory,
+                self.getResultFilePatterns())
+            self._workingDirectory = self._sharedDirectory
+            self._sharedDirectory = None
+
+    def waitForWriteBack(self, timeout=None):
+        """
+        Waits until the result files have been moved from the scratch
+        directory, if the task ran in one
+        """
+        if self._writeBackFuture is not None:
+            concurrent.futures.wait([self._writeBackFuture], timeout=timeout)
+
     def getInData(self):
         return json.loads(self._dictInOut['inData'])
 
@@ -136,24 +427,65 @@ class AbstractTask(object):
         self._dictInOut['outData'] = json.dumps(outData, default=str)
     outData = property(getOutData, setOutData)
 
+    def getProcessResult(self):
+        """
+        Called in the child process at the end of a task run with the
+        'process' executor, returns the message sent to the parent.
+        """
+        outData = self._dictInOut['outData'].encode('utf-8')
+        return {
+            'isFailure': self._dictInOut['isFailure'],
+            'outData': UtilsTransport.pack(outData),
+            'metrics': self._metrics,
+            'metricRecords': UtilsMetrics.stopForwarding()
+        }
+
+    def setProcessResult(self, result):
+        self._dictInOut['isFailure'] = result['isFailure']
+        outData = UtilsTransport.unpack(result['outData'])
+        self._dictInOut['outData'] = outData.decode('utf-8')
+        self._metrics.update(result['metrics'])
+        UtilsMetrics.addRecords(result['metricRecords'])
+
     def writeInputData(self, inData):
         # Write input data
-        if self._persistInOutData and self._workingDirectory is not None:
+        if self.getPersistInOutData() == PERSIST_DIRECTORY and \
+                self._parentDirectory is not None:
             jsonName = "inData" + self.__class__.__name__ + ".json"
-            with open(str(self._workingDirectory / jsonName), 'w') as f:
+            with open(str(self.getWorkingDirectory() / jsonName), 'w') as f:
                 f.write(json.dumps(inData, default=str, indent=4))
 
     def writeOutputData(self, outData):
         self.setOutData(outData)
-        if self._persistInOutData and self._workingDirectory is not None:
+        persist = self.getPersistInOutData()
+        if persist == PERSIST_DIRECTORY and self._parentDirectory is not None:
             jsonName = "outData" + self.__class__.__name__ + ".json"
-            with open(str(self._workingDirectory / jsonName), 'w') as f:
+            with open(str(self.getWorkingDirectory() / jsonName), 'w') as f:
                 f.write(json.dumps(outData, default=str, indent=4))
+        elif persist == PERSIST_RUN:
+            self.writeRunRecord(outData)
+
+    def writeRunRecord(self, outData):
+        """
+        Appends inData and outData (None if the run failed) as one line to
+        inOutData.jsonl in the parent directory of the working directory
+        """
+        if self._parentDirectory is not None:
+            record = {
+                'task': self.__class__.__name__,
+                'time': time.time(),
+                'workingDirectory': self._sharedDirectory or
+                self._workingDirectory,
+                'inData': self.getInData(),
+                'outData': outData
+            }
+            UtilsPath.appendJsonLine(
+                self._parentDirectory / RUN_RECORD_FILE_NAME, record)
 
     def getLogPath(self):
         if self._logFileName is None:
             self._logFileName = self.__class__.__name__ + ".log.txt"
-        logPath = self._workingDirectory / self._logFileName
+        logPath = self.getWorkingDirectory() / self._logFileName
         return logPath
 
     def setLogFileName(self, logFileName):
@@ -168,85 +500,61 @@ class AbstractTask(object):
         return log
 
     def runCommandLine(self, commandLine, logPath=None, listCommand=None,
-                       ignoreErrors=False, doSubmit=False):
+                       ignoreErrors=False, doSubmit=False, lineCallback=None):
+        """
+        Runs a command line in the working directory, stdout is written to
+        the log file and stderr to <jobName>.err.txt. If lineCallback is
+        given it is called with each line of the log file while the
+        command is running.
+        """
         if logPath is None:
             logPath = self.getLogPath()
-        logFileName = os.path.basename(logPath)
+        commandName = commandLine.split(' ')[0]
+        commandLine, logFileName = self.prepareCommandLine(
+            commandLine, logPath, listCommand)
         # Fix problem with /mntdirect
         jobName = self.__class__.__name__
-        errorLogFileName = jobName + ".err.txt"
-        commandLine += ' 1>{0} 2>{1}'.format(logFileName, errorLogFileName)
-        if listCommand is not None:
-            commandLine += ' << EOF-EDNA2\n'
-            for command in listCommand:
-                commandLine += command + '\n'
-            commandLine += "EOF-EDNA2"
-        commandLogFileName = jobName + ".commandLine.txt"
-        commandLinePath = self._workingDirectory / commandLogFileName
-        with open(str(commandLinePath), 'w') as f:
-            f.write(commandLine)
         if doSubmit:
-            workingDir = str(self._workingDirectory)
-            if workingDir.startswith("/mntdirect/_users"):
-                workingDir = workingDir.replace("/mntdirect/_users", "/home/esrf")
-            nodes = 1
-            core = 20
-            time = '0:10:00'
-            script = '#!/bin/bash\n'
-            script += '#SBATCH --job-name="{0}"\n'.format(jobName)
-            script += '#SBATCH --partition={0}\n'.format('mx')
-            mem = 2000  # 2 Gb memory by default
-            script += '#SBATCH --mem={0}\n'.format(mem)
-            script += '#SBATCH --nodes={0}\n'.format(nodes)
-            script += '#SBATCH --cpus-per-task={0}\n'.format(core)
-            script += '#SBATCH --time={0}\n'.format(time)
-            script += '#SBATCH --chdir={0}\n'.format(workingDir)
-            script += '#SBATCH --output=stdout.txt\n'
-            script += '#SBATCH --error=stderr.txt\n'
-            script += commandLine + '\n'
-            shellFile = self._workingDirectory / (jobName + '_slurm.sh')
-            with open(str(shellFile), 'w') as f:
-                f.write(script)
-                f.close()
-            shellFile.chmod(0o755)
-            slurmCommandLine = 'sbatch --wait {0}'.format(shellFile)
-            pipes = subprocess.Popen(
-                slurmCommandLine,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                close_fds=True,
-                cwd=str(self._workingDirectory)
-            )
-            stdout, stderr = pipes.communicate()
-            slurmLogPath = self._workingDirectory / (jobName + '_slurm.log')
-            slurmErrorLogPath = self._workingDirectory / (jobName + '_slurm.error.log')
-            if len(stdout) > 0:
-                log = str(stdout, 'utf-8')
-                with open(str(slurmLogPath), 'w') as f:
-                    f.write(log)
-            if len(stderr) > 0:
-                if not ignoreErrors:
-                    logger.warning("Error messages from command {0}".format(
-                        commandLine.split(' ')[0])
-                    )
-                with open(str(slurmErrorLogPath), 'w') as f:
-                    f.write(str(stderr, 'utf-8'))
-            if pipes.returncode != 0:
+            workingDir = str(self.getWorkingDirectory())
+            # The compute nodes see /mntdirect/_users as /home/esrf
+            clusterWorkingDir = workingDir
+            if clusterWorkingDir.startswith("/mntdirect/_users"):
+                clusterWorkingDir = clusterWorkingDir.replace(
+                    "/mntdirect/_users", "/home/esrf")
+            resources = UtilsSlurm.getResources(self, self.getInData())
+            with UtilsTrace.span('command', command=commandName,
+                                 doSubmit=True):
+                job = UtilsSlurm.getSubmitter().submit(
+                    jobName, commandLine, workingDir, resources,
+                    clusterDirectory=clusterWorkingDir)
+                if lineCallback is not None:
+                    self.followLog(job, logFileName, lineCallback)
+                job.wait()
+            slurmErrorLogPath = self.getWorkingDirectory() / (jobName + '_slurm.error.log')
+            if slurmErrorLogPath.exists() and \
+                    slurmErrorLogPath.stat().st_size > 0 and not ignoreErrors:
+                logger.warning("Error messages from command {0}".format(
+                    commandLine.split(' ')[0])
+                )
+            if job.returncode != 0:
                 # Error!
-                warningMessage = "{0}, code {1}".format(stderr, pipes.returncode)
+                warningMessage = "{0}, code {1}".format(
+                    job.errorMessage, job.returncode)
                 logger.warning(warningMessage)
                 # raise RuntimeError(errorMessage)
         else:
-            pipes = subprocess.Popen(
-                commandLine,
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                close_fds=True,
-                cwd=str(self._workingDirectory)
-            )
-            stdout, stderr = pipes.communicate()
+            with UtilsTrace.span('command', command=commandName):
+                pipes = subprocess.Popen(
+                    commandLine,
+                    shell=True,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    close_fds=True,
+                    cwd=str(self.getWorkingDirectory())
+                )
+                if lineCallback is not None:
+                    self.followLog(pipes, logFileName, lineCallback)
+                stdout, stderr = pipes.communicate()
             if len(stdout) > 0:
                 log = str(stdout, 'utf-8')
                 with open(str(logPath), 'w') as f:
@@ -257,7 +565,7 @@ class AbstractTask(object):
                         commandLine.split(' ')[0])
                     )
                 errorLogFileName = jobName + ".err.txt"
-                errorLogPath = self._workingDirectory / errorLogFileName
+                errorLogPath = self.getWorkingDirectory() / errorLogFileName
                 with open(str(errorLogPath), 'w') as f:
                     f.write(str(stderr, 'utf-8'))
             if pipes.returncode != 0:
@@ -265,25 +573,370 @@ class AbstractTask(object):
                 errorMessage = "{0}, code {1}".format(stderr, pipes.returncode)
                 raise RuntimeError(errorMessage)
 
+    def prepareCommandLine(self, commandLine, logPath, listCommand=None):
+        """
+        Adds the redirections and the standard input to a command line and
+        writes it to <jobName>.commandLine.txt, returns the complete
+        command line and the name of the log file
+        """
+        logFileName = os.path.basename(logPath)
+        jobName = self.__class__.__name__
+        errorLogFileName = jobName + ".err.txt"
+        commandLine += ' 1>{0} 2>{1}'.format(logFileName, errorLogFileName)
+        if listCommand is not None:
+            commandLine += ' << EOF-EDNA2\n'
+            for command in listCommand:
+                commandLine += command + '\n'
+            commandLine += "EOF-EDNA2"
+        commandLogFileName = jobName + ".commandLine.txt"
+        commandLinePath = self.getWorkingDirectory() / commandLogFileName
+        with open(str(commandLinePath), 'w') as f:
+            f.write(commandLine)
+        return commandLine, logFileName
+
+    async def runCommandLineAsync(self, commandLine, logPath=None,
+                                  listCommand=None, ignoreErrors=False,
+                                  doSubmit=False):
+        """
+        Asynchronous version of runCommandLine, the command is started with
+        asyncio.create_subprocess_exec and awaited without blocking the
+        event loop
+        """
+        if doSubmit:
+            # The Slurm submitter has its own polling thread
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, functools.partial(
+                self.runCommandLine, commandLine, logPath=logPath,
+                listCommand=listCommand, ignoreErrors=ignoreErrors,
+                doSubmit=True))
+            return
+        if logPath is None:
+            logPath = self.getLogPath()
+        commandLine, logFileName = self.prepareCommandLine(
+            commandLine, logPath, listCommand)
+        jobName = self.__class__.__name__
+        with UtilsTrace.span('command', command=commandLine.split(' ')[0]):
+            process = await asyncio.create_subprocess_exec(
+                '/bin/sh', '-c', commandLine,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=str(self.getWorkingDirectory())
+            )
+            stdout, stderr = await process.communicate()
+        if len(stdout) > 0:
+            with open(str(logPath), 'w') as f:
+                f.write(str(stdout, 'utf-8'))
+        if len(stderr) > 0:
+            if not ignoreErrors:
+                logger.warning("Error messages from command {0}".format(
+                    commandLine.split(' ')[0])
+                )
+            errorLogPath = self.getWorkingDirectory() / (jobName + ".err.txt")
+            with open(str(errorLogPath), 'w') as f:
+                f.write(str(stderr, 'utf-8'))
+        if process.returncode != 0:
+            # Error!
+            errorMessage = "{0}, code {1}".format(stderr, process.returncode)
+            raise RuntimeError(errorMessage)
+
+    def followLog(self, pipes, logFileName, lineCallback):
+        """
+        Reads the log file written by a running command and calls
+        lineCallback for each complete line, until the command has
+        finished and the whole file has been read. Only the current line
+        is kept in memory.
+        """
+        logPath = self.getWorkingDirectory() / logFileName
+        pollInterval = float(UtilsConfig.get(
+            self, 'stream_poll_interval', DEFAULT_STREAM_POLL_INTERVAL))
+        logFile = None
+        partialLine = ''
+        try:
+            while True:
+                isFinished = pipes.poll() is not None
+                if logFile is None and logPath.exists():
+                    logFile = open(str(logPath), errors='replace')
+                line = '' if logFile is None else logFile.readline()
+                if line.endswith('\n'):
+                    self._callLineCallback(lineCallback,
+                                           partialLine + line[:-1])
+                    partialLine = ''
+                elif line != '':
+                    partialLine += line
+                elif isFinished:
+                    # Nothing more will be written
+                    if partialLine != '':
+                        self._callLineCallback(lineCallback, partialLine)
+                    break
+                else:
+                    time.sleep(pollInterval)
+        finally:
+            if logFile is not None:
+                logFile.close()
+
+    @staticmethod
+    def _callLineCallback(lineCallback, line):
+        try:
+            lineCallback(line)
+        except Exception as e:
+            logger.exception(e)
+
+    def setPartialResultCallback(self, partialResultCallback):
+        """
+        Sets a callable receiving the partial results emitted by the task
+        while it is running. In process mode it is called in the parent
+        process, from join().
+        """
+        self._partialResultCallback = partialResultCallback
+
+    def emitPartialResult(self, partialResult):
+        """
+        Makes a (JSON serialisable) partial result available while the task
+        is running: it is appended to <jobName>.partial.jsonl in the working
+        directory and passed to the partial result callback, if any.
+        """
+        jobName = self.__class__.__name__
+        partialResultPath = self.getWorkingDirectory() / (jobName + '.partial.jsonl')
+        with open(str(partialResultPath), 'a') as f:
+            f.write(json.dumps(partialResult, default=str) + '\n')
+        if self._executor == EXECUTOR_PROCESS and \
+                multiprocessing.current_process() is self._process:
+            # Running in the child process, forward to the parent
+            self._process.send(partialResult)
+        elif self._partialResultCallback is not None:
+            try:
+                self._partialResultCallback(partialResult)
+            except Exception as e:
+                logger.exception(e)
+
     def onError(self):
         pass
 
-    def start(self):
+    def getExecutor(self):
+        """
+        Returns the executor used for running the task: the one set with
+        setExecutor, otherwise the 'executor' entry in the task config,
+        otherwise 'process'.
+        """
+        executor = self._executor
+        if executor is None:
+            executor = UtilsConfig.get(self, 'executor', DEFAULT_EXECUTOR)
+        return executor
+
+    def setExecutor(self, executor):
+        if executor not in LIST_EXECUTOR:
+            raise RuntimeError('Unknown executor: "{0}"'.format(executor))
+        self._executor = executor
+
+    def isCacheEnabled(self):
+        """
+        Returns True if results are cached: set with setUseCache, otherwise
+        the 'cache' entry in the task config (default False).
+        """
+        useCache = self._useCache
+        if useCache is None:
+            useCache = str(UtilsConfig.get(self, 'cache', False)).lower()
+            useCache = useCache in ['true', 'yes', '1']
+        return useCache
+
+    def setUseCache(self, value):
+        self._useCache = value
+
+    def getCacheInputFiles(self, inData):
+        """
+        Returns the paths of the input files which are not given as
+        absolute paths in inData, e.g. images given by a template. They
+        are part of the cache key, also before they exist.
+        """
+        return []
+
+    def isCacheHit(self):
+        return self._isCacheHit
+
+    def start(self, executor=None):
+        if executor is not None:
+            self.setExecutor(executor)
+        else:
+            self.setExecutor(self.getExecutor())
+        self._setTraceContext()
+        self._isCacheHit = False
+        self._cacheKey = None
+        self._cacheEvent = None
+        if self.isCacheEnabled():
+            cacheKey = UtilsCache.getCacheKey(self)
+            outData, event = UtilsCache.getCache().acquire(cacheKey)
+            if outData is not None:
+                # Cache hit, nothing to run
+                self._dictInOut['outData'] = outData
+                self._isCacheHit = True
+                return
+            elif event is not None:
+                # An identical request is running, wait for it in join
+                self._cacheEvent = event
+                self._cacheKey = cacheKey
+                return
+            self._cacheKey = cacheKey
+        try:
+            self.startExecutor()
+        except Exception:
+            # Don't leave identical requests waiting for this one
+            self._releaseCacheKey(None)
+            raise
+
+    def _setTraceContext(self):
+        # A sub-task started while a traced task is running gets the
+        # context of the calling span in its inData
+        inDataJson = self._dictInOut['inData']
+        if '"{0}"'.format(UtilsTrace.TRACE_CONTEXT) in inDataJson:
+            inData = json.loads(inDataJson)
+            self._traceContext = inData.get(UtilsTrace.TRACE_CONTEXT)
+        else:
+            self._traceContext = UtilsTrace.getCurrentContext()
+            if self._traceContext is not None:
+                inData = json.loads(inDataJson)
+                inData[UtilsTrace.TRACE_CONTEXT] = self._traceContext
+                self.setInData(inData)
+
+    def startExecutor(self):
+        self._cacheThread = None
+        self._hasProcessResult = False
+        if self._executor == EXECUTOR_PROCESS:
+            # Parse the task config and compile the validators before
+            # forking so that the child process inherits them
+            UtilsConfig.getTaskConfig(self.__class__.__name__)
+            UtilsSchema.getValidator(self, 'inData')
+            UtilsSchema.getValidator(self, 'outData')
+            self._process = EDNA2Process(
+                target=self.executeRun, args=(),
+                getResult=self.getProcessResult,
+                onPartialResult=self._partialResultCallback)
+        elif self._executor == EXECUTOR_THREAD:
+            self._process = EDNA2Thread(target=self._executeRunAndRelease,
+                                        args=())
+        elif self._executor == EXECUTOR_ASYNC:
+            self._process = EDNA2Async(target=self._executeRunAsyncAndRelease)
+        else:
+            self._process = EDNA2Inline(target=self._executeRunAndRelease,
+                                        args=())
         self._process.start()
+        if self._executor == EXECUTOR_PROCESS and self._cacheKey is not None:
+            # The result is released as soon as the process has finished,
+            # identical requests don't depend on this task being joined
+            self._cacheThread = threading.Thread(
+                target=self._releaseCacheKeyAfterProcess)
+            self._cacheThread.daemon = True
+            self._cacheThread.start()
+
+    def _executeRunAndRelease(self):
+        try:
+            self.executeRun()
+        except Exception:
+            self._releaseCacheKey(None)
+            raise
+        self._releaseCacheKey(self._getCacheableOutData())
+
+    async def _executeRunAsyncAndRelease(self):
+        try:
+            await self.executeRunAsync()
+        except Exception:
+            self._releaseCacheKey(None)
+            raise
+        self._releaseCacheKey(self._getCacheableOutData())
+
+    def _releaseCacheKeyAfterProcess(self):
+        outData = None
+        try:
+            self._process.receive()
+            if self._process.exception is None:
+                self._setProcessResultOnce()
+                outData = self._getCacheableOutData()
+        finally:
+            self._releaseCacheKey(outData)
+
+    def _setProcessResultOnce(self):
+        if not self._hasProcessResult and self._process.result is not None:
+            self._hasProcessResult = True
+            self.setProcessResult(self._process.result)
+
+    def _getCacheableOutData(self):
+        # Only successful results are cached
+        if self.isSuccess():
+            return self._dictInOut['outData']
+        return None
+
+    def _releaseCacheKey(self, outData):
+        cacheKey = self._cacheKey
+        self._cacheKey = None
+        if cacheKey is not None:
+            UtilsCache.getCache().release(cacheKey, outData)
 
     def join(self):
+        if self._isCacheHit:
+            return
+        if self._cacheEvent is not None:
+            self._cacheEvent.wait()
+            if self._getCachedResult():
+                return
+            # The other request failed, run this one
+            self.startExecutor()
         self._process.join()
+        if self._cacheThread is not None:
+            self._cacheThread.join()
+        self._endExecutor()
+
+    def _getCachedResult(self):
+        # Called once the identical request this task waited for is done
+        self._cacheEvent = None
+        outData = UtilsCache.getCache().get(self._cacheKey)
+        self._cacheKey = None
+        if outData is not None:
+            self._dictInOut['outData'] = outData
+            self._isCacheHit = True
+        return self._isCacheHit
+
+    def _endExecutor(self):
+        if self._executor == EXECUTOR_PROCESS:
+            self._setProcessResultOnce()
         if self._process.exception:
             error, trace = self._process.exception
             logger.error(error)
             logger.error(trace)
             self._dictInOut['isFailure'] = True
             self.onError()
+        UtilsMetrics.recordTask(self.__class__.__name__, self.getMetrics(),
+                                isFailure=self.isFailure())
 
-    def execute(self):
-        self.start()
+    def execute(self, executor=None):
+        self.start(executor=executor)
         self.join()
 
+    async def executeAsync(self):
+        """
+        Coroutine running the task with the 'async' executor, for awaiting
+        tasks from asynchronous code
+        """
+        self.start(executor=EXECUTOR_ASYNC)
+        if self._isCacheHit:
+            return
+        if self._cacheEvent is not None:
+            # An identical request is running, wait without blocking the loop
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._cacheEvent.wait)
+            if self._getCachedResult():
+                return
+            self.startExecutor()
+        await asyncio.wrap_future(self._process.future)
+        self._endExecutor()
+
+    def getMetrics(self):
+        """
+        Returns the metrics of the last run, see UtilsMetrics
+        """
+        return dict(self._metrics)
+
+    def setMetric(self, name, value):
+        self._metrics[name] = value
+
     def setFailure(self):
         self._dictInOut['isFailure'] = True
 
@@ -294,6 +947,21 @@ class AbstractTask(object):
         return not self.isFailure()
 
     def getWorkingDirectory(self):
+        """
+        Returns the working directory of the running task. It is created on
+        the first call, tasks which don't write files (and don't persist
+        inData / outData in it) never create it.
+        """
+        if self._workingDirectory is None and \
+                self._parentDirectory is not None:
+            with UtilsTrace.span('createWorkingDirectory'):
+                self._workingDirectory = UtilsPath.createWorkingDirectory(
+                    self, self._parentDirectory)
+                if self._useScratch:
+                    # Results are moved to the shared directory at the end
+                    self._sharedDirectory = self._workingDirectory
+                    self._workingDirectory = \
+                        UtilsScratch.createScratchDirectory(self)
         return self._workingDirectory
 
     def setWorkingDirectory(self, inData):
@@ -305,5 +973,28 @@ class AbstractTask(object):
     def getOutDataSchema(self):
         return None
 
+    def getPersistInOutData(self):
+        """
+        Returns how inData and outData are persisted: set with
+        setPersistInOutData, otherwise the 'persist' entry in the task
+        config:
+        - 'directory' (default): inData<Task>.json and outData<Task>.json
+          in the working directory
+        - 'run': one line per run in inOutData.jsonl in the parent
+          directory, for many small tasks
+        - 'none'
+        """
+        persist = self._persistInOutData
+        if persist is None:
+            persist = UtilsConfig.get(self, 'persist', PERSIST_DIRECTORY)
+        return persist
+
     def setPersistInOutData(self, value):
+        # True and False are kept for backward compatibility
+        if value is True:
+            value = PERSIST_DIRECTORY
+        elif value is False:
+            value = PERSIST_NONE
+        if value not in LIST_PERSIST:
+            raise RuntimeError('Unknown persistence: "{0}"'.format(value))
         self._persistInOutData = value
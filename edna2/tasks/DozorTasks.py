@@ -22,18 +22,17 @@ import os
 import json
 from builtins import RuntimeError
 
-import numpy
 import shlex
-import distro
 import shutil
 import base64
 import pathlib
 import tempfile
-
-import matplotlib
-import matplotlib.pyplot as plt
+import contextvars
+import concurrent.futures
 
 from edna2.tasks.AbstractTask import AbstractTask
+from edna2.tasks.AbstractTask import EXECUTOR_INLINE
+from edna2.tasks.AbstractTask import EXECUTOR_THREAD
 from edna2.tasks.H5ToCBFTask import H5ToCBFTask
 from edna2.tasks.ReadImageHeader import ReadImageHeader
 from edna2.tasks.ISPyBTasks import ISPyBRetrieveDataCollection
@@ -41,6 +40,7 @@ from edna2.tasks.ISPyBTasks import ISPyBRetrieveDataCollection
 from edna2.utils import UtilsPath
 from edna2.utils import UtilsImage
 from edna2.utils import UtilsConfig
+from edna2.utils import UtilsTrace
 from edna2.utils import UtilsLogging
 from edna2.utils import UtilsDetector
 
@@ -76,6 +76,10 @@ IY_MAX_EIGER_4M = 1140
 DEFAULT_FRACTION_POLARIZATION = 0.99
 DEFAULT_IMAGE_STEP = 1
 MAX_BATCH_SIZE = 5000
+# Batches run at the same time by one ControlDozor. Kept small: several
+# ControlDozor tasks already run in parallel, e.g. ImageQualityIndicators
+# runs up to one per core through the task scheduler
+DEFAULT_MAX_WORKERS = 4
 
 
 class ExecDozor(AbstractTask):  # pylint: disable=too-many-instance-attributes
@@ -134,6 +138,12 @@ class ExecDozor(AbstractTask):  # pylint: disable=too-many-instance-attributes
             },
         }
 
+    def getCacheInputFiles(self, inData):
+        template = self.getImageTemplate(inData)
+        firstImageNumber = inData['firstImageNumber']
+        return [template.format(imageNumber) for imageNumber in range(
+            firstImageNumber, firstImageNumber + inData['numberImages'])]
+
     def run(self, inData):
         doSubmit = inData.get('doSubmit', False)
         commands = self.generateCommands(inData)
@@ -153,12 +163,33 @@ class ExecDozor(AbstractTask):  # pylint: disable=too-many-instance-attributes
         else:
             commandLine += ' -p dozor.dat'
         self.setLogFileName('dozor.log')
-        self.runCommandLine(commandLine, doSubmit=doSubmit)
-        log = self.getLog()
-        outData = self.parseOutput(inData, log,
-                                   workingDir=self.getWorkingDirectory())
+        # Emit the results for each image as soon as dozor writes them
+        workingDirectory = self.getWorkingDirectory()
+        template = self.getImageTemplate(inData)
+        lineNumber = 0
+
+        def emitImageDozor(line):
+            nonlocal lineNumber
+            lineNumber += 1
+            # Same as parseOutput: skip the six first lines
+            if lineNumber > 6:
+                imageDozor = self.parseOutputLine(
+                    inData, line, template, workingDir=workingDirectory)
+                if imageDozor is not None:
+                    self.emitPartialResult({'imageDozor': [imageDozor]})
+
+        self.runCommandLine(commandLine, doSubmit=doSubmit,
+                            lineCallback=emitImageDozor)
+        with UtilsTrace.span('parseOutput'):
+            log = self.getLog()
+            outData = self.parseOutput(inData, log,
+                                       workingDir=self.getWorkingDirectory())
         return outData
 
+    def getResultFilePatterns(self):
+        return AbstractTask.getResultFilePatterns(self) + \
+            ['dozor.dat', 'dozor.log', '*.spot']
+
     def generateCommands(self, inData):
         """
         This method creates the input file for dozor
@@ -256,85 +287,14 @@ class ExecDozor(AbstractTask):  # pylint: disable=too-many-instance-attributes
         resultDozor = {
             'imageDozor': []  # list of dict. each dict contains spotFile and Image_path
         }
-        # Create template for image name
-        template = inData['nameTemplateImage']
-        noWildCards = template.count('?')
-        template = template.replace('?'*noWildCards,
-                                    '{0:0'+str(noWildCards) + '}')
+        template = self.getImageTemplate(inData)
         # Skip the four first lines
         listOutput = output.split('\n')[6:]
 
         for line in listOutput:
-            # Remove '|'
-            listLine = shlex.split(line.replace('|', ' '))
-            if len(listLine) > 0 and listLine[0].isdigit():
-                imageDozor = {}
-                imageNumber = int(listLine[0])
-                overlap = inData.get('overlap', 0.0)
-                angle = inData['startingAngle'] + \
-                    (imageNumber - inData['firstImageNumber']) * \
-                    (inData['oscillationRange'] - overlap) + \
-                    inData['oscillationRange'] / 2.0
-                imageDozor['number'] = imageNumber
-                imageDozor['image'] = template.format(imageNumber)
-                imageDozor['angle'] = angle
-                imageDozor['spotsNumOf'] = None
-                imageDozor['spotsIntAver'] = None
-                imageDozor['spotsResolution'] = None
-                imageDozor['mainScore'] = None
-                imageDozor['spotScore'] = None
-                imageDozor['visibleResolution'] = 40
-                try:
-                    if listLine[5].startswith('-') or len(listLine) < 11:
-                        imageDozor['spotsNumOf'] = \
-                            int(listLine[1])
-                        imageDozor['spotsIntAver'] = \
-                            self.parseDouble(listLine[2])
-                        imageDozor['spotsRFactor'] = \
-                            self.parseDouble(listLine[3])
-                        imageDozor['spotsResolution'] = \
-                            self.parseDouble(listLine[4])
-                        imageDozor['mainScore'] = \
-                            self.parseDouble(listLine[8])
-                        imageDozor['spotScore'] = \
-                            self.parseDouble(listLine[9])
-                        imageDozor['visibleResolution'] = \
-                            self.parseDouble(listLine[10])
-                    else:
-                        imageDozor['spotsNumOf'] = \
-                            int(listLine[1])
-                        imageDozor['spotsIntAver'] = \
-                            self.parseDouble(listLine[2])
-                        imageDozor['spotsRfactor'] = \
-                            self.parseDouble(listLine[3])
-                        imageDozor['spotsResolution'] = \
-                            self.parseDouble(listLine[4])
-                        imageDozor['powderWilsonScale'] = \
-                            self.parseDouble(listLine[5])
-                        imageDozor['powderWilsonBfactor'] = \
-                            self.parseDouble(listLine[6])
-                        imageDozor['powderWilsonResolution'] = \
-                            self.parseDouble(listLine[7])
-                        imageDozor['powderWilsonCorrelation'] = \
-                            self.parseDouble(listLine[8])
-                        imageDozor['powderWilsonRfactor'] = \
-                            self.parseDouble(listLine[9])
-                        imageDozor['mainScore'] = \
-                            self.parseDouble(listLine[10])
-                        imageDozor['spotScore'] = \
-                            self.parseDouble(listLine[11])
-                        imageDozor['visibleResolution'] = \
-                            self.parseDouble(listLine[12])
-                except Exception as e:
-                    logger.warning('Exception caught when parsing Dozor log!')
-                    logger.warning(e)
-                # ExecDozor spot file
-                if workingDir is not None:
-                    spotFile = os.path.join(str(workingDir),
-                                            '%05d.spot' % imageDozor['number'])
-                    if os.path.exists(spotFile):
-                        imageDozor['spotFile'] = spotFile
-#                #print imageDozor['marshal()
+            imageDozor = self.parseOutputLine(inData, line, template,
+                                              workingDir=workingDir)
+            if imageDozor is not None:
                 resultDozor['imageDozor'].append(imageDozor)
             elif line.startswith('h'):
                 resultDozor['halfDoseTime'] = line.split('=')[1].split()[0]
@@ -348,6 +308,93 @@ class ExecDozor(AbstractTask):  # pylint: disable=too-many-instance-attributes
                                                                 workingDir)
         return resultDozor
 
+    @classmethod
+    def getImageTemplate(cls, inData):
+        # Create template for image name
+        template = inData['nameTemplateImage']
+        noWildCards = template.count('?')
+        template = template.replace('?'*noWildCards,
+                                    '{0:0'+str(noWildCards) + '}')
+        return template
+
+    @classmethod
+    def parseOutputLine(cls, inData, line, template, workingDir=None):
+        """
+        Returns the imageDozor dictionary for one line of dozor output,
+        or None if the line doesn't contain image results
+        """
+        # Remove '|'
+        listLine = shlex.split(line.replace('|', ' '))
+        if len(listLine) == 0 or not listLine[0].isdigit():
+            return None
+        imageDozor = {}
+        imageNumber = int(listLine[0])
+        overlap = inData.get('overlap', 0.0)
+        angle = inData['startingAngle'] + \
+            (imageNumber - inData['firstImageNumber']) * \
+            (inData['oscillationRange'] - overlap) + \
+            inData['oscillationRange'] / 2.0
+        imageDozor['number'] = imageNumber
+        imageDozor['image'] = template.format(imageNumber)
+        imageDozor['angle'] = angle
+        imageDozor['spotsNumOf'] = None
+        imageDozor['spotsIntAver'] = None
+        imageDozor['spotsResolution'] = None
+        imageDozor['mainScore'] = None
+        imageDozor['spotScore'] = None
+        imageDozor['visibleResolution'] = 40
+        try:
+            if listLine[5].startswith('-') or len(listLine) < 11:
+                imageDozor['spotsNumOf'] = \
+                    int(listLine[1])
+                imageDozor['spotsIntAver'] = \
+                    cls.parseDouble(listLine[2])
+                imageDozor['spotsRFactor'] = \
+                    cls.parseDouble(listLine[3])
+                imageDozor['spotsResolution'] = \
+                    cls.parseDouble(listLine[4])
+                imageDozor['mainScore'] = \
+                    cls.parseDouble(listLine[8])
+                imageDozor['spotScore'] = \
+                    cls.parseDouble(listLine[9])
+                imageDozor['visibleResolution'] = \
+                    cls.parseDouble(listLine[10])
+            else:
+                imageDozor['spotsNumOf'] = \
+                    int(listLine[1])
+                imageDozor['spotsIntAver'] = \
+                    cls.parseDouble(listLine[2])
+                imageDozor['spotsRfactor'] = \
+                    cls.parseDouble(listLine[3])
+                imageDozor['spotsResolution'] = \
+                    cls.parseDouble(listLine[4])
+                imageDozor['powderWilsonScale'] = \
+                    cls.parseDouble(listLine[5])
+                imageDozor['powderWilsonBfactor'] = \
+                    cls.parseDouble(listLine[6])
+                imageDozor['powderWilsonResolution'] = \
+                    cls.parseDouble(listLine[7])
+                imageDozor['powderWilsonCorrelation'] = \
+                    cls.parseDouble(listLine[8])
+                imageDozor['powderWilsonRfactor'] = \
+                    cls.parseDouble(listLine[9])
+                imageDozor['mainScore'] = \
+                    cls.parseDouble(listLine[10])
+                imageDozor['spotScore'] = \
+                    cls.parseDouble(listLine[11])
+                imageDozor['visibleResolution'] = \
+                    cls.parseDouble(listLine[12])
+        except Exception as e:
+            logger.warning('Exception caught when parsing Dozor log!')
+            logger.warning(e)
+        # ExecDozor spot file
+        if workingDir is not None:
+            spotFile = os.path.join(str(workingDir),
+                                    '%05d.spot' % imageDozor['number'])
+            if os.path.exists(spotFile):
+                imageDozor['spotFile'] = spotFile
+        return imageDozor
+
     @classmethod
     def parseDouble(cls, value):
         returnValue = None
@@ -360,6 +407,8 @@ class ExecDozor(AbstractTask):  # pylint: disable=too-many-instance-attributes
 
     @classmethod
     def generatePngPlots(cls, plotmtvFile, workingDir):
+        # matplotlib is slow to import, only load it for plotting
+        import matplotlib.pyplot as plt
         listXSFile = []
         # Create plot dictionary
         with open(str(plotmtvFile)) as f:
@@ -465,6 +514,7 @@ class ExecDozor(AbstractTask):  # pylint: disable=too-many-instance-attributes
         if doSubmit:
             libraryName += '_ubuntu_20.04'
         else:
+            import distro
             idName, version, codename = distro.linux_distribution()
             if 'Debian' in idName:
                 libraryName += '_debian_'
@@ -528,7 +578,18 @@ class ControlDozor(AbstractTask):
             },
         }
 
+    def getCacheInputFiles(self, inData):
+        if inData.get('image'):
+            return list(inData['image'])
+        elif 'template' in inData:
+            return UtilsImage.getImagePaths(
+                inData['directory'], inData['template'],
+                int(inData['startNo']), int(inData['endNo']))
+        return []
+
     def run(self, inData):
+        # numpy is only needed for reading the spot files
+        import numpy
         outData = {}
         hasHdf5Prefix = False
         detectorType = None
@@ -560,40 +621,69 @@ class ControlDozor(AbstractTask):
         #         cbfTempDir=cbfTempDir
         #     )
         outData['imageQualityIndicators'] = []
-        for listBatch in listAllBatches:
-            outDataDozor, detectorType = self.runDozorTask(
-                inData=inData,
-                dictImage=dictImage,
-                listBatch=listBatch,
-                overlap=overlap,
-                workingDirectory=str(self.getWorkingDirectory()),
-                hasHdf5Prefix=hasHdf5Prefix,
-                hasOverlap=self.hasOverlap
-            )
-            if outDataDozor is not None:
-                for imageDozor in outDataDozor['imageDozor']:
-                    imageQualityIndicators = {
-                        'angle': imageDozor['angle'],
-                        'number': imageDozor['number'],
-                        'image': imageDozor['image'],
-                        'dozorScore': imageDozor['mainScore'],
-                        'dozorSpotScore': imageDozor['spotScore'],
-                        'dozorSpotsNumOf': imageDozor['spotsNumOf'],
-                        'dozorSpotsIntAver': imageDozor['spotsIntAver'],
-                        'dozorSpotsResolution': imageDozor['spotsResolution'],
-                        'dozorVisibleResolution': imageDozor['visibleResolution'],
-                    }
-                    if 'spotFile' in imageDozor:
-                        if os.path.exists(imageDozor['spotFile']):
-                            spotFile = imageDozor['spotFile']
-                            imageQualityIndicators['dozorSpotFile'] = spotFile
-                            numpyArray = numpy.loadtxt(spotFile, skiprows=3)
-                            imageQualityIndicators['dozorSpotList'] = \
-                                base64.b64encode(numpyArray.tostring()).decode('utf-8')
-                            imageQualityIndicators['dozorSpotListShape'] = \
-                                list(numpyArray.shape)
-                    outData['imageQualityIndicators'].append(imageQualityIndicators)
-            # Make plot if we have a data collection id
+        # Batches run concurrently, each worker waits for its dozor job.
+        # The header is read once per header file: all batches of an HDF5
+        # collection share the master file.
+        maxWorkers = int(UtilsConfig.get(
+            self, 'maxWorkers', DEFAULT_MAX_WORKERS))
+        maxWorkers = max(1, min(maxWorkers, len(listAllBatches)))
+        workingDirectory = str(self.getWorkingDirectory())
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=maxWorkers,
+                thread_name_prefix='ControlDozor') as executor:
+            dictHeader = {}
+            for listBatch in listAllBatches:
+                headerImagePath = self.getHeaderImagePath(
+                    dictImage[listBatch[0]])
+                if headerImagePath not in dictHeader:
+                    dictHeader[headerImagePath] = executor.submit(
+                        contextvars.copy_context().run,
+                        self.readHeader, headerImagePath)
+            listFutureDozor = []
+            for listBatch in listAllBatches:
+                headerImagePath = self.getHeaderImagePath(
+                    dictImage[listBatch[0]])
+                listFutureDozor.append(executor.submit(
+                    contextvars.copy_context().run,
+                    self.runDozorTask,
+                    inData=inData,
+                    dictImage=dictImage,
+                    listBatch=listBatch,
+                    overlap=overlap,
+                    workingDirectory=workingDirectory,
+                    hasHdf5Prefix=hasHdf5Prefix,
+                    hasOverlap=self.hasOverlap,
+                    futureHeader=dictHeader[headerImagePath]
+                ))
+            # Results are merged in batch, i.e. image, order
+            for futureDozor in listFutureDozor:
+                outDataDozor, detectorType = futureDozor.result()
+                if outDataDozor is not None:
+                    for imageDozor in outDataDozor['imageDozor']:
+                        imageQualityIndicators = {
+                            'angle': imageDozor['angle'],
+                            'number': imageDozor['number'],
+                            'image': imageDozor['image'],
+                            'dozorScore': imageDozor['mainScore'],
+                            'dozorSpotScore': imageDozor['spotScore'],
+                            'dozorSpotsNumOf': imageDozor['spotsNumOf'],
+                            'dozorSpotsIntAver': imageDozor['spotsIntAver'],
+                            'dozorSpotsResolution': imageDozor['spotsResolution'],
+                            'dozorVisibleResolution': imageDozor['visibleResolution'],
+                        }
+                        if 'spotFile' in imageDozor:
+                            if os.path.exists(imageDozor['spotFile']):
+                                spotFile = imageDozor['spotFile']
+                                imageQualityIndicators['dozorSpotFile'] = spotFile
+                                numpyArray = numpy.loadtxt(spotFile, skiprows=3)
+                                imageQualityIndicators['dozorSpotList'] = \
+                                    base64.b64encode(numpyArray.tostring()).decode('utf-8')
+                                imageQualityIndicators['dozorSpotListShape'] = \
+                                    list(numpyArray.shape)
+                        outData['imageQualityIndicators'].append(imageQualityIndicators)
+        outData['imageQualityIndicators'].sort(
+            key=lambda imageQualityIndicators: imageQualityIndicators['number'])
+        # Make plot if we have a data collection id
         if 'dataCollectionId' in inData:
             self.makePlot(inData['dataCollectionId'], outData, self.getWorkingDirectory())
         #            xsDataResultControlDozor.halfDoseTime = edPluginDozor.dataOutput.halfDoseTime
@@ -617,7 +707,7 @@ class ControlDozor(AbstractTask):
                 'dataCollectionId': inData['dataCollectionId']
             }
             ispybTask = ISPyBRetrieveDataCollection(inData=ispybInData)
-            ispybTask.execute()
+            ispybTask.execute(executor=EXECUTOR_INLINE)
             dataCollection = ispybTask.outData
             batchSize = UtilsConfig.get('ControlDozor', 'batchSize')
             if batchSize is None:
@@ -640,10 +730,38 @@ class ControlDozor(AbstractTask):
             dictImage = self.createImageDict(inData)
         return batchSize, dictImage
 
+    @classmethod
+    def getHeaderImagePath(cls, image):
+        """
+        Returns the file containing the header of an image: the image
+        itself or, for HDF5 data, the master file
+        """
+        if image.endswith('h5'):
+            prefix = UtilsImage.getPrefix(image)
+            directory = pathlib.Path(image).parent
+            hdf5ImageNumber = 1
+            if UtilsConfig.isEMBL():
+                fileName = '{0}_master.h5'.format(prefix)
+            else:
+                fileName = '{0}_{1}_master.h5'.format(prefix, hdf5ImageNumber)
+            image = str(directory / fileName)
+        return image
+
+    @classmethod
+    def readHeader(cls, image):
+        # Same output as a ReadImageHeader task, without running one
+        return {
+            'subWedge': ReadImageHeader.readImageHeaders([image])
+        }
+
     @classmethod
     def runDozorTask(cls, inData, dictImage, listBatch,
                      overlap, workingDirectory,
-                     hasHdf5Prefix, hasOverlap):
+                     hasHdf5Prefix, hasOverlap, futureHeader=None):
+        """
+        Runs dozor for a batch of images. futureHeader is an optional
+        future of the header (see readHeader) shared with other batches.
+        """
         doSubmit = inData.get('doSubmit', False)
         outDataDozor = None
         image = dictImage[listBatch[0]]
@@ -652,20 +770,10 @@ class ControlDozor(AbstractTask):
         imageNumber = UtilsImage.getImageNumber(image)
         if image.endswith('h5'):
             hasHdf5Prefix = True
-            prefix = UtilsImage.getPrefix(image)
-            directory = pathlib.Path(image).parent
-            hdf5ImageNumber = 1
-            if UtilsConfig.isEMBL():
-                fileName = '{0}_master.h5'.format(prefix)
-            else:
-                fileName = '{0}_{1}_master.h5'.format(prefix, hdf5ImageNumber)
-            image = directory / fileName
-        inDataReadHeader = {
-            'imagePath': [image]
-        }
-        controlHeader = ReadImageHeader(inData=inDataReadHeader)
-        controlHeader.execute()
-        outDataHeader = controlHeader.outData
+        if futureHeader is not None:
+            outDataHeader = futureHeader.result()
+        else:
+            outDataHeader = cls.readHeader(cls.getHeaderImagePath(image))
         subWedge = outDataHeader['subWedge'][0]
         experimentalCondition = subWedge['experimentalCondition']
         beam = experimentalCondition['beam']
@@ -703,7 +811,14 @@ class ControlDozor(AbstractTask):
         if 'radiationDamage' in inData:
             inDataDozor['radiationDamage'] = inData['radiationDamage']
         dozor = ExecDozor(inData=inDataDozor)
-        dozor.execute()
+        if doSubmit:
+            # Run in a thread so that dozor jobs from concurrent batches
+            # are grouped into the same Slurm job arrays
+            dozor.execute(executor=EXECUTOR_THREAD)
+        else:
+            dozor.execute()
+        # The spot files are read by the caller
+        dozor.waitForWriteBack()
         if not dozor.isFailure():
             outDataDozor = dozor.outData
         return outDataDozor, detectorType
@@ -972,7 +1087,7 @@ plot '{dozorCsvFileName}' using 1:3 title 'Number of spots' axes x1y1 with point
     @classmethod
     def convertToCBF(cls, dictImage, listAllBatches,
                      doRadiationDamage=False, hasOverlap=False,
-                     cbfTempDir=None):
+                     cbfTempDir=None, workingDirectory=None):
         # Find start and end image number
         startImage = None
         endImage = None
@@ -999,6 +1114,7 @@ plot '{dozorCsvFileName}' using 1:3 title 'Number of spots' axes x1y1 with point
                 outDataH5ToCBF = json.loads(h5ToCBF.outData().open().read())
                 newDict['image'] = outDataH5ToCBF['outputCBFFile']
         else:
+            listFrame = []
             listH5ToCBF = []
             directory = os.path.dirname(dictImage[listAllBatches[0][0]])
             for batch in listAllBatches:
@@ -1018,8 +1134,10 @@ plot '{dozorCsvFileName}' using 1:3 title 'Number of spots' axes x1y1 with point
                     }
                 if cbfTempDir is not None:
                     inDataH5ToCBF['forcedOutputDirectory'] = cbfTempDir
-                h5ToCBF = H5ToCBFTask(inData=inDataH5ToCBF)
+                if workingDirectory is not None:
+                    inDataH5ToCBF['workingDirectory'] = str(workingDirectory)
                 if doRadiationDamage:
+                    h5ToCBF = H5ToCBFTask(inData=inDataH5ToCBF)
                     h5ToCBF.execute()
                     if h5ToCBF.outData is not None and h5ToCBF.outData['outputCBFFileTemplate'] is not None:
                         outputCBFFileTemplate = h5ToCBF.outData['outputCBFFileTemplate']
@@ -1030,9 +1148,20 @@ plot '{dozorCsvFileName}' using 1:3 title 'Number of spots' axes x1y1 with point
                             os.rename(oldPath, newPath)
                             # newDict[newImageNumber] = XSDataFile(XSDataString(newPath))
                     hasHdf5Prefix = False
-                else:
+                elif H5ToCBFTask.isUsingEiger2cbf():
+                    # One eiger2cbf run per batch
+                    h5ToCBF = H5ToCBFTask(inData=inDataH5ToCBF)
                     h5ToCBF.start()
                     listH5ToCBF.append(h5ToCBF)
+                else:
+                    hdf5File = pathlib.Path(inDataH5ToCBF['hdf5File'])
+                    masterFile, startImageNumber, endImageNumber, cbfFilePath = \
+                        H5ToCBFTask.getImageRangeParameters(
+                            inDataH5ToCBF, hdf5File.parent,
+                            UtilsImage.getPrefix(hdf5File), hdf5File)
+                    listFrame += H5ToCBFTask.getFramesInRange(
+                        startImageNumber, endImageNumber, cbfFilePath)
+                    template = str(cbfFilePath) + '{0:06d}.cbf'
             for h5ToCBF in listH5ToCBF:
                 h5ToCBF.join()
                 outDataH5ToCBF = h5ToCBF.outData
@@ -1041,6 +1170,11 @@ plot '{dozorCsvFileName}' using 1:3 title 'Number of spots' axes x1y1 with point
                     template = template.replace('######', '{0:06d}')
                     for image in dictImage:
                         newDict[image] = template.format(image)
+            if listFrame:
+                # All batches are converted in process by one bounded pool
+                H5ToCBFTask.convertFrames(masterFile, listFrame)
+                for image in dictImage:
+                    newDict[image] = template.format(image)
         return newDict, hasHdf5Prefix
 #
 #    def sendMessageToMXCuBE(self, _strMessage, level="info"):
@@ -32,6 +32,7 @@ import pathlib
 from edna2.tasks.AbstractTask import AbstractTask
 
 from edna2.utils import UtilsImage
+from edna2.utils import UtilsEiger
 from edna2.utils import UtilsConfig
 from edna2.utils import UtilsLogging
 
@@ -67,24 +68,80 @@ class H5ToCBFTask(AbstractTask):
         hdf5File = pathlib.Path(inData['hdf5File'])
         directory = hdf5File.parent
         prefix = UtilsImage.getPrefix(hdf5File)
-        if 'imageNumber'in inData:
-            commandLine, cbfFile = self.generateCommandsWithImageNumber(
-                inData, directory, prefix, hdf5File)
+        if 'imageNumber' in inData:
+            masterFile, imageNumberInHdf5File, cbfFile = \
+                self.getImageNumberParameters(
+                    inData, directory, prefix, hdf5File)
+            listFrame = [(imageNumberInHdf5File, cbfFile)]
             outData['outputCBFFile'] = str(cbfFile)
         elif 'startImageNumber' in inData and 'endImageNumber' in inData:
-            commandLine, template = self.generateCommandsWithImageRange(
-                inData, directory, prefix, hdf5File)
-            outData['outputCBFFileTemplate'] = template
+            masterFile, startImageNumber, endImageNumber, cbfFilePath = \
+                self.getImageRangeParameters(
+                    inData, directory, prefix, hdf5File)
+            listFrame = self.getFramesInRange(
+                startImageNumber, endImageNumber, cbfFilePath)
+            outData['outputCBFFileTemplate'] = \
+                self.getCBFFileTemplate(cbfFilePath)
+        else:
+            raise RuntimeError(
+                'H5ToCBFTask: neither imageNumber nor startImageNumber and '
+                'endImageNumber in inData')
         self.setLogFileName('h5ToCBF.log')
-        self.runCommandLine('eiger2cbf ' + commandLine, ignoreErrors=True)
+        if self.isUsingEiger2cbf():
+            if 'imageNumber' in inData:
+                commandLine = self.getImageNumberCommandLine(
+                    masterFile, imageNumberInHdf5File, cbfFile)
+            else:
+                commandLine = self.getImageRangeCommandLine(
+                    masterFile, startImageNumber, endImageNumber, cbfFilePath)
+            self.runCommandLine('eiger2cbf ' + commandLine, ignoreErrors=True)
+        else:
+            self.convertFrames(masterFile, listFrame)
         return outData
 
+    @staticmethod
+    def isUsingEiger2cbf():
+        """
+        True if the conversion is done by the eiger2cbf program
+        ('useEiger2cbf' in the H5ToCBFTask config), otherwise it is done
+        in process
+        """
+        useEiger2cbf = UtilsConfig.get('H5ToCBFTask', 'useEiger2cbf', False)
+        return str(useEiger2cbf).lower() == 'true'
+
+    @staticmethod
+    def convertFrames(masterFile, listFrame):
+        """
+        Converts the (image number, CBF file) frames of a master file in
+        process, with at most 'maxWorkers' (H5ToCBFTask config) threads
+        """
+        maxWorkers = UtilsConfig.get('H5ToCBFTask', 'maxWorkers')
+        return UtilsEiger.convertToCBF(
+            masterFile, listFrame,
+            maxWorkers=int(maxWorkers) if maxWorkers else None)
+
     @classmethod
     def generateCommandsWithImageNumber(cls, inData, directory, prefix,
                                         hdf5File):
         """
         This method creates a list of commands for the converter
         """
+        masterFile, imageNumberInHdf5File, cbfFile = \
+            cls.getImageNumberParameters(inData, directory, prefix, hdf5File)
+        commandLine = cls.getImageNumberCommandLine(
+            masterFile, imageNumberInHdf5File, cbfFile)
+        return commandLine, cbfFile
+
+    @staticmethod
+    def getImageNumberCommandLine(masterFile, imageNumberInHdf5File, cbfFile):
+        return "{0} {1} {2}".format(masterFile, imageNumberInHdf5File, cbfFile)
+
+    @classmethod
+    def getImageNumberParameters(cls, inData, directory, prefix, hdf5File):
+        """
+        Returns the master file, the image number in the master file and
+        the CBF file of a single image conversion
+        """
         imageNumber = inData['imageNumber']
         if 'hdf5ImageNumber' in inData:
             hdf5ImageNumber = inData['hdf5ImageNumber']
@@ -113,13 +170,33 @@ class H5ToCBFTask(AbstractTask):
             if not forcedOutputDirectory.exists():
                 forcedOutputDirectory.mkdir(parents=True, mode=0o755)
             cbfFile = forcedOutputDirectory / cbfFileName
-        commandLine = "{0} {1} {2}".format(
-            masterFile, imageNumberInHdf5File, cbfFile
-        )
-        return commandLine, cbfFile
+        return masterFile, imageNumberInHdf5File, cbfFile
 
     @classmethod
     def generateCommandsWithImageRange(cls, inData, directory, prefix, hdf5File):
+        masterFile, startImageNumber, endImageNumber, cbfFilePath = \
+            cls.getImageRangeParameters(inData, directory, prefix, hdf5File)
+        commandLine = cls.getImageRangeCommandLine(
+            masterFile, startImageNumber, endImageNumber, cbfFilePath)
+        cbfFileTemplate = cls.getCBFFileTemplate(cbfFilePath)
+        return commandLine, cbfFileTemplate
+
+    @staticmethod
+    def getImageRangeCommandLine(masterFile, startImageNumber, endImageNumber,
+                                 cbfFilePath):
+        return "{0} {1}:{2} {3}".format(
+            masterFile, startImageNumber, endImageNumber, cbfFilePath)
+
+    @staticmethod
+    def getCBFFileTemplate(cbfFilePath):
+        return str(cbfFilePath) + "######.cbf"
+
+    @classmethod
+    def getImageRangeParameters(cls, inData, directory, prefix, hdf5File):
+        """
+        Returns the master file, the first and last image numbers and the
+        prefix of the CBF files of an image range conversion
+        """
         startImageNumber = inData['startImageNumber']
         endImageNumber = inData['endImageNumber']
         if 'hdf5ImageNumber' in inData:
@@ -140,9 +217,14 @@ class H5ToCBFTask(AbstractTask):
             cbfFilePath = forcedOutputDirectory / cbfFileNamePrefix
         else:
             cbfFilePath = directory / cbfFileNamePrefix
-        commandLine = "{0} {1}:{2} {3}".format(
-            masterFile, startImageNumber, endImageNumber, cbfFilePath)
-        cbfFileTemplate = str(cbfFilePath) + "######.cbf"
-        return commandLine, cbfFileTemplate
-
+        return masterFile, startImageNumber, endImageNumber, cbfFilePath
 
+    @staticmethod
+    def getFramesInRange(startImageNumber, endImageNumber, cbfFilePath):
+        """
+        Returns the (image number, CBF file) pairs of an image range, the
+        CBF files being named as by eiger2cbf
+        """
+        return [(imageNumber,
+                 '{0}{1:06d}.cbf'.format(cbfFilePath, imageNumber))
+                for imageNumber in range(startImageNumber, endImageNumber + 1)]
@@ -29,11 +29,9 @@ __date__ = '21/04/2019'
 #     EDPluginISPyBRetrieveDataCollectionv1_4.py
 
 
-from suds.client import Client
-from suds.transport.http import HttpAuthenticated
-
 import os
 import gzip
+import asyncio
 import pathlib
 
 from edna2.utils import UtilsConfig
@@ -41,6 +39,7 @@ from edna2.utils import UtilsLogging
 from edna2.utils import UtilsIspyb
 
 from edna2.tasks.AbstractTask import AbstractTask
+from edna2.tasks.AbstractTask import EXECUTOR_INLINE
 
 logger = UtilsLogging.getLogger()
 
@@ -48,6 +47,9 @@ logger = UtilsLogging.getLogger()
 class ISPyBRetrieveDataCollection(AbstractTask):
 
     def run(self, inData):
+        # The SOAP client is only needed by this task
+        from suds.client import Client
+        from suds.transport.http import HttpAuthenticated
         dictConfig = UtilsConfig.getTaskConfig('ISPyB')
         username = dictConfig['username']
         password = dictConfig['password']
@@ -221,7 +223,7 @@ class GetListAutoprocessingResults(AbstractTask):
                 inData=inDataGetListIntegration
             )
             getListAutoprocIntegration.setPersistInOutData(False)
-            getListAutoprocIntegration.execute()
+            getListAutoprocIntegration.execute(executor=EXECUTOR_INLINE)
             resultAutoprocIntegration = getListAutoprocIntegration.outData
             if 'error' in resultAutoprocIntegration:
                 urlError = resultAutoprocIntegration['error']
@@ -243,7 +245,7 @@ class GetListAutoprocessingResults(AbstractTask):
                             inData=inDataGetListAttachment
                         )
                         getListAutoprocAttachment.setPersistInOutData(False)
-                        getListAutoprocAttachment.execute()
+                        getListAutoprocAttachment.execute(executor=EXECUTOR_INLINE)
                         resultAutoprocAttachment = getListAutoprocAttachment.outData
                         if 'error' in resultAutoprocAttachment:
                             urlError = resultAutoprocAttachment['error']
@@ -300,30 +302,51 @@ class RetrieveAttachmentFiles(AbstractTask):
     #     }
 
     def run(self, inData):
-        urlError = None
-        listPath = []
+        listRawDataFromUrl = [
+            UtilsIspyb.getRawDataFromURL(self.getAttachmentUrl(inData, dictAttachment))
+            for dictAttachment in inData['attachment']
+        ]
+        return self.saveAttachments(inData, listRawDataFromUrl)
+
+    async def runAsync(self, inData):
+        # Download all attachments concurrently
+        loop = asyncio.get_running_loop()
+        listRawDataFromUrl = await asyncio.gather(*[
+            loop.run_in_executor(None, UtilsIspyb.getRawDataFromURL,
+                                 self.getAttachmentUrl(inData, dictAttachment))
+            for dictAttachment in inData['attachment']
+        ])
+        return self.saveAttachments(inData, listRawDataFromUrl)
+
+    @staticmethod
+    def getAttachmentUrl(inData, dictAttachment):
         token = inData['token']
         proposal = inData['proposal']
-        listAttachment = inData['attachment']
         dictConfig = UtilsConfig.getTaskConfig('ISPyB')
         restUrl = dictConfig['ispyb_ws_url'] + '/rest'
         # proposal/MX2112/mx/autoprocintegration/autoprocattachmentid/21494689/get
-        for dictAttachment in listAttachment:
-            attachmentId = dictAttachment['id']
+        attachmentId = dictAttachment['id']
+        ispybWebServiceURL = os.path.join(
+            restUrl, token, 'proposal', str(proposal), 'mx',
+            'autoprocintegration', 'autoprocattachmentid', str(attachmentId),
+            'get')
+        return ispybWebServiceURL
+
+    def saveAttachments(self, inData, listRawDataFromUrl):
+        urlError = None
+        listPath = []
+        for dictAttachment, rawDataFromUrl in zip(inData['attachment'],
+                                                  listRawDataFromUrl):
             fileName = dictAttachment['fileName']
-            ispybWebServiceURL = os.path.join(
-                restUrl, token, 'proposal', str(proposal), 'mx',
-                'autoprocintegration', 'autoprocattachmentid', str(attachmentId),
-                'get')
-            rawDataFromUrl = UtilsIspyb.getRawDataFromURL(ispybWebServiceURL)
             if rawDataFromUrl['statusCode'] == 200:
                 rawData = rawDataFromUrl['content']
                 if fileName.endswith('.gz'):
                     rawData = gzip.decompress(rawData)
                     fileName = fileName.split('.gz')[0]
-                with open(fileName, "wb") as f:
+                filePath = self.getWorkingDirectory() / fileName
+                with open(str(filePath), "wb") as f:
                     f.write(rawData)
-                listPath.append(str(self.getWorkingDirectory() / fileName))
+                listPath.append(str(filePath))
             else:
                 urlError = rawDataFromUrl
         if urlError is None:
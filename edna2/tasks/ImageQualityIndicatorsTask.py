@@ -30,32 +30,38 @@ __date__ = "10/05/2019"
 
 import os
 import time
-import numpy
+import queue
 import base64
 import pathlib
+import threading
 
 
 from edna2.tasks.AbstractTask import AbstractTask
-from edna2.tasks.WaitFileTask import WaitFileTask
+from edna2.tasks.AbstractTask import EXECUTOR_ASYNC
+from edna2.tasks.AbstractTask import EXECUTOR_THREAD
 from edna2.tasks.DozorTasks import ControlDozor
 from edna2.tasks.H5ToCBFTask import H5ToCBFTask
 from edna2.tasks.PhenixTasks import DistlSignalStrengthTask
 from edna2.tasks.ReadImageHeader import ReadImageHeader
-try:
-    from edna2.tasks.CrystfelTasks import ExeCrystFEL
-    from edna2.lib.autocryst.src.run_crystfel import AutoCrystFEL
-    crystFelImportFailed = False
-except ImportError:
-    crystFelImportFailed = True
 
 from edna2.utils import UtilsImage
 from edna2.utils import UtilsConfig
 from edna2.utils import UtilsLogging
+from edna2.utils import UtilsMetrics
+from edna2.utils import UtilsScheduler
+from edna2.utils import UtilsFileWatcher
 
 logger = UtilsLogging.getLogger()
 
 DEFAULT_MIN_IMAGE_SIZE = 1000000
 DEFAULT_WAIT_FILE_TIMEOUT = 120
+DOZOR_RETRY_DELAY = 5  # s
+H5_DELAY = 1  # s
+
+# Events of the streaming pipeline
+EVENT_BATCH = 'batch'
+EVENT_DOZOR = 'dozor'
+EVENT_DISTL = 'distl'
 
 
 class ImageQualityIndicatorsTask(AbstractTask):
@@ -101,15 +107,28 @@ class ImageQualityIndicatorsTask(AbstractTask):
             },
         }
 
+    def getCacheInputFiles(self, inData):
+        if inData.get('image'):
+            return list(inData['image'])
+        elif 'template' in inData:
+            return UtilsImage.getImagePaths(
+                inData['directory'], inData['template'],
+                inData['startNo'], inData['endNo'])
+        return []
+
     def run(self, inData):
         doSubmit = inData.get('doSubmit', False)
         batchSize = inData.get('batchSize', 1)
         doDistlSignalStrength = inData.get('doDistlSignalStrength', False)
         doIndexing = inData.get('doIndexing', False)
-        if crystFelImportFailed:
-            doCrystfel = False
-        else:
-            doCrystfel = inData.get('doCrystfel', True)
+        doCrystfel = inData.get('doCrystfel', True)
+        if doCrystfel:
+            # The CrystFEL / autocryst stack is only imported when needed
+            try:
+                from edna2.tasks.CrystfelTasks import ExeCrystFEL
+                from edna2.lib.autocryst.src.run_crystfel import AutoCrystFEL
+            except ImportError:
+                doCrystfel = False
         isFastMesh = inData.get('fastMesh', False)
         # Loop through all the incoming reference images
         listImage = inData.get('image', [])
@@ -133,21 +152,17 @@ class ImageQualityIndicatorsTask(AbstractTask):
         outData = dict()
         listImageQualityIndicators = []
         listcrystfel_output = []
-        inDataWaitFile = {}
-        listDistlTask = []
-        listDozorTask = []
         listCrystFELTask = []
         listOfImagesInBatch = []
         listOfAllBatches = []
         listOfAllH5Files = []
-        indexBatch = 0
-        self.listH5FilePath = []
+        # Image number -> time the image file was written
+        dictArrivalTime = {}
         detectorType = None
         # Configurations
-        minImageSize = UtilsConfig.get(
-            self, 'minImageSize', defaultValue=DEFAULT_MIN_IMAGE_SIZE)
         waitFileTimeOut = UtilsConfig.get(
             self, 'waitFileTimeOut', defaultValue=DEFAULT_WAIT_FILE_TIMEOUT)
+        scheduler = UtilsScheduler.getScheduler()
         # Process data in batches
         for image in listImage:
             listOfImagesInBatch.append(pathlib.Path(image))
@@ -161,92 +176,163 @@ class ImageQualityIndicatorsTask(AbstractTask):
             for image in listImage:
                 listOfAllH5Files.append(pathlib.Path(image))
         #
-        # Loop over batches:
-        # - Wait for all files in batch
-        # - Run Dozor and Crystfel (if required) in parallel
+        # Streaming pipeline:
+        # - producer: the file watcher reports each batch as soon as all
+        #   its files have arrived, in the order the batches complete
+        # - workers: Dozor (and Distl) run for the batch through the
+        #   scheduler
+        # - consumer: the results are merged as they come in and emitted
+        #   as partial results, so scores are available during the data
+        #   collection
         #
-        # Check if we should run CrystFEL:
+        # As before the files only have to exist: the minImageSize
+        # configuration was never passed on to WaitFileTask.
+        eventQueue = queue.Queue()
+        isH5 = len(listOfAllH5Files) > 0
 
-        for listOfImagesInBatch in listOfAllBatches:
-            listOfH5FilesInBatch = []
-            for imagePath in listOfImagesInBatch:
-                # First wait for images
-                self.waitForImagePath(
-                    imagePath=imagePath,
-                    batchSize=batchSize,
-                    isFastMesh=isFastMesh,
-                    minImageSize=minImageSize,
-                    waitFileTimeOut=waitFileTimeOut,
-                    listofH5FilesInBatch=listOfH5FilesInBatch
-                )
-            if not self.isFailure():
-                # Determine start and end image no
-                pathToFirstImage = listOfImagesInBatch[0]
-                pathToLastImage = listOfImagesInBatch[-1]
-                batchStartNo = UtilsImage.getImageNumber(pathToFirstImage)
-                batchEndNo = UtilsImage.getImageNumber(pathToLastImage)
-                # Run Control Dozor
-                inDataControlDozor = {
-                    'template': template,
-                    'directory': directory,
-                    'startNo': batchStartNo,
-                    'endNo': batchEndNo,
-                    'batchSize': batchSize,
-                    'doSubmit': doSubmit
-                }
-                controlDozor = ControlDozor(inDataControlDozor)
-                controlDozor.start()
-                listDozorTask.append((controlDozor, inDataControlDozor,
-                                      list(listOfImagesInBatch), listOfH5FilesInBatch))
+        def onBatchComplete(indexBatch, fileSet):
+            if isH5:
+                # Leave some time for the master file to be completed
+                timer = threading.Timer(H5_DELAY, eventQueue.put,
+                                        args=((EVENT_BATCH, indexBatch),))
+                timer.daemon = True
+                timer.start()
+            else:
+                eventQueue.put((EVENT_BATCH, indexBatch))
+
+        listOfAllFileSets = UtilsFileWatcher.getWatcher().watchBatches([
+            self.getBatchFilePaths(listOfImagesInBatch, batchSize, isFastMesh)
+            for listOfImagesInBatch in listOfAllBatches],
+            callback=onBatchComplete)
+
+        def submitControlDozor(indexBatch, isRetry=False):
+            listOfImagesInBatch = listOfAllBatches[indexBatch]
+            inDataControlDozor = {
+                'template': template,
+                'directory': directory,
+                'startNo': UtilsImage.getImageNumber(listOfImagesInBatch[0]),
+                'endNo': UtilsImage.getImageNumber(listOfImagesInBatch[-1]),
+                'batchSize': batchSize,
+                'doSubmit': doSubmit,
+                'workingDirectory': str(self.getWorkingDirectory())
+            }
+            controlDozor = ControlDozor(inDataControlDozor)
+            if doSubmit:
+                # Dozor runs on the cluster: no local cores needed,
+                # and running in a thread lets the Slurm submitter
+                # group the batches into job arrays
+                futureControlDozor = scheduler.submit(
+                    controlDozor, cores=0, executor=EXECUTOR_THREAD)
+            else:
+                futureControlDozor = scheduler.submit(controlDozor)
+            futureControlDozor.add_done_callback(
+                lambda future: eventQueue.put(
+                    (EVENT_DOZOR, indexBatch, future.result(), isRetry)))
+
+        def submitDistl(image):
+            distlTask = DistlSignalStrengthTask(inData={
+                'referenceImage': str(image),
+                'workingDirectory': str(self.getWorkingDirectory())
+            })
+            futureDistlTask = scheduler.submit(distlTask,
+                                               executor=EXECUTOR_ASYNC)
+            futureDistlTask.add_done_callback(
+                lambda future: eventQueue.put(
+                    (EVENT_DISTL, image, future.result())))
+
+        setWaitingBatch = set(range(len(listOfAllBatches)))
+        numberOfRunningTasks = 0
+        lastArrivalTime = time.time()
+        # Image path -> indicators waiting for the other task (Dozor or
+        # Distl) of the same image
+        dictDozorResult = {}
+        dictDistlResult = {}
+        while not self.isFailure() and \
+                (len(setWaitingBatch) > 0 or numberOfRunningTasks > 0):
+            try:
+                event = eventQueue.get(timeout=1)
+            except queue.Empty:
+                if len(setWaitingBatch) > 0:
+                    lastArrivalTime = self.checkWaitTimeOut(
+                        [listOfAllFileSets[index]
+                         for index in sorted(setWaitingBatch)],
+                        lastArrivalTime, waitFileTimeOut)
+                continue
+            listNewIndicators = []
+            if event[0] == EVENT_BATCH:
+                indexBatch = event[1]
+                setWaitingBatch.discard(indexBatch)
+                lastArrivalTime = time.time()
+                dictArrived = listOfAllFileSets[indexBatch].getArrived()
+                for imagePath in listOfAllBatches[indexBatch]:
+                    filePath = self.getWatchedFilePath(
+                        imagePath, batchSize, isFastMesh)
+                    arrived = dictArrived.get(os.path.abspath(str(filePath)))
+                    if arrived is not None:
+                        imageNumber = UtilsImage.getImageNumber(imagePath)
+                        dictArrivalTime[imageNumber] = arrived['mtime']
+                submitControlDozor(indexBatch)
+                numberOfRunningTasks += 1
                 # Check if we should run distl.signalStrength
                 if doDistlSignalStrength:
-                    for image in listOfImagesInBatch:
-                        inDataDistl = {
-                            'referenceImage': str(image)
-                        }
-                        distlTask = DistlSignalStrengthTask(inData=inDataDistl)
-                        distlTask.start()
-                        listDistlTask.append((image, distlTask))
-
-        if not self.isFailure():
-            # listIndexing = []
-            listDistlResult = []
-            # Synchronize all image quality indicator plugins and upload to ISPyB
-            for (image, distlTask) in listDistlTask:
-                imageQualityIndicators = {}
-                if distlTask is not None:
-                    distlTask.join()
-                    if distlTask.isSuccess():
-                        outDataDistl = distlTask.outData
-                        if outDataDistl is not None:
-                            imageQualityIndicators = outDataDistl['imageQualityIndicators']
-                imageQualityIndicators['image'] = str(image)
-                listDistlResult.append(imageQualityIndicators)
-                # self.xsDataResultControlImageQualityIndicators.addImageQualityIndicators(xsDataImageQualityIndicators)
-            for (controlDozor, inDataControlDozor, listBatch, listH5FilePath) in listDozorTask:
-                controlDozor.join()
+                    for image in listOfAllBatches[indexBatch]:
+                        submitDistl(image)
+                        numberOfRunningTasks += 1
+            elif event[0] == EVENT_DOZOR:
+                _, indexBatch, controlDozor, isRetry = event
+                numberOfRunningTasks -= 1
+                outDataControlDozor = controlDozor.outData or {}
+                listOutDataControlDozor = list(
+                    outDataControlDozor.get('imageQualityIndicators', []))
                 # Check that we got at least one result
-                if len(controlDozor.outData['imageQualityIndicators']) == 0:
-                    # Run the dozor plugin again, this time synchronously
-                    firstImage = listBatch[0].name
-                    lastImage = listBatch[-1].name
+                if len(listOutDataControlDozor) == 0 and not isRetry:
+                    # Run the dozor plugin again, a bit later
+                    listBatch = listOfAllBatches[indexBatch]
                     logger.warning("No dozor results! Re-executing Dozor for" +
-                                   " images {0} to {1}".format(firstImage, lastImage))
-                    time.sleep(5)
-                    controlDozor = ControlDozor(inDataControlDozor)
-                    controlDozor.execute()
-                listOutDataControlDozor = list(controlDozor.outData['imageQualityIndicators'])
+                                   " images {0} to {1}".format(
+                                       listBatch[0].name, listBatch[-1].name))
+                    timer = threading.Timer(DOZOR_RETRY_DELAY,
+                                            submitControlDozor,
+                                            args=(indexBatch, True))
+                    timer.daemon = True
+                    timer.start()
+                    numberOfRunningTasks += 1
+                    continue
+                self.observeLatency(listOutDataControlDozor, dictArrivalTime)
                 if detectorType is None:
-                    detectorType = controlDozor.outData['detectorType']
+                    detectorType = outDataControlDozor.get('detectorType')
                 if doDistlSignalStrength:
-                    for outDataControlDozor in listOutDataControlDozor:
-                        for distlResult in listDistlResult:
-                            if outDataControlDozor['image'] == distlResult['image']:
-                                imageQualityIndicators = dict(outDataControlDozor)
-                                imageQualityIndicators.update(distlResult)
-                                listImageQualityIndicators.append(imageQualityIndicators)
+                    for imageQualityIndicators in listOutDataControlDozor:
+                        dictDozorResult[imageQualityIndicators['image']] = \
+                            imageQualityIndicators
                 else:
-                    listImageQualityIndicators += listOutDataControlDozor
+                    listNewIndicators = listOutDataControlDozor
+            elif event[0] == EVENT_DISTL:
+                _, image, distlTask = event
+                numberOfRunningTasks -= 1
+                imageQualityIndicators = {}
+                if distlTask.isSuccess():
+                    outDataDistl = distlTask.outData
+                    if outDataDistl is not None:
+                        imageQualityIndicators = outDataDistl['imageQualityIndicators']
+                imageQualityIndicators['image'] = str(image)
+                dictDistlResult[str(image)] = imageQualityIndicators
+            if doDistlSignalStrength:
+                for image in list(dictDozorResult):
+                    if image in dictDistlResult:
+                        imageQualityIndicators = dict(dictDozorResult.pop(image))
+                        imageQualityIndicators.update(dictDistlResult.pop(image))
+                        listNewIndicators.append(imageQualityIndicators)
+            if len(listNewIndicators) > 0:
+                listImageQualityIndicators += listNewIndicators
+                self.emitPartialResult({
+                    'imageQualityIndicators': listNewIndicators,
+                    'numberOfImages': len(listImageQualityIndicators)
+                })
+        for fileSet in listOfAllFileSets:
+            fileSet.close()
+        listImageQualityIndicators.sort(
+            key=lambda imageQualityIndicators: imageQualityIndicators['number'])
 
         if not self.isFailure() and doCrystfel:
             # Select only the strongest images to be run by CrystFEL
@@ -274,16 +360,16 @@ class ImageQualityIndicatorsTask(AbstractTask):
                         'batchSize': batchSize,
                         'listofImages': images
                     },
-                    'doSubmit': doSubmit
+                    'doSubmit': doSubmit,
+                    'workingDirectory': str(self.getWorkingDirectory())
                 }
                 crystfel = ExeCrystFEL(inData=inDataCrystFEL)
-                crystfel.start()
-                listCrystFELTask.append(crystfel)
+                listCrystFELTask.append(scheduler.submit(crystfel))
 
             masterstream = str(self.getWorkingDirectory() / 'alltogether.stream')
             if not self.isFailure():
-                for crystfel in listCrystFELTask:
-                    crystfel.join()
+                for futureCrystfel in listCrystFELTask:
+                    crystfel = futureCrystfel.result()
                     if crystfel.isSuccess():
                         catcommand = "cat %s >> %s" % (crystfel.outData['streamfile'], masterstream)
                         AutoCrystFEL.run_as_command(catcommand)
@@ -291,7 +377,9 @@ class ImageQualityIndicatorsTask(AbstractTask):
             if not self.isFailure() and os.path.exists(masterstream):
                 crystfel_outdata = AutoCrystFEL.report_stats(masterstream)
                 crystfel_outdata['number of DozorHits'] = len(listForCrystFEL)
-                AutoCrystFEL.write_cell_file(crystfel_outdata)
+                AutoCrystFEL.write_cell_file(
+                    crystfel_outdata,
+                    cellfile=str(self.getWorkingDirectory() / 'auto.cell'))
                 listcrystfel_output.append(crystfel_outdata)
             else:
                 logger.error("CrystFEL did not run properly")
@@ -319,45 +407,57 @@ class ImageQualityIndicatorsTask(AbstractTask):
         h5DataFilePath = filePath.parent / h5DataFileName
         return h5MasterFilePath, h5DataFilePath, h5FileNumber
 
-    def waitForImagePath(self, imagePath, batchSize, isFastMesh,
-                         minImageSize, waitFileTimeOut, listofH5FilesInBatch):
-        # If Eiger, just wait for the h5 file
+    @staticmethod
+    def observeLatency(listImageQualityIndicators, dictArrivalTime):
+        """
+        Adds the time from the arrival of each image to its quality
+        indicators to the edna2_iqi_latency_seconds histogram
+        """
+        now = time.time()
+        for imageQualityIndicators in listImageQualityIndicators:
+            arrivalTime = dictArrivalTime.get(imageQualityIndicators['number'])
+            if arrivalTime is not None:
+                UtilsMetrics.observe(
+                    'edna2_iqi_latency_seconds', max(0, now - arrivalTime),
+                    buckets=UtilsMetrics.LATENCY_BUCKETS,
+                    site=UtilsConfig.getSite())
+
+    @classmethod
+    def getWatchedFilePath(cls, imagePath, batchSize, isFastMesh):
+        """
+        Returns the file to wait for before processing an image: the
+        image itself or, for Eiger, the HDF5 data file containing it
+        """
         if imagePath.suffix == '.h5':
-            h5MasterFilePath, h5DataFilePath, hdf5ImageNumber = \
-                self.getH5FilePath(imagePath,
-                                   batchSize=batchSize,
-                                   isFastMesh=isFastMesh)
-            if h5DataFilePath not in listofH5FilesInBatch:
-                listofH5FilesInBatch.append(h5DataFilePath)
-                logger.info("Eiger data, waiting for master" +
-                            " and data files...")
-                inDataWaitFileTask = {
-                    'file': str(h5DataFilePath),
-                    'size': minImageSize,
-                    'timeOut': waitFileTimeOut
-                }
-                waitFileTask = WaitFileTask(inData=inDataWaitFileTask)
-                logger.info("Waiting for file {0}".format(h5DataFilePath))
-                logger.debug("Wait file timeOut set to %f" % waitFileTimeOut)
-                waitFileTask.execute()
-                time.sleep(1)
-            if not os.path.exists(h5DataFilePath):
-                errorMessage = "Time-out while waiting for image %s" % h5DataFilePath
-                logger.error(errorMessage)
-                self.setFailure()
-        else:
-            if not imagePath.exists():
-                logger.info("Waiting for file {0}".format(imagePath))
-                inDataWaitFileTask = {
-                    'file': str(imagePath),
-                    'size': minImageSize,
-                    'timeOut': waitFileTimeOut
-                }
-                waitFileTask = WaitFileTask(inData=inDataWaitFileTask)
-                logger.debug("Wait file timeOut set to %.0f s" % waitFileTimeOut)
-                waitFileTask.execute()
-            if not imagePath.exists():
-                errorMessage = "Time-out while waiting for image " + \
-                               str(imagePath)
-                logger.error(errorMessage)
-                self.setFailure()
+            _, imagePath, _ = cls.getH5FilePath(
+                imagePath, batchSize=batchSize, isFastMesh=isFastMesh)
+        return imagePath
+
+    @classmethod
+    def getBatchFilePaths(cls, listOfImagesInBatch, batchSize, isFastMesh):
+        listFilePath = []
+        for imagePath in listOfImagesInBatch:
+            filePath = cls.getWatchedFilePath(imagePath, batchSize, isFastMesh)
+            if filePath not in listFilePath:
+                listFilePath.append(filePath)
+        return listFilePath
+
+    def checkWaitTimeOut(self, listFileSet, lastArrivalTime, waitFileTimeOut):
+        """
+        Flags the task as failed if no file of the waiting batches has
+        arrived for waitFileTimeOut seconds, returns the time of the last
+        arrival
+        """
+        for fileSet in listFileSet:
+            for arrived in fileSet.getArrived().values():
+                lastArrivalTime = max(lastArrivalTime, arrived['time'])
+        if time.time() - lastArrivalTime > waitFileTimeOut:
+            for fileSet in listFileSet:
+                listMissing = fileSet.getMissing()
+                if len(listMissing) > 0:
+                    errorMessage = "Time-out while waiting for image %s" % \
+                                   listMissing[0]
+                    logger.error(errorMessage)
+                    break
+            self.setFailure()
+        return lastArrivalTime
@@ -134,11 +134,6 @@ class ControlIndexingTask(AbstractTask):
 
     @staticmethod
     def readImageHeaders(listImagePath):
-        # Read the header(s)
-        inDataReadImageHeader = {
-            "imagePath": listImagePath
-        }
-        readImageHeader = ReadImageHeader(inData=inDataReadImageHeader)
-        readImageHeader.execute()
-        listSubWedge = readImageHeader.outData["subWedge"]
+        # Read the header(s), through the header cache
+        listSubWedge = ReadImageHeader.readImageHeaders(listImagePath)
         return listSubWedge
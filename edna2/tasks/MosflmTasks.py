@@ -37,6 +37,7 @@ from edna2.tasks.ReadImageHeader import ReadImageHeader
 from edna2.utils import UtilsImage
 from edna2.utils import UtilsConfig
 from edna2.utils import UtilsDnaTables
+from edna2.utils import UtilsTrace
 from edna2.utils import UtilsLogging
 
 logger = UtilsLogging.getLogger()
@@ -62,18 +63,23 @@ class AbstractMosflmTask(AbstractTask):
         self.setLogFileName('mosflm.log')
         self.runCommandLine(commandLine, listCommand=listCommand)
         # Work in progress!
-        outData = self.parseMosflmOutput(self.getWorkingDirectory())
+        with UtilsTrace.span('parseOutput'):
+            outData = self.parseMosflmOutput(self.getWorkingDirectory())
         return outData
 
+    def getResultFilePatterns(self):
+        listPattern = AbstractTask.getResultFilePatterns(self) + \
+            ['mosflm.log', 'mosflmInData.json', 'dnaTables.xml', '*.mat']
+        predictionFileName = getattr(self, 'predictionFileName', None)
+        if predictionFileName is not None:
+            listPattern.append(predictionFileName)
+        return listPattern
+
     @classmethod
     def generateMOSFLMInData(cls, inData):
         if "imagePath" in inData:
-            inDataReadImageHeader = {
-                "imagePath": inData["imagePath"]
-            }
-            readImageHeader = ReadImageHeader(inData=inDataReadImageHeader)
-            readImageHeader.execute()
-            listSubWedges = readImageHeader.outData["subWedge"]
+            listSubWedges = ReadImageHeader.readImageHeaders(
+                inData["imagePath"])
         elif "subWedge" in inData:
             listSubWedges = inData["subWedge"]
         else:
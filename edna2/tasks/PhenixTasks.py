@@ -34,10 +34,23 @@ class DistlSignalStrengthTask(AbstractTask):
     """
 
     def run(self, inData):
-        commandLine = 'distl.signal_strength '
-        commandLine += inData['referenceImage']
         logPath = self.getWorkingDirectory() / 'distl.log'
-        self.runCommandLine(commandLine, logPath=logPath)
+        self.runCommandLine(self.getCommandLine(inData), logPath=logPath)
+        return self.parseDistlLog(logPath)
+
+    async def runAsync(self, inData):
+        # One task per image: with the 'async' executor the commands are
+        # awaited from the event loop instead of one thread each
+        logPath = self.getWorkingDirectory() / 'distl.log'
+        await self.runCommandLineAsync(self.getCommandLine(inData),
+                                       logPath=logPath)
+        return self.parseDistlLog(logPath)
+
+    @staticmethod
+    def getCommandLine(inData):
+        return 'distl.signal_strength ' + inData['referenceImage']
+
+    def parseDistlLog(self, logPath):
         with open(str(logPath)) as f:
             logText = f.read()
         imageQualityIndicators = self.parseLabelitDistlOutput(logText)
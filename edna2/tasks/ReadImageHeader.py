@@ -29,14 +29,20 @@ __date__ = "21/04/2019"
 #      EDPluginControlReadImageHeaderv10.py
 
 import os
-import h5py
+import json
+import hashlib
+import concurrent.futures
 
 from edna2.utils import UtilsLogging
 
 from edna2.tasks.AbstractTask import AbstractTask
 
-from edna2.utils import UtilsPath
 from edna2.utils import UtilsImage
+from edna2.utils import UtilsCBF
+from edna2.utils import UtilsEiger
+from edna2.utils import UtilsCache
+from edna2.utils import UtilsConfig
+from edna2.utils import UtilsFileWatcher
 
 logger = UtilsLogging.getLogger()
 
@@ -45,6 +51,13 @@ logger = UtilsLogging.getLogger()
 # Default time out for wait file
 DEFAULT_TIME_OUT = 30  # s
 
+# Threads reading headers in readImageHeaders
+DEFAULT_MAX_WORKERS = 8
+
+# Version of the subWedges stored in the header cache, to be increased
+# when they change
+HEADER_CACHE_VERSION = 2
+
 # Map between image suffix and image type
 SUFFIX_ADSC = "img"
 SUFFIX_MARCCD1 = "mccd"
@@ -70,67 +83,102 @@ DICT_SUFFIX_TO_IMAGE = {
 class ReadImageHeader(AbstractTask):
 
     def run(self, inData):
-        listImagePath = inData["imagePath"]
-        listSubWedge = []
+        listSubWedge = self.readImageHeaders(inData["imagePath"])
+        outData = {
+            "subWedge": listSubWedge
+        }
+        return outData
+
+    @classmethod
+    def readImageHeaders(cls, listImagePath, timeOut=DEFAULT_TIME_OUT):
+        """
+        Waits for the images and returns their subWedges without running
+        a task. The headers come from the header cache, the ones missing
+        are read in parallel.
+        """
+        listImagePath = [str(imagePath) for imagePath in listImagePath]
+        cls.waitForImages(listImagePath, timeOut)
+        maxWorkers = int(UtilsConfig.get(
+            'ReadImageHeader', 'maxWorkers', DEFAULT_MAX_WORKERS))
+        maxWorkers = min(maxWorkers, len(listImagePath))
+        if maxWorkers <= 1:
+            return [cls.getSubWedge(imagePath) for imagePath in listImagePath]
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=maxWorkers) as executor:
+            return list(executor.map(cls.getSubWedge, listImagePath))
+
+    @classmethod
+    def waitForImages(cls, listImagePath, timeOut=DEFAULT_TIME_OUT):
+        # All images are watched at once, then waited for one by one
+        fileSet = UtilsFileWatcher.watch(listImagePath, minSize=100000)
         for imagePath in listImagePath:
             # Waiting for file
-            timedOut, finalSize = UtilsPath.waitForFile(imagePath, expectedSize=100000, timeOut=DEFAULT_TIME_OUT)
-            if timedOut:
+            if not fileSet.wait(imagePath, timeout=0):
+                logger.info("Waiting for file %s" % imagePath)
+            if not fileSet.wait(imagePath, timeout=timeOut):
+                fileSet.close()
                 errorMessage = "Timeout when waiting for image %s" % imagePath
                 logger.error(errorMessage)
                 raise BaseException(errorMessage)
-            imageSuffix = os.path.splitext(imagePath)[1][1:]
-            if imageSuffix == 'cbf':
-                subWedge = self.createCBFHeaderData(imagePath)
-            elif imageSuffix == 'h5':
-                subWedge = self.createHdf5HeaderData(imagePath)
-            else:
-                raise RuntimeError(
-                    '{0} cannot read image header from images with extension {1}'.format(
-                        self.__class__.__name__,
-                        imageSuffix
-                    )
-                )
-            listSubWedge.append(subWedge)
-        outData = {
-            "subWedge": listSubWedge
+
+    @classmethod
+    def getSubWedge(cls, imagePath):
+        """
+        Returns the subWedge of an image. The header cache is keyed by
+        the path, size and modification time of the image; entries are
+        also checked against the HDF5 data files they refer to.
+        """
+        imagePath = str(imagePath)
+        stat = os.stat(imagePath)
+        keyString = json.dumps([cls.__name__, HEADER_CACHE_VERSION, imagePath,
+                                stat.st_size, stat.st_mtime_ns])
+        key = hashlib.sha256(keyString.encode('utf-8')).hexdigest()
+        headerCache = UtilsCache.getHeaderCache()
+        value = headerCache.get(key)
+        if value is not None:
+            entry = json.loads(value)
+            listFingerprint = UtilsCache.getFileFingerprints(
+                entry['subWedge']['image'])
+            if listFingerprint == entry['files']:
+                return entry['subWedge']
+        subWedge = cls.createHeaderData(imagePath)
+        entry = {
+            'subWedge': subWedge,
+            'files': UtilsCache.getFileFingerprints(subWedge['image'])
         }
-        return outData
+        headerCache.put(key, json.dumps(entry, default=str))
+        return subWedge
+
+    @classmethod
+    def createHeaderData(cls, imagePath):
+        imageSuffix = os.path.splitext(imagePath)[1][1:]
+        if imageSuffix == 'cbf':
+            subWedge = cls.createCBFHeaderData(imagePath)
+        elif imageSuffix == 'h5':
+            subWedge = cls.createHdf5HeaderData(imagePath)
+        else:
+            raise RuntimeError(
+                '{0} cannot read image header from images with extension {1}'.format(
+                    cls.__name__,
+                    imageSuffix
+                )
+            )
+        return subWedge
 
     @classmethod
     def readCBFHeader(cls, filePath):
         """
         Returns an dictionary with the contents of a CBF image header.
         """
-        dictHeader = None
-        with open(filePath, 'rb') as f:
-            logger.debug('Reading header from image ' + filePath)
-            f.seek(0, 0)
-            doContinue = True
-            iMax = 60
-            index = 0
-            while doContinue:
-                line = f.readline().decode('utf-8')
-                index += 1
-                if '_array_data.header_contents' in line:
-                    dictHeader = {}
-                if '_array_data.data' in line or index > iMax:
-                    doContinue = False
-                if dictHeader is not None and line[0] == '#':
-                    # Check for date
-                    strTmp = line[2:].replace('\r\n', '')
-                    if line[6] == '/' and line[10] == '/':
-                        dictHeader['DateTime'] = strTmp
-                    else:
-                        strKey = strTmp.split(' ')[0]
-                        strValue = strTmp.replace(strKey, '')[1:]
-                        dictHeader[strKey] = strValue
-        return dictHeader
+        logger.debug('Reading header from image ' + str(filePath))
+        dictHeader = UtilsCBF.readHeader(filePath).dictHeader
+        return dictHeader if dictHeader else None
 
     @classmethod
     def createCBFHeaderData(cls, imagePath):
-        dictHeader = cls.readCBFHeader(imagePath)
-        detector = dictHeader['Detector:']
+        cbfHeader = UtilsCBF.readHeader(imagePath)
+        dictHeader = cbfHeader.dictHeader
+        detector = cbfHeader.detector or ''
         if 'PILATUS 3M' in detector or 'PILATUS3 2M' in detector or \
                 'PILATUS 2M' in detector or 'PILATUS2 3M' in detector:
             detectorName = 'PILATUS2 3M'
@@ -145,7 +193,7 @@ class ReadImageHeader(AbstractTask):
         else:
             raise RuntimeError(
                 '{0} cannot read image header from images with dector type {1}'.format(
-                    cls.__class__.__name__,
+                    cls.__name__,
                     detector
                 )
             )
@@ -155,31 +203,26 @@ class ReadImageHeader(AbstractTask):
             'numberPixelY': numberPixelY
         }
         # Pixel size
-        listPixelSizeXY = dictHeader['Pixel_size'].split(' ')
-        detector['pixelSizeX'] = float(listPixelSizeXY[0]) * 1000
-        detector['pixelSizeY'] = float(listPixelSizeXY[3]) * 1000
+        detector['pixelSizeX'] = cbfHeader.pixelSizeX * 1000
+        detector['pixelSizeY'] = cbfHeader.pixelSizeY * 1000
         # Beam position
-        listBeamPosition = dictHeader['Beam_xy'].replace('(', ' ').replace(')', ' ').replace(',', ' ').split()
-        detector['beamPositionX'] = float(listBeamPosition[0]) * \
-                                    detector['pixelSizeX']
-        detector['beamPositionY'] = float(listBeamPosition[1]) * \
-                                    detector['pixelSizeY']
-        distance = float(dictHeader['Detector_distance'].split(' ')[0]) * 1000
-        detector['distance'] = distance
-        detector['serialNumber'] = dictHeader['Detector:']
+        detector['beamPositionX'] = cbfHeader.beamX * detector['pixelSizeX']
+        detector['beamPositionY'] = cbfHeader.beamY * detector['pixelSizeY']
+        detector['distance'] = cbfHeader.detectorDistance * 1000
+        detector['serialNumber'] = cbfHeader.detector
         detector['name'] = detectorName
         detector['type'] = detectorType
         experimentalCondition['detector'] = detector
         # Beam object
         beam = {
-            'wavelength': float(dictHeader['Wavelength'].split(' ')[0]),
-            'exposureTime': float(dictHeader['Exposure_time'].split(' ')[0])
+            'wavelength': cbfHeader.wavelength,
+            'exposureTime': cbfHeader.exposureTime
         }
         experimentalCondition['beam'] = beam
         # Goniostat object
         goniostat = {}
-        rotationAxisStart = float(dictHeader['Start_angle'].split(' ')[0])
-        oscillationWidth = float(dictHeader['Angle_increment'].split(' ')[0])
+        rotationAxisStart = cbfHeader.startAngle
+        oscillationWidth = cbfHeader.angleIncrement
         goniostat['rotationAxisStart'] = rotationAxisStart
         goniostat['rotationAxisEnd'] = rotationAxisStart + oscillationWidth
         goniostat['oscillationWidth'] = oscillationWidth
@@ -203,26 +246,8 @@ class ReadImageHeader(AbstractTask):
         """
         Returns an dictionary with the contents of an Eiger Hdf5 image header.
         """
-        f = h5py.File(filePath, 'r')
-        dictHeader = {
-            'wavelength': f['entry']['instrument']['beam']['incident_wavelength'][()],
-            'beam_center_x': f['entry']['instrument']['detector']['beam_center_x'][()],
-            'beam_center_y': f['entry']['instrument']['detector']['beam_center_y'][()],
-            'count_time':  f['entry']['instrument']['detector']['count_time'][()],
-            'detector_distance': f['entry']['instrument']['detector']['detector_distance'][()],
-            'orientation': list(f['entry']['instrument']['detector']['geometry']['orientation']['value']),
-            'translation': list(f['entry']['instrument']['detector']['geometry']['translation']['distances']),
-            'x_pixel_size': f['entry']['instrument']['detector']['x_pixel_size'][()],
-            'y_pixel_size': f['entry']['instrument']['detector']['y_pixel_size'][()],
-            'omega_start': f['entry']['sample']['goniometer']['omega_start'][()],
-            'omega_increment': f['entry']['sample']['goniometer']['omega_increment'][()],
-            'detector_number': f['entry']['instrument']['detector']['detector_number'][()].decode('utf-8'),
-            'description': f['entry']['instrument']['detector']['description'][()].decode('utf-8'),
-            'data_collection_date': f['entry']['instrument']['detector']['detectorSpecific']['data_collection_date'][()].decode('utf-8'),
-            'data': list(f['entry']['data'])
-        }
-        f.close()
-        return dictHeader
+        logger.debug('Reading header from image ' + str(filePath))
+        return UtilsEiger.readMasterHeader(filePath)
 
     @classmethod
     def createHdf5HeaderData(cls, masterImagePath):
@@ -240,19 +265,10 @@ class ReadImageHeader(AbstractTask):
                     description
                 )
             )
-        # Find out size of data set
-        prefix = masterImagePath.split('master')[0]
-        listDataImage = []
-        noImages = 0
-        for data in dictHeader['data']:
-            dataFilePath = prefix + data + '.h5'
-            listDataImage.append({
-                'path': dataFilePath
-            })
-            f = h5py.File(dataFilePath, 'r')
-            dataShape = f['entry']['data']['data'].shape
-            noImages += dataShape[0]
-            f.close()
+        # The size of the data set is read from the master file
+        listDataImage = [{'path': dataFilePath}
+                         for dataFilePath in dictHeader['dataFiles']]
+        noImages = dictHeader['numberOfImages']
         experimentalCondition = {}
         # Pixel size and beam position
         detector = {
@@ -48,18 +48,31 @@ class WaitFileTask(AbstractTask):
     """
 
     def run(self, inData):
+        filePath, expectedSize, timeOut = self.getWaitParameters(inData)
+        hasTimedOut, finalSize = UtilsPath.waitForFile(filePath, expectedSize=expectedSize, timeOut=timeOut)
+        return self.createOutData(hasTimedOut, finalSize)
+
+    async def runAsync(self, inData):
+        filePath, expectedSize, timeOut = self.getWaitParameters(inData)
+        hasTimedOut, finalSize = await UtilsPath.waitForFileAsync(
+            filePath, expectedSize=expectedSize, timeOut=timeOut)
+        return self.createOutData(hasTimedOut, finalSize)
+
+    def getWaitParameters(self, inData):
         # Wait for file if it's not already on disk'
         if not "file" in inData:
             raise BaseException("No expected file path in input!")
-        filePath = pathlib.Path(self.inData["file"])
+        filePath = pathlib.Path(inData["file"])
         expectedSize = inData.get('expectedSize', None)
         configTimeOut = UtilsConfig.get(self, 'timeOut', DEFAULT_TIMEOUT)
         timeOut = inData.get('timeOut', configTimeOut)
-        hasTimedOut, finalSize = UtilsPath.waitForFile(filePath, expectedSize=expectedSize, timeOut=timeOut)
+        return filePath, expectedSize, timeOut
+
+    @staticmethod
+    def createOutData(hasTimedOut, finalSize):
         outData = {
             "timedOut": hasTimedOut
         }
         if finalSize is not None:
             outData["finalSize"] = finalSize
         return outData
-
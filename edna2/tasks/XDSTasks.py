@@ -35,6 +35,7 @@ import numpy as np
 from edna2.tasks.AbstractTask import AbstractTask
 
 from edna2.utils import UtilsConfig
+from edna2.utils import UtilsTrace
 from edna2.utils import UtilsLogging
 from edna2.utils import UtilsDetector
 from edna2.utils import UtilsSymmetry
@@ -55,9 +56,14 @@ class XDSTask(AbstractTask):
         self.setLogFileName('xds.log')
         self.runCommandLine(commandLine, listCommand=[])
         # Work in progress!
-        outData = self.parseXDSOutput(self.getWorkingDirectory())
+        with UtilsTrace.span('parseOutput'):
+            outData = self.parseXDSOutput(self.getWorkingDirectory())
         return outData
 
+    def getResultFilePatterns(self):
+        return AbstractTask.getResultFilePatterns(self) + \
+            ['XDS.INP', 'xds.log', '*.LP', '*XPARM.XDS', 'SPOT.XDS']
+
     def generateXDS_INP(self, inData):
         """
         This method creates a list of XDS commands,e.g.:
@@ -0,0 +1,287 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import os
+import json
+import asyncio
+import time
+import shutil
+import pathlib
+import tempfile
+import unittest
+import unittest.mock
+
+from edna2.utils import UtilsCache
+from edna2.utils import UtilsLogging
+from edna2.utils import UtilsTransport
+
+from edna2.tasks.AbstractTask import AbstractTask
+from edna2.tasks.AbstractTask import LIST_EXECUTOR
+from edna2.tasks.AbstractTask import EXECUTOR_ASYNC
+from edna2.tasks.AbstractTask import EXECUTOR_THREAD
+from edna2.tasks.AbstractTask import EXECUTOR_PROCESS
+from edna2.tasks.AbstractTask import PERSIST_RUN
+from edna2.tasks.AbstractTask import PERSIST_NONE
+from edna2.tasks.AbstractTask import RUN_RECORD_FILE_NAME
+from edna2.tasks.HelloWorldTask import HelloWorldTask
+
+logger = UtilsLogging.getLogger()
+
+
+class FailingTask(AbstractTask):
+
+    def run(self, inData):
+        raise RuntimeError('Failure requested by test')
+
+
+class LargeOutDataTask(AbstractTask):
+
+    def run(self, inData):
+        self.setFailure()
+        return {'data': 'x' * inData['size']}
+
+
+class SlowCountingTask(AbstractTask):
+    numberOfRuns = 0
+
+    def run(self, inData):
+        SlowCountingTask.numberOfRuns += 1
+        time.sleep(0.2)
+        return {'value': inData['value']}
+
+
+class StreamingTask(AbstractTask):
+
+    def run(self, inData):
+        commandLine = 'for i in 1 2 3; do echo line$i; sleep 0.1; done'
+        self.runCommandLine(commandLine, lineCallback=self.emitLine)
+        return {'log': self.getLog()}
+
+    def emitLine(self, line):
+        self.emitPartialResult({'line': line})
+
+
+class CurrentDirectoryTask(AbstractTask):
+
+    def run(self, inData):
+        return {'currentDirectory': os.getcwd()}
+
+
+class AsyncCommandLineTask(AbstractTask):
+
+    def run(self, inData):
+        raise RuntimeError('Only the asynchronous version is implemented')
+
+    async def runAsync(self, inData):
+        await self.runCommandLineAsync('echo {0}'.format(inData['message']))
+        return {'log': self.getLog().strip()}
+
+
+class AbstractTaskUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp(prefix='AbstractTask_')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def test_executors(self):
+        for executor in LIST_EXECUTOR:
+            oldCwd = os.getcwd()
+            inData = {'name': executor, 'workingDirectory': self.tmpDir}
+            helloWorldTask = HelloWorldTask(inData=inData)
+            helloWorldTask.execute(executor=executor)
+            self.assertTrue(helloWorldTask.isSuccess(), executor)
+            self.assertEqual(helloWorldTask.outData['results'],
+                             'Hello world {0}!'.format(executor))
+            self.assertEqual(os.getcwd(), oldCwd)
+
+    def test_failingExecutors(self):
+        for executor in LIST_EXECUTOR:
+            failingTask = FailingTask(inData={'workingDirectory': self.tmpDir})
+            failingTask.execute(executor=executor)
+            self.assertTrue(failingTask.isFailure(), executor)
+
+    def test_unknownExecutor(self):
+        helloWorldTask = HelloWorldTask(inData={})
+        with self.assertRaises(RuntimeError):
+            helloWorldTask.setExecutor('cluster')
+
+    def test_processResult(self):
+        # Large enough to be transferred through shared memory
+        size = 2 * UtilsTransport.DEFAULT_SHARED_MEMORY_THRESHOLD
+        inData = {'size': size, 'workingDirectory': self.tmpDir}
+        largeOutDataTask = LargeOutDataTask(inData=inData)
+        largeOutDataTask.execute(executor=EXECUTOR_PROCESS)
+        self.assertTrue(largeOutDataTask.isFailure())
+        self.assertEqual(len(largeOutDataTask.outData['data']), size)
+        # Each access returns a new object
+        outData = largeOutDataTask.outData
+        outData['data'] = None
+        self.assertEqual(len(largeOutDataTask.outData['data']), size)
+
+    def test_cache(self):
+        SlowCountingTask.numberOfRuns = 0
+        inData = {'value': 'cached', 'workingDirectory': self.tmpDir}
+        listTask = []
+        for index in range(3):
+            task = SlowCountingTask(inData=inData)
+            task.setUseCache(True)
+            task.start(executor=EXECUTOR_THREAD)
+            listTask.append(task)
+        for task in listTask:
+            task.join()
+            self.assertEqual(task.outData, {'value': 'cached'})
+        # Identical requests in flight are coalesced
+        self.assertEqual(SlowCountingTask.numberOfRuns, 1)
+        task = SlowCountingTask(inData=inData)
+        task.setUseCache(True)
+        task.execute(executor=EXECUTOR_PROCESS)
+        self.assertTrue(task.isCacheHit())
+        self.assertEqual(SlowCountingTask.numberOfRuns, 1)
+
+    def test_cacheJoinOrder(self):
+        # The identical request waiting for the first one can be joined
+        # first, the first one is never joined
+        for executor in [EXECUTOR_THREAD, EXECUTOR_PROCESS]:
+            inData = {'value': executor, 'workingDirectory': self.tmpDir}
+            firstTask = SlowCountingTask(inData=inData)
+            firstTask.setUseCache(True)
+            firstTask.start(executor=executor)
+            secondTask = SlowCountingTask(inData=inData)
+            secondTask.setUseCache(True)
+            secondTask.start(executor=executor)
+            secondTask.join()
+            self.assertTrue(secondTask.isCacheHit(), executor)
+            self.assertEqual(secondTask.outData, {'value': executor})
+
+    def test_cacheStartFailure(self):
+        inData = {'value': 'startFailure', 'workingDirectory': self.tmpDir}
+        task = SlowCountingTask(inData=inData)
+        task.setUseCache(True)
+        with unittest.mock.patch.object(
+                task, 'startExecutor', side_effect=RuntimeError('start')):
+            with self.assertRaises(RuntimeError):
+                task.start(executor=EXECUTOR_THREAD)
+        # The key isn't left in flight
+        cacheKey = UtilsCache.getCacheKey(task)
+        self.assertEqual(UtilsCache.getCache().acquire(cacheKey),
+                         (None, None))
+        UtilsCache.getCache().release(cacheKey)
+
+    def test_partialResults(self):
+        for executor in LIST_EXECUTOR:
+            listPartialResult = []
+            task = StreamingTask(inData={'workingDirectory': self.tmpDir})
+            task.setPartialResultCallback(listPartialResult.append)
+            task.execute(executor=executor)
+            self.assertFalse(task.isFailure())
+            self.assertEqual(task.outData['log'], 'line1\nline2\nline3\n')
+            self.assertEqual(listPartialResult,
+                             [{'line': 'line1'}, {'line': 'line2'},
+                              {'line': 'line3'}])
+        listPartialResultPath = list(pathlib.Path(self.tmpDir).glob(
+            'StreamingTask_*/StreamingTask.partial.jsonl'))
+        self.assertEqual(len(listPartialResultPath), len(LIST_EXECUTOR))
+
+    def test_asyncExecutor(self):
+        task = AsyncCommandLineTask(inData={'message': 'Hello',
+                                            'workingDirectory': self.tmpDir})
+        task.execute(executor=EXECUTOR_ASYNC)
+        self.assertFalse(task.isFailure())
+        self.assertEqual(task.outData['log'], 'Hello')
+        # Other executors use run, not implemented by this task
+        task = AsyncCommandLineTask(inData={'message': 'Hello',
+                                            'workingDirectory': self.tmpDir})
+        task.execute(executor=EXECUTOR_THREAD)
+        self.assertTrue(task.isFailure())
+
+    def test_executeAsync(self):
+
+        async def executeAll(listTask):
+            await asyncio.gather(*[task.executeAsync() for task in listTask])
+
+        listTask = [
+            AsyncCommandLineTask(inData={'message': 'Hello{0}'.format(index),
+                                         'workingDirectory': self.tmpDir})
+            for index in range(10)
+        ]
+        asyncio.run(executeAll(listTask))
+        for index, task in enumerate(listTask):
+            self.assertEqual(task.outData['log'], 'Hello{0}'.format(index))
+
+    def test_lazyWorkingDirectory(self):
+        for executor in [EXECUTOR_THREAD, EXECUTOR_PROCESS]:
+            inData = {'name': executor, 'workingDirectory': self.tmpDir}
+            helloWorldTask = HelloWorldTask(inData=inData)
+            helloWorldTask.setPersistInOutData(PERSIST_NONE)
+            helloWorldTask.execute(executor=executor)
+            self.assertTrue(helloWorldTask.isSuccess(), executor)
+        # No working directory is created for tasks not writing files
+        self.assertEqual(os.listdir(self.tmpDir), [])
+        # A task run in its own process only changes to its working
+        # directory if it already exists
+        task = CurrentDirectoryTask(inData={'workingDirectory': self.tmpDir})
+        task.setPersistInOutData(PERSIST_NONE)
+        task.execute(executor=EXECUTOR_PROCESS)
+        self.assertEqual(task.outData['currentDirectory'], os.getcwd())
+        self.assertEqual(os.listdir(self.tmpDir), [])
+        task = CurrentDirectoryTask(inData={'workingDirectory': self.tmpDir})
+        task.execute(executor=EXECUTOR_PROCESS)
+        currentDirectory = pathlib.Path(task.outData['currentDirectory'])
+        self.assertEqual(currentDirectory.parent.resolve(),
+                         pathlib.Path(self.tmpDir).resolve())
+        self.assertTrue(currentDirectory.name.startswith(
+            'CurrentDirectoryTask_'))
+        shutil.rmtree(str(currentDirectory))
+        # Created on first use
+        task = StreamingTask(inData={'workingDirectory': self.tmpDir})
+        task.setPersistInOutData(PERSIST_NONE)
+        task.execute(executor=EXECUTOR_THREAD)
+        self.assertTrue(task.isSuccess())
+        self.assertEqual(os.listdir(self.tmpDir),
+                         [task.getWorkingDirectory().name])
+
+    def test_persistRun(self):
+        for index in range(3):
+            inData = {'name': str(index), 'workingDirectory': self.tmpDir}
+            helloWorldTask = HelloWorldTask(inData=inData)
+            helloWorldTask.setPersistInOutData(PERSIST_RUN)
+            helloWorldTask.execute(executor=EXECUTOR_THREAD)
+            self.assertTrue(helloWorldTask.isSuccess())
+        failingTask = FailingTask(inData={'workingDirectory': self.tmpDir})
+        failingTask.setPersistInOutData(PERSIST_RUN)
+        failingTask.execute(executor=EXECUTOR_THREAD)
+        self.assertEqual(os.listdir(self.tmpDir), [RUN_RECORD_FILE_NAME])
+        with open(os.path.join(self.tmpDir, RUN_RECORD_FILE_NAME)) as f:
+            listRecord = [json.loads(line) for line in f]
+        self.assertEqual(len(listRecord), 4)
+        self.assertEqual(listRecord[0]['task'], 'HelloWorldTask')
+        self.assertEqual(listRecord[2]['inData']['name'], '2')
+        self.assertEqual(listRecord[2]['outData']['results'],
+                         'Hello world 2!')
+        self.assertIsNone(listRecord[3]['outData'])
+        with self.assertRaises(RuntimeError):
+            helloWorldTask.setPersistInOutData('everywhere')
@@ -30,11 +30,25 @@ __copyright__ = "European Synchrotron Radiation Facility, Grenoble, France"
 
 import os
 import json
+import shutil
+import pathlib
+import tempfile
 
 import unittest
+import unittest.mock
+
+from edna2.utils import UtilsTest
 
 # from controltasks import ControlDozor
 from edna2.tasks.DozorTasks import ControlDozor
+from edna2.tasks.H5ToCBFTask import H5ToCBFTask
+
+# Touches the CBF files of an image range: eiger2cbf master first:last prefix
+FAKE_EIGER2CBF = """#!/bin/sh
+for index in $(seq ${2%:*} ${2#*:}); do
+    touch "$(printf '%s%06d.cbf' "$3" "$index")"
+done
+"""
 
 
 class ControlDozorUnitTest(unittest.TestCase):
@@ -52,6 +66,19 @@ class ControlDozorUnitTest(unittest.TestCase):
         dictImage = self.controlDozor.createImageDict(self.inData)
         self.assertEqual(True, isinstance(dictImage, dict))
 
+    def testGetHeaderImagePath(self):
+        self.assertEqual(
+            ControlDozor.getHeaderImagePath('/data/mesh/mesh_1_0003.cbf'),
+            '/data/mesh/mesh_1_0003.cbf'
+        )
+        # All batches of an HDF5 collection share the master file header
+        for image in ['/data/mesh/mesh_1_000001.h5',
+                      '/data/mesh/mesh_1_000120.h5']:
+            self.assertEqual(
+                ControlDozor.getHeaderImagePath(image),
+                '/data/mesh/mesh_1_1_master.h5'
+            )
+
     def testCreateListOfBatches(self):
         self.assertEqual(
             [[1], [2], [3], [4], [5]],
@@ -101,3 +128,45 @@ class ControlDozorUnitTest(unittest.TestCase):
                 3
             )
         )
+
+    def convertToCBF(self, tmpDir):
+        masterPath = UtilsTest.createSyntheticEigerMaster(
+            tmpDir, listNumberOfImages=(3, 2))
+        dictImage = {imageNumber: str(masterPath)
+                     for imageNumber in range(1, 6)}
+        listAllBatches = ControlDozor.createListOfBatches(range(1, 6), 2)
+        newDict, hasHdf5Prefix = ControlDozor.convertToCBF(
+            dictImage, listAllBatches, cbfTempDir=str(tmpDir / 'cbf'),
+            workingDirectory=str(tmpDir))
+        self.assertTrue(hasHdf5Prefix)
+        self.assertEqual(sorted(newDict), [1, 2, 3, 4, 5])
+        for imageNumber, cbfPath in newDict.items():
+            self.assertEqual(os.path.dirname(cbfPath), str(tmpDir / 'cbf'))
+            self.assertTrue(cbfPath.endswith(
+                '_{0:06d}.cbf'.format(imageNumber)))
+            self.assertTrue(os.path.exists(cbfPath))
+
+    def testConvertToCBF(self):
+        tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='ControlDozor_'))
+        try:
+            self.convertToCBF(tmpDir)
+        finally:
+            shutil.rmtree(str(tmpDir), ignore_errors=True)
+
+    def testConvertToCBF_eiger2cbf(self):
+        # With 'useEiger2cbf' each batch is converted by eiger2cbf
+        tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='ControlDozor_'))
+        path = os.environ['PATH']
+        try:
+            (tmpDir / 'bin').mkdir()
+            eiger2cbfPath = tmpDir / 'bin' / 'eiger2cbf'
+            eiger2cbfPath.write_text(FAKE_EIGER2CBF)
+            eiger2cbfPath.chmod(0o755)
+            os.environ['PATH'] = str(tmpDir / 'bin') + os.pathsep + path
+            with unittest.mock.patch.object(
+                    H5ToCBFTask, 'isUsingEiger2cbf', return_value=True):
+                self.convertToCBF(tmpDir)
+            self.assertEqual(len(list(tmpDir.glob('H5ToCBFTask_*'))), 3)
+        finally:
+            os.environ['PATH'] = path
+            shutil.rmtree(str(tmpDir), ignore_errors=True)
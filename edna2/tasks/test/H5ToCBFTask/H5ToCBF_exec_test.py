@@ -24,11 +24,16 @@ __license__ = "MIT"
 __date__ = "21/04/2019"
 
 import os
+import shutil
+import tempfile
 import unittest
+import subprocess
 
 from edna2.tasks.H5ToCBFTask import H5ToCBFTask
 
+from edna2.utils import UtilsCBF
 from edna2.utils import UtilsTest
+from edna2.utils import UtilsEiger
 from edna2.utils import UtilsConfig
 
 
@@ -65,3 +70,28 @@ class H5ToCBFExecTest(unittest.TestCase):
             template = outData['outputCBFFileTemplate']
             filePath = template.replace('######', '{0:06d}').format(index)
             self.assertTrue(os.path.exists(filePath))
+
+    @unittest.skipIf(shutil.which('eiger2cbf') is None,
+                     'Cannot compare with eiger2cbf, not installed')
+    def test_native_sameAsEiger2cbf(self):
+        import fabio
+        masterPath = UtilsTest.getTestImageDirPath() / 'mesh-mx415_1_1_master.h5'
+        tmpDir = tempfile.mkdtemp(prefix='H5ToCBF_')
+        try:
+            referencePath = os.path.join(tmpDir, 'reference.cbf')
+            subprocess.run(['eiger2cbf', str(masterPath), '1', referencePath],
+                           check=True)
+            nativePath = os.path.join(tmpDir, 'native.cbf')
+            UtilsEiger.convertToCBF(masterPath, [(1, nativePath)])
+            self.assertTrue(
+                (fabio.open(nativePath).data ==
+                 fabio.open(referencePath).data).all())
+            referenceHeader = UtilsCBF.readHeader(referencePath)
+            nativeHeader = UtilsCBF.readHeader(nativePath)
+            for key in ['wavelength', 'detectorDistance', 'beamX', 'beamY',
+                        'startAngle', 'angleIncrement', 'exposureTime']:
+                self.assertAlmostEqual(getattr(nativeHeader, key),
+                                       getattr(referenceHeader, key),
+                                       places=4)
+        finally:
+            shutil.rmtree(tmpDir, ignore_errors=True)
@@ -23,7 +23,9 @@ __authors__ = ["O. Svensson"]
 __license__ = "MIT"
 __date__ = "21/04/2019"
 
+import shutil
 import pathlib
+import tempfile
 import unittest
 
 from edna2.tasks.H5ToCBFTask import H5ToCBFTask
@@ -60,3 +62,49 @@ class H5ToCBFUnitTest(unittest.TestCase):
             inData, directory, prefix, hdf5File)
         self.assertTrue(commandLine is not None)
         self.assertTrue(template is not None)
+
+    def test_getFramesInRange(self):
+        listFrame = H5ToCBFTask.getFramesInRange(
+            3, 5, pathlib.Path('/data/mesh_1_'))
+        self.assertEqual(listFrame, [
+            (3, '/data/mesh_1_000003.cbf'),
+            (4, '/data/mesh_1_000004.cbf'),
+            (5, '/data/mesh_1_000005.cbf')
+        ])
+
+    def test_run_native(self):
+        tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='H5ToCBF_'))
+        try:
+            masterPath = UtilsTest.createSyntheticEigerMaster(
+                tmpDir, listNumberOfImages=(3, 2))
+            inData = {
+                'hdf5File': str(masterPath),
+                'startImageNumber': 2,
+                'endImageNumber': 5,
+                'forcedOutputDirectory': str(tmpDir / 'cbf'),
+                'workingDirectory': str(tmpDir)
+            }
+            h5ToCBF = H5ToCBFTask(inData=inData)
+            h5ToCBF.execute()
+            self.assertTrue(h5ToCBF.isSuccess())
+            template = h5ToCBF.outData['outputCBFFileTemplate']
+            for imageNumber in range(2, 6):
+                cbfPath = pathlib.Path(template.replace(
+                    '######', '{0:06d}'.format(imageNumber)))
+                self.assertTrue(cbfPath.exists())
+        finally:
+            shutil.rmtree(str(tmpDir), ignore_errors=True)
+
+    def test_run_noImageNumber(self):
+        tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='H5ToCBF_'))
+        try:
+            inData = {
+                'hdf5File': str(tmpDir / 'mesh_1_1_master.h5'),
+                'startImageNumber': 2,
+                'workingDirectory': str(tmpDir)
+            }
+            h5ToCBF = H5ToCBFTask(inData=inData)
+            h5ToCBF.execute()
+            self.assertTrue(h5ToCBF.isFailure())
+        finally:
+            shutil.rmtree(str(tmpDir), ignore_errors=True)
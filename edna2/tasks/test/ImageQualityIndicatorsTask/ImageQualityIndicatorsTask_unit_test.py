@@ -23,17 +23,46 @@ __authors__ = ["O. Svensson"]
 __license__ = "MIT"
 __date__ = "21/04/2019"
 
+import time
+import shutil
 import logging
 import pathlib
+import tempfile
 import unittest
+import threading
+import unittest.mock
 
+from edna2.utils import UtilsConfig
 from edna2.utils import UtilsLogging
+from edna2.utils import UtilsMetrics
 
+from edna2.tasks.AbstractTask import AbstractTask
+from edna2.tasks.AbstractTask import EXECUTOR_THREAD
 from edna2.tasks.ImageQualityIndicatorsTask import ImageQualityIndicatorsTask
 
 logger = UtilsLogging.getLogger()
 
 
+class FakeControlDozor(AbstractTask):
+    # Scores the images of a batch without running dozor
+
+    def run(self, inData):
+        listImageQualityIndicators = []
+        for number in range(inData['startNo'], inData['endNo'] + 1):
+            imageName = inData['template'].replace(
+                '####', '{0:04d}'.format(number))
+            listImageQualityIndicators.append({
+                'number': number,
+                'angle': 0.1 * number,
+                'image': str(pathlib.Path(inData['directory']) / imageName),
+                'dozorScore': float(number),
+                'dozorSpotsResolution': 2.0,
+                'dozorVisibleResolution': 2.0
+            })
+        return {'imageQualityIndicators': listImageQualityIndicators,
+                'detectorType': 'PILATUS3_2M'}
+
+
 class ImageQualityIndicatorsUnitTest(unittest.TestCase):
 
     def testGetH5FilePath(self):
@@ -96,3 +125,64 @@ class ImageQualityIndicatorsUnitTest(unittest.TestCase):
         self.assertEqual(h5DataFilePath2,
                          h5DataFilePath2Reference,
                          "data path2")
+
+    def testObserveLatency(self):
+        UtilsMetrics.reset()
+        dictArrivalTime = {1: time.time() - 2, 2: time.time() - 1}
+        listImageQualityIndicators = [{'number': 1}, {'number': 2},
+                                      {'number': 3}]
+        ImageQualityIndicatorsTask.observeLatency(
+            listImageQualityIndicators, dictArrivalTime)
+        histogram = UtilsMetrics.getHistogram(
+            'edna2_iqi_latency_seconds', site=UtilsConfig.getSite())
+        self.assertEqual(histogram.count, 2)
+        self.assertGreaterEqual(histogram.sum, 3)
+        UtilsMetrics.reset()
+
+    def testStreamingBatches(self):
+        tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='IQI_'))
+        listImage = [str(tmpDir / 'mesh_1_{0:04d}.cbf'.format(number))
+                     for number in range(1, 5)]
+        for image in listImage[:2]:
+            pathlib.Path(image).write_bytes(b'image')
+        listPartialResult = []
+        firstResult = threading.Event()
+
+        def onPartialResult(partialResult):
+            listPartialResult.append(partialResult)
+            firstResult.set()
+
+        task = ImageQualityIndicatorsTask(inData={
+            'image': listImage,
+            'batchSize': 2,
+            'doCrystfel': False,
+            'workingDirectory': str(tmpDir)
+        })
+        task.setPartialResultCallback(onPartialResult)
+        try:
+            with unittest.mock.patch(
+                    'edna2.tasks.ImageQualityIndicatorsTask.ControlDozor',
+                    FakeControlDozor):
+                thread = threading.Thread(
+                    target=task.execute, kwargs={'executor': EXECUTOR_THREAD})
+                thread.start()
+                # The first batch is processed while the second one is
+                # still being collected
+                self.assertTrue(firstResult.wait(30))
+                self.assertEqual(
+                    [indicators['number'] for indicators
+                     in listPartialResult[0]['imageQualityIndicators']],
+                    [1, 2])
+                for image in listImage[2:]:
+                    pathlib.Path(image).write_bytes(b'image')
+                thread.join(60)
+            self.assertFalse(task.isFailure())
+            self.assertEqual(len(listPartialResult), 2)
+            self.assertEqual(
+                [indicators['number'] for indicators
+                 in task.outData['imageQualityIndicators']], [1, 2, 3, 4])
+            # The sub-tasks are created in the working directory of the task
+            self.assertEqual(len(list(task.getWorkingDirectory().glob(
+                'FakeControlDozor_*'))), 2)
+        finally:
+            shutil.rmtree(str(tmpDir), ignore_errors=True)
@@ -0,0 +1,84 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import os
+import shutil
+import pathlib
+import tempfile
+import unittest
+
+from edna2.tasks.AbstractTask import EXECUTOR_ASYNC
+from edna2.tasks.PhenixTasks import DistlSignalStrengthTask
+
+# Output of distl.signal_strength, reduced to the parsed lines
+DISTL_LOG = """\
+  Spot Total :   1052
+  In-Resolution Total :    988
+  Good Bragg Candidates :    861
+  Ice Rings :      0
+  Method 1 Resolution :   2.11
+  Method 2 Resolution :   2.25
+"""
+
+
+class PhenixTaskUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        # Fake distl.signal_strength printing the log above
+        self.tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='PhenixTask_'))
+        binPath = self.tmpDir / 'bin'
+        binPath.mkdir()
+        executablePath = binPath / 'distl.signal_strength'
+        executablePath.write_text("#!/bin/sh\ncat << EOF\n{0}EOF\n".format(
+            DISTL_LOG))
+        executablePath.chmod(0o755)
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = str(binPath) + os.pathsep + self.path
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        shutil.rmtree(str(self.tmpDir), ignore_errors=True)
+
+    def test_execute_distlSignalStrength_async(self):
+        inData = {
+            'referenceImage': str(self.tmpDir / 'ref-testscale_1_0001.img'),
+            'workingDirectory': str(self.tmpDir)
+        }
+        distlSignalStrengthTask = DistlSignalStrengthTask(inData=inData)
+        distlSignalStrengthTask.execute(executor=EXECUTOR_ASYNC)
+        self.assertTrue(distlSignalStrengthTask.isSuccess())
+        self.assertEqual(distlSignalStrengthTask.outData, {
+            'imageQualityIndicators': {
+                'spotTotal': 1052,
+                'inResTotal': 988,
+                'goodBraggCandidates': 861,
+                'iceRings': 0,
+                'method1Res': 2.11,
+                'method2Res': 2.25
+            }
+        })
+        self.assertEqual(distlSignalStrengthTask.getOutData(),
+                         distlSignalStrengthTask.outData)
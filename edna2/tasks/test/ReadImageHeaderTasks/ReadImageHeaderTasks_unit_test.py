@@ -17,7 +17,12 @@
 # IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+import os
+import shutil
+import pathlib
+import tempfile
 import unittest
+import unittest.mock
 
 from edna2.utils import UtilsTest
 from edna2.utils import UtilsConfig
@@ -51,3 +56,58 @@ class ReadImageHeaderTasksUnitTest(unittest.TestCase):
             dictHeader['description'],
             'Dectris Eiger 4M'
         )
+
+
+def writeCBFImage(path, startAngle):
+    # Minimal Pilatus CBF image, padded to look like a complete image
+    listLine = [
+        '###CBF: VERSION 1.5',
+        '_array_data.header_contents',
+        ';',
+        '# Detector: PILATUS 2M, S/N 24-0118, ESRF ID23',
+        '# 2016-02-04T10:00:00.000',
+        '# Pixel_size 172e-6 m x 172e-6 m',
+        '# Exposure_time 0.1000 s',
+        '# Wavelength 0.9000 A',
+        '# Detector_distance 0.20000 m',
+        '# Beam_xy (700.00, 800.00) pixels',
+        '# Start_angle {0:.4f} deg.'.format(startAngle),
+        '# Angle_increment 0.1000 deg.',
+        ';',
+        '_array_data.data'
+    ]
+    with open(str(path), 'wb') as f:
+        f.write('\r\n'.join(listLine).encode('utf-8') + b'\r\n')
+        f.write(b'\0' * 200000)
+
+
+class ReadImageHeaderCacheUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='ReadImageHeader_'))
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmpDir), ignore_errors=True)
+
+    def test_headerCache(self):
+        listImagePath = []
+        for number in range(1, 5):
+            imagePath = self.tmpDir / 'mesh_1_{0:04d}.cbf'.format(number)
+            writeCBFImage(imagePath, startAngle=number * 0.1)
+            listImagePath.append(str(imagePath))
+        listSubWedge = ReadImageHeader.readImageHeaders(listImagePath)
+        self.assertEqual(
+            [subWedge['image'][0]['number'] for subWedge in listSubWedge],
+            [1, 2, 3, 4])
+        # Unchanged images are not read again
+        with unittest.mock.patch.object(
+                ReadImageHeader, 'createCBFHeaderData',
+                side_effect=AssertionError('header read')):
+            self.assertEqual(
+                ReadImageHeader.readImageHeaders(listImagePath), listSubWedge)
+        # A rewritten image is read again
+        writeCBFImage(listImagePath[0], startAngle=45.0)
+        os.utime(listImagePath[0], ns=(0, 0))
+        subWedge = ReadImageHeader.getSubWedge(listImagePath[0])
+        goniostat = subWedge['experimentalCondition']['goniostat']
+        self.assertEqual(goniostat['rotationAxisStart'], 45.0)
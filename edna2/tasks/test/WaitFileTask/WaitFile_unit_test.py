@@ -0,0 +1,66 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import time
+import shutil
+import pathlib
+import tempfile
+import threading
+import unittest
+
+from edna2.tasks.AbstractTask import EXECUTOR_ASYNC
+from edna2.tasks.WaitFileTask import WaitFileTask
+
+
+class WaitFileUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='WaitFile_'))
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmpDir), ignore_errors=True)
+
+    def test_asyncExecutor(self):
+        # Many waits share the event loop of the process
+        numberOfTasks = 200
+        listTask = []
+        for index in range(numberOfTasks):
+            inData = {
+                'file': str(self.tmpDir / 'file_{0:04d}'.format(index)),
+                'timeOut': 10,
+                'workingDirectory': str(self.tmpDir)
+            }
+            waitFile = WaitFileTask(inData=inData)
+            waitFile.start(executor=EXECUTOR_ASYNC)
+            listTask.append(waitFile)
+        numberOfThreads = threading.active_count()
+        for index in range(numberOfTasks):
+            (self.tmpDir / 'file_{0:04d}'.format(index)).write_text('data')
+        for waitFile in listTask:
+            waitFile.join()
+            self.assertFalse(waitFile.isFailure())
+            self.assertFalse(waitFile.outData['timedOut'])
+            self.assertEqual(waitFile.outData['finalSize'], 4)
+        self.assertTrue(numberOfThreads < numberOfTasks)
@@ -0,0 +1,75 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Event loop for running I/O bound tasks (executor 'async' of AbstractTask).
+# One loop runs in a background thread per process, so that thousands of
+# tasks waiting on the file system or the network can share one thread.
+
+import os
+import asyncio
+import threading
+
+_loop = None
+_loopPid = None
+_loopLock = threading.Lock()
+
+
+def _runLoop(loop):
+    asyncio.set_event_loop(loop)
+    loop.run_forever()
+
+
+def getLoop():
+    """
+    Returns the event loop shared by all tasks in this process, the loop
+    is started in a daemon thread the first time.
+    """
+    global _loop
+    global _loopPid
+    with _loopLock:
+        # A forked child must not reuse the loop of its parent
+        if _loop is None or _loopPid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loopPid = os.getpid()
+            thread = threading.Thread(target=_runLoop, args=(_loop,),
+                                      name='EDNA2AsyncLoop')
+            thread.daemon = True
+            thread.start()
+    return _loop
+
+
+def submit(coroutine):
+    """
+    Schedules a coroutine in the shared event loop, returns a
+    concurrent.futures.Future
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, getLoop())
+
+
+def run(coroutine):
+    """
+    Runs a coroutine in the shared event loop and returns its result
+    """
+    return submit(coroutine).result()
@@ -0,0 +1,408 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Parser of CBF image headers. Only the header block is read: the file
+# is read in growing chunks until the start of the binary section, then
+# the Pilatus header ('# key value' lines) and the MIME header of the
+# binary section are parsed in one pass.
+#
+# Images are written and read with the byte offset compression of CBFlib,
+# computed with numpy on the whole image. fabio decodes faster than the
+# numpy decoder, which is only used for reading when fabio is missing.
+
+import re
+import base64
+import hashlib
+import pathlib
+
+# Start of the binary data in a CBF file
+BINARY_MARKER = b'\x0c\x1a\x04\xd5'
+BINARY_SECTION = '--CIF-BINARY-FORMAT-SECTION--'
+
+# '# key value' lines of the Pilatus header. The lines are matched from
+# the preceding newline: a literal prefix is much faster to scan for
+# than a multi-line '^' anchor.
+PILATUS_LINE = re.compile(r'\n# ?([^\r\n]*)')
+# 'Key: value' lines of the MIME header of the binary section
+MIME_LINE = re.compile(r'\n([A-Za-z][\w-]*):[ \t]*([^\r\n]*)')
+MIME_CONVERSIONS = re.compile(r'conversions="([^"]*)"')
+
+# Padding written after the binary data, as CBFlib does
+BINARY_PADDING = 4095
+
+# A Pilatus header is a few KB
+READ_SIZE = 4096
+MAX_HEADER_SIZE = 1048576
+
+
+class CBFHeader(object):
+    """
+    Header of a CBF image. The values of the Pilatus header are in the
+    units of the header (m, s, Angstrom, degrees, pixels), None when
+    missing. dictHeader and dictMime contain all the entries as strings.
+    """
+
+    def __init__(self, path, dictHeader, dictMime, binaryOffset=None):
+        self.path = path
+        self.dictHeader = dictHeader
+        self.dictMime = dictMime
+        # Offset of the binary data in the file, None if not found
+        self.binaryOffset = binaryOffset
+        self.detector = dictHeader.get('Detector:')
+        self.dateTime = dictHeader.get('DateTime')
+        pixelSize = dictHeader.get('Pixel_size', '').split()
+        self.pixelSizeX = _toFloat(pixelSize[0]) if len(pixelSize) > 0 else None
+        self.pixelSizeY = _toFloat(pixelSize[3]) if len(pixelSize) > 3 else None
+        self.exposureTime = _getFloat(dictHeader, 'Exposure_time')
+        self.exposurePeriod = _getFloat(dictHeader, 'Exposure_period')
+        self.wavelength = _getFloat(dictHeader, 'Wavelength')
+        self.detectorDistance = _getFloat(dictHeader, 'Detector_distance')
+        beam = dictHeader.get('Beam_xy', '')
+        for character in '(),':
+            beam = beam.replace(character, ' ')
+        beam = beam.split()
+        self.beamX = _toFloat(beam[0]) if len(beam) > 0 else None
+        self.beamY = _toFloat(beam[1]) if len(beam) > 1 else None
+        self.startAngle = _getFloat(dictHeader, 'Start_angle')
+        self.angleIncrement = _getFloat(dictHeader, 'Angle_increment')
+        # Binary section
+        self.conversions = dictMime.get('conversions')
+        self.binarySize = _getInt(dictMime, 'X-Binary-Size')
+        self.elementType = dictMime.get('X-Binary-Element-Type', '').strip('"')
+        self.byteOrder = dictMime.get('X-Binary-Element-Byte-Order')
+        self.numberOfElements = _getInt(dictMime, 'X-Binary-Number-of-Elements')
+        self.fastDimension = _getInt(dictMime, 'X-Binary-Size-Fastest-Dimension')
+        self.slowDimension = _getInt(dictMime, 'X-Binary-Size-Second-Dimension')
+        self.padding = _getInt(dictMime, 'X-Binary-Size-Padding')
+
+    def getDetectorName(self):
+        """
+        Returns the detector model, e.g. ['PILATUS3', '2M']
+        """
+        if self.detector is None:
+            return None
+        return self.detector.replace(',', '').split()[0:2]
+
+
+def _toFloat(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _getFloat(dictHeader, key):
+    # First word of the value, e.g. '0.1000 s'
+    listValue = dictHeader.get(key, '').split()
+    return _toFloat(listValue[0]) if listValue else None
+
+
+def _getInt(dictHeader, key):
+    value = dictHeader.get(key)
+    return int(value) if value is not None else None
+
+
+def readHeaderBlock(path):
+    """
+    Returns the bytes before the binary data of a CBF file and the offset
+    of the binary data (None if not found)
+    """
+    with open(str(path), 'rb') as f:
+        block = f.read(READ_SIZE)
+        while True:
+            index = block.find(BINARY_MARKER)
+            if index >= 0:
+                return block[:index], index + len(BINARY_MARKER)
+            if len(block) >= MAX_HEADER_SIZE:
+                return block, None
+            chunk = f.read(len(block))
+            if not chunk:
+                return block, None
+            block += chunk
+
+
+def parseHeader(block, path=None, binaryOffset=None):
+    """
+    Returns the CBFHeader of the header block of a CBF file
+    """
+    text = block.decode('latin-1')
+    dictHeader = {}
+    start = text.find('_array_data.header_contents')
+    if start >= 0:
+        end = text.find('_array_data.data', start)
+        for value in PILATUS_LINE.findall(text, start, end if end >= 0 else len(text)):
+            if len(value) > 8 and value[4] == '/' and value[8] == '/':
+                dictHeader['DateTime'] = value
+            else:
+                listWord = value.split(' ', 1)
+                dictHeader[listWord[0]] = \
+                    listWord[1] if len(listWord) > 1 else ''
+    dictMime = {}
+    start = text.find(BINARY_SECTION)
+    if start >= 0:
+        dictMime = dict(MIME_LINE.findall(text, start))
+        match = MIME_CONVERSIONS.search(text, start)
+        if match is not None:
+            dictMime['conversions'] = match.group(1)
+    return CBFHeader(path, dictHeader, dictMime, binaryOffset)
+
+
+def readHeader(path):
+    """
+    Returns the CBFHeader of a CBF file
+    """
+    block, binaryOffset = readHeaderBlock(path)
+    return parseHeader(block, path=str(path), binaryOffset=binaryOffset)
+
+
+def compressByteOffset(data):
+    """
+    Returns the CBF byte offset compression of an integer array. Each
+    difference to the previous pixel is written on 1 byte, or after an
+    escape byte 0x80 on 2 bytes, or after the escape 0x80 0x00 0x80 on 4
+    bytes, or after the escape 0x80 0x00 0x80 0x00 0x00 0x00 0x80 on 8
+    bytes (little endian).
+    """
+    import numpy
+    values = numpy.ravel(data)
+    # As in CBFlib, differences of 32 bit data wrap around modulo 2**32:
+    # they always fit in an int32 escape, and the int64 escape is only
+    # used for wider data
+    if numpy.can_cast(values.dtype, numpy.int32):
+        values = values.astype(numpy.int32, copy=False)
+    else:
+        values = values.astype(numpy.int64, copy=False)
+    delta = numpy.empty_like(values)
+    delta[:1] = values[:1]
+    numpy.subtract(values[1:], values[:-1], out=delta[1:])
+    isByte = (delta + 127).view(numpy.uint32 if values.dtype == numpy.int32
+                                else numpy.uint64) <= 254
+    if isByte.all():
+        return delta.astype(numpy.int8).tobytes()
+    # The most negative value of each size is the escape value
+    index = numpy.flatnonzero(~isByte)
+    longDelta = delta[index].astype(numpy.int64)
+    absDelta = numpy.abs(longDelta)
+    longSize = numpy.where(absDelta < 0x8000, 3,
+                           numpy.where(absDelta < 0x80000000, 7, 15))
+    size = numpy.ones(values.size, dtype=numpy.int64)
+    size[index] = longSize
+    offset = numpy.cumsum(size) - size
+    output = numpy.empty(int(offset[-1] + size[-1]), dtype=numpy.uint8)
+    output[offset] = delta.astype(numpy.int8).view(numpy.uint8)
+    offset = offset[index]
+    for length, prefix, dtype in [
+            (3, b'\x80', '<i2'),
+            (7, b'\x80\x00\x80', '<i4'),
+            (15, b'\x80\x00\x80\x00\x00\x00\x80', '<i8')]:
+        isSize = longSize == length
+        position = offset[isSize]
+        for byteIndex, byte in enumerate(prefix):
+            output[position + byteIndex] = byte
+        value = longDelta[isSize].astype(dtype).view(numpy.uint8)
+        value = value.reshape(-1, numpy.dtype(dtype).itemsize)
+        for byteIndex in range(value.shape[1]):
+            output[position + len(prefix) + byteIndex] = value[:, byteIndex]
+    return output.tobytes()
+
+
+def decompressByteOffset(buffer, numberOfElements, out=None):
+    """
+    Returns the numberOfElements integers of CBF byte offset compressed
+    data. buffer can be bytes, a memoryview, a mmap or a numpy array.
+    The values are written to out if given (e.g. a slice of a 3D stack,
+    which has to be viewable as 1D), otherwise to a new int32 array.
+    """
+    import numpy
+    if out is None:
+        out = numpy.empty(numberOfElements, dtype=numpy.int32)
+    elif out.size != numberOfElements:
+        raise ValueError('Output of size {0} for {1} elements'.format(
+            out.size, numberOfElements))
+    flatOut = out.reshape(-1)
+    if not numpy.shares_memory(flatOut, out):
+        raise ValueError('Output array cannot be viewed as 1D')
+    data = numpy.frombuffer(buffer, dtype=numpy.uint8)
+    listCandidate = numpy.flatnonzero(data == 0x80)
+    if listCandidate.size == 0:
+        # Only single byte differences
+        numpy.cumsum(data[:numberOfElements].view(numpy.int8),
+                     dtype=flatOut.dtype, out=flatOut)
+        return out
+    # Size of the value starting at each 0x80 byte, as if it was an escape
+    padded = numpy.concatenate([data, numpy.zeros(15, dtype=numpy.uint8)])
+    listSize = numpy.full(listCandidate.size, 3)
+    is32 = (padded[listCandidate + 1] == 0x00) & \
+        (padded[listCandidate + 2] == 0x80)
+    listSize[is32] = 7
+    index32 = listCandidate[is32]
+    is64 = (padded[index32 + 3] == 0x00) & (padded[index32 + 4] == 0x00) & \
+        (padded[index32 + 5] == 0x00) & (padded[index32 + 6] == 0x80)
+    listSize[numpy.flatnonzero(is32)[is64]] = 15
+    # 0x80 bytes inside the value of a previous escape are not escapes.
+    # Only the candidates which may be inside a previous one, and the
+    # candidates just before them, need to be resolved; such chains are
+    # short, a few iterations resolve them.
+    maxEnd = numpy.maximum.accumulate(listCandidate + listSize)
+    isEscape = numpy.ones(listCandidate.size, dtype=bool)
+    isEscape[1:] = maxEnd[:-1] <= listCandidate[1:]
+    listIndex = numpy.flatnonzero(~isEscape)
+    listIndex = numpy.union1d(listIndex, listIndex - 1)
+    subCandidate = listCandidate[listIndex]
+    subSize = listSize[listIndex]
+    isSubEscape = numpy.ones(listIndex.size, dtype=bool)
+    while listIndex.size > 0:
+        maxEnd = numpy.maximum.accumulate(
+            numpy.where(isSubEscape, subCandidate + subSize, 0))
+        isCovered = numpy.zeros(listIndex.size, dtype=bool)
+        isCovered[1:] = maxEnd[:-1] > subCandidate[1:]
+        if numpy.array_equal(isSubEscape, ~isCovered):
+            break
+        isSubEscape = ~isCovered
+    isEscape[listIndex] = isSubEscape
+    listEscape = listCandidate[isEscape]
+    listSize = listSize[isEscape]
+    # int32 sums wrap around like the int64 differences
+    deltaType = numpy.int32 if flatOut.dtype == numpy.int32 else numpy.int64
+    delta = data.view(numpy.int8).astype(deltaType)
+    isStart = numpy.ones(padded.size, dtype=bool)
+    for size, valueType in [(3, numpy.int16), (7, numpy.int32),
+                            (15, numpy.int64)]:
+        position = listEscape[listSize == size]
+        # Little endian value in the last bytes
+        firstByte = size - numpy.dtype(valueType).itemsize
+        value = numpy.zeros(position.size, dtype=numpy.uint64)
+        for byteIndex in range(1, size):
+            isStart[position + byteIndex] = False
+            if byteIndex >= firstByte:
+                value |= padded[position + byteIndex].astype(numpy.uint64) << \
+                    numpy.uint64(8 * (byteIndex - firstByte))
+        delta[position] = value.view(numpy.int64).astype(valueType)
+    isStart = isStart[:data.size]
+    delta = delta[isStart][:numberOfElements]
+    numpy.cumsum(delta, dtype=flatOut.dtype, out=flatOut)
+    return out
+
+
+def readImage(path, out=None):
+    """
+    Returns the data of a CBF file as a 2D int32 array (slow dimension
+    first), written to out if given. The data is decoded by fabio if
+    installed, which is faster, otherwise by decodeImage.
+    """
+    try:
+        import fabio
+    except ImportError:
+        return decodeImage(path, out=out)
+    data = fabio.open(str(path)).data
+    if out is None:
+        return data.astype('int32', copy=False)
+    out[...] = data
+    return out
+
+
+def decodeImage(path, out=None):
+    """
+    Returns the data of a byte offset compressed CBF file as a 2D int32
+    array (slow dimension first), decoded with numpy. The values are
+    written to out if given.
+    """
+    import numpy
+    cbfHeader = readHeader(path)
+    if cbfHeader.binaryOffset is None or \
+            cbfHeader.conversions != 'x-CBF_BYTE_OFFSET':
+        raise RuntimeError('No byte offset compressed data in {0}'.format(path))
+    with open(str(path), 'rb') as f:
+        f.seek(cbfHeader.binaryOffset)
+        buffer = f.read(cbfHeader.binarySize)
+    shape = (cbfHeader.slowDimension, cbfHeader.fastDimension)
+    if out is None:
+        out = numpy.empty(shape, dtype=numpy.int32)
+    return decompressByteOffset(buffer, cbfHeader.numberOfElements, out=out)
+
+
+def readStack(listPath):
+    """
+    Returns the data of CBF files of the same size as a 3D int32 array,
+    each image being read into its slice of the stack
+    """
+    import numpy
+    if len(listPath) == 0:
+        return numpy.empty((0, 0, 0), dtype=numpy.int32)
+    first = readImage(listPath[0])
+    stack = numpy.empty((len(listPath),) + first.shape, dtype=numpy.int32)
+    stack[0] = first
+    for index, path in enumerate(listPath[1:], start=1):
+        readImage(path, out=stack[index])
+    return stack
+
+
+def writeImage(path, data, listHeaderLine, dataName=None):
+    """
+    Writes a 2D integer array to a CBF file with byte offset compression.
+    listHeaderLine contains the lines of the Pilatus header without the
+    leading '# '.
+    """
+    path = pathlib.Path(path)
+    slowDimension, fastDimension = data.shape
+    binaryData = compressByteOffset(data)
+    md5 = base64.b64encode(hashlib.md5(binaryData).digest()).decode('ascii')
+    listLine = [
+        '###CBF: VERSION 1.5, CBFlib v0.7.8 - SLS/DECTRIS PILATUS detectors',
+        '',
+        'data_' + (dataName or path.stem),
+        '',
+        '_array_data.header_convention "PILATUS_1.2"',
+        '_array_data.header_contents',
+        ';'
+    ]
+    listLine += ['# ' + line for line in listHeaderLine]
+    listLine += [
+        ';',
+        '',
+        '_array_data.data',
+        ';',
+        BINARY_SECTION,
+        'Content-Type: application/octet-stream;',
+        '     conversions="x-CBF_BYTE_OFFSET"',
+        'Content-Transfer-Encoding: BINARY',
+        'X-Binary-Size: {0}'.format(len(binaryData)),
+        'X-Binary-ID: 1',
+        'X-Binary-Element-Type: "signed 32-bit integer"',
+        'X-Binary-Element-Byte-Order: LITTLE_ENDIAN',
+        'Content-MD5: {0}'.format(md5),
+        'X-Binary-Number-of-Elements: {0}'.format(data.size),
+        'X-Binary-Size-Fastest-Dimension: {0}'.format(fastDimension),
+        'X-Binary-Size-Second-Dimension: {0}'.format(slowDimension),
+        'X-Binary-Size-Padding: {0}'.format(BINARY_PADDING),
+        ''
+    ]
+    with open(str(path), 'wb') as f:
+        f.write('\r\n'.join(listLine).encode('latin-1') + b'\r\n')
+        f.write(BINARY_MARKER)
+        f.write(binaryData)
+        f.write(b'\0' * BINARY_PADDING)
+        f.write(('\r\n' + BINARY_SECTION + '--\r\n;\r\n\r\n').encode('ascii'))
+    return path
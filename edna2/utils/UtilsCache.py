@@ -0,0 +1,280 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Content addressed cache of task results. The key of a task is a hash
+# of its class, its input data and the size and modification time of
+# the files referenced in the input data, and of the input files the
+# task declares with getCacheInputFiles (e.g. images given by a
+# template), which are marked as missing until they exist. Results are
+# kept in a LRU cache in memory and, if a cache directory is configured,
+# on disk. Concurrent identical requests in the same process are
+# coalesced: only the first one is executed, the others wait for its
+# result, which is released as soon as the first one has finished.
+#
+# A second cache instance, configured by [HeaderCache], holds the image
+# headers read by ReadImageHeader.
+
+import os
+import json
+import hashlib
+import pathlib
+import tempfile
+import threading
+import collections
+
+from edna2.utils import UtilsConfig
+from edna2.utils import UtilsLogging
+
+logger = UtilsLogging.getLogger()
+
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_SIZE = 1000  # MB
+
+# Keys in inData which don't change the result of a task
+LIST_VOLATILE_KEY = ['workingDirectory', 'traceContext']
+
+_cache = None
+_headerCache = None
+_cacheLock = threading.Lock()
+
+
+def getFileFingerprints(inData):
+    """
+    Returns a sorted list of [path, size, mtime] of all existing files
+    referenced by absolute paths in inData.
+    """
+    listFingerprint = []
+    listValue = [inData]
+    while listValue:
+        value = listValue.pop()
+        if isinstance(value, dict):
+            listValue += list(value.values())
+        elif isinstance(value, list):
+            listValue += value
+        elif isinstance(value, str) and value.startswith(os.sep):
+            try:
+                stat = os.stat(value)
+            except (OSError, ValueError):
+                continue
+            if os.path.isfile(value):
+                listFingerprint.append([value, stat.st_size, stat.st_mtime_ns])
+    return sorted(listFingerprint)
+
+
+def getPathFingerprints(listPath):
+    """
+    Returns a list of [path, size, mtime] of the files in listPath, with
+    size and mtime None for the files which don't exist (yet).
+    """
+    listFingerprint = []
+    for path in listPath:
+        path = str(path)
+        try:
+            stat = os.stat(path)
+            listFingerprint.append([path, stat.st_size, stat.st_mtime_ns])
+        except (OSError, ValueError):
+            listFingerprint.append([path, None, None])
+    return listFingerprint
+
+
+def getCacheKey(task, inData=None):
+    if inData is None:
+        inData = task.getInData()
+    inData = {key: value for key, value in inData.items()
+              if key not in LIST_VOLATILE_KEY}
+    keyData = {
+        'task': task.__class__.__module__ + '.' + task.__class__.__name__,
+        'inData': inData,
+        'files': getFileFingerprints(inData),
+        'inputFiles': getPathFingerprints(task.getCacheInputFiles(inData))
+    }
+    keyString = json.dumps(keyData, sort_keys=True, default=str)
+    return hashlib.sha256(keyString.encode('utf-8')).hexdigest()
+
+
+class ResultCache(object):
+    """
+    LRU cache of JSON strings in memory with an optional store on disk
+    limited in size (MB). Entries on disk are evicted by modification
+    time, which is updated on each hit.
+    """
+
+    def __init__(self, directory=None, maxEntries=DEFAULT_MAX_ENTRIES,
+                 maxSize=DEFAULT_MAX_SIZE):
+        self._directory = None
+        if directory is not None:
+            self._directory = pathlib.Path(directory)
+            self._directory.mkdir(mode=0o755, parents=True, exist_ok=True)
+        self._maxEntries = maxEntries
+        self._maxSize = maxSize * 1000000
+        self._diskSize = None
+        self._dictMemory = collections.OrderedDict()
+        self._dictInFlight = {}
+        self._lock = threading.Lock()
+
+    def _getPath(self, key):
+        return self._directory / key[0:2] / (key + '.json')
+
+    def get(self, key):
+        """
+        Returns the cached value or None.
+        """
+        with self._lock:
+            if key in self._dictMemory:
+                self._dictMemory.move_to_end(key)
+                return self._dictMemory[key]
+        value = None
+        if self._directory is not None:
+            path = self._getPath(key)
+            try:
+                with open(str(path)) as f:
+                    value = f.read()
+                os.utime(str(path))
+            except OSError:
+                value = None
+            if value is not None:
+                self._putMemory(key, value)
+        return value
+
+    def put(self, key, value):
+        self._putMemory(key, value)
+        if self._directory is not None:
+            self._putDisk(key, value)
+
+    def _putMemory(self, key, value):
+        with self._lock:
+            self._dictMemory[key] = value
+            self._dictMemory.move_to_end(key)
+            while len(self._dictMemory) > self._maxEntries:
+                self._dictMemory.popitem(last=False)
+
+    def _putDisk(self, key, value):
+        path = self._getPath(key)
+        try:
+            path.parent.mkdir(mode=0o755, exist_ok=True)
+            fd, tmpPath = tempfile.mkstemp(dir=str(path.parent),
+                                           suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write(value)
+            os.replace(tmpPath, str(path))
+        except OSError as e:
+            logger.warning('Cannot write cache entry {0}: {1}'.format(path, e))
+            return
+        with self._lock:
+            if self._diskSize is None:
+                self._diskSize = sum(p.stat().st_size for p in
+                                     self._directory.glob('*/*.json'))
+            else:
+                self._diskSize += len(value)
+            if self._diskSize > self._maxSize:
+                self._evictDisk()
+
+    def _evictDisk(self):
+        # Must be called with the lock acquired
+        listEntry = []
+        for path in self._directory.glob('*/*.json'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            listEntry.append((stat.st_mtime, stat.st_size, path))
+        listEntry.sort()
+        self._diskSize = sum(entry[1] for entry in listEntry)
+        # Evict down to 90% of the maximum size
+        while listEntry and self._diskSize > 0.9 * self._maxSize:
+            mtime, size, path = listEntry.pop(0)
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            self._diskSize -= size
+
+    def acquire(self, key):
+        """
+        Returns (value, event). If the value is cached it is returned.
+        Otherwise, if an identical request is in flight, returns the
+        event set when it finishes. Otherwise the caller becomes
+        responsible for the execution and must call release.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value, None
+        with self._lock:
+            if key in self._dictInFlight:
+                return None, self._dictInFlight[key]
+            self._dictInFlight[key] = threading.Event()
+        return None, None
+
+    def release(self, key, value=None):
+        """
+        Stores the value (if not None) and wakes up waiting requests.
+        """
+        if value is not None:
+            self.put(key, value)
+        with self._lock:
+            event = self._dictInFlight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def clear(self):
+        with self._lock:
+            self._dictMemory.clear()
+
+
+def getCache():
+    """
+    Returns the result cache of this process, configured by the
+    'directory', 'max_entries' and 'max_size' (MB) entries of [Cache].
+    """
+    global _cache
+    with _cacheLock:
+        if _cache is None:
+            _cache = ResultCache(
+                directory=UtilsConfig.get('Cache', 'directory'),
+                maxEntries=int(UtilsConfig.get(
+                    'Cache', 'max_entries', DEFAULT_MAX_ENTRIES)),
+                maxSize=int(UtilsConfig.get(
+                    'Cache', 'max_size', DEFAULT_MAX_SIZE))
+            )
+    return _cache
+
+
+def getHeaderCache():
+    """
+    Returns the image header cache of this process, configured by the
+    'directory', 'max_entries' and 'max_size' (MB) entries of
+    [HeaderCache]. Without directory headers are only kept in memory.
+    """
+    global _headerCache
+    with _cacheLock:
+        if _headerCache is None:
+            _headerCache = ResultCache(
+                directory=UtilsConfig.get('HeaderCache', 'directory'),
+                maxEntries=int(UtilsConfig.get(
+                    'HeaderCache', 'max_entries', DEFAULT_MAX_ENTRIES)),
+                maxSize=int(UtilsConfig.get(
+                    'HeaderCache', 'max_size', DEFAULT_MAX_SIZE))
+            )
+    return _headerCache
@@ -24,9 +24,15 @@ __license__ = "MIT"
 __date__ = "21/04/2019"
 
 import os
+import types
 import pathlib
+import threading
 import configparser
 
+# Merged task configs, see _getRawTaskConfig
+_dictCache = {}
+_cacheLock = threading.Lock()
+
 
 def getConfigDir():
     """
@@ -61,32 +67,81 @@ def setSite(site):
     os.environ["EDNA2_SITE"] = site
 
 
+def getConfigPath(site):
+    configFile = site + ".ini"
+    return getConfigDir() / configFile.lower()
+
+
 def getConfig(site=None):
     config = configparser.ConfigParser()
     if site is None:
         site = getSite()
-    configFile = site + ".ini"
-    configDir = getConfigDir()
-    configPath = configDir / configFile.lower()
+    configPath = getConfigPath(site)
     if configPath.exists():
         config.read(configPath.as_posix())
     return config
 
 
-def getTaskConfig(taskName, site=None):
+def _getFileStamp(path):
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _readTaskConfig(taskName, site, dictStamp):
+    # Returns the merged task config without substitution of ${}, the
+    # modification times of the files read are added to dictStamp
     dictConfig = {}
+    configPath = getConfigPath(site)
+    dictStamp[configPath] = _getFileStamp(configPath)
     config = getConfig(site)
     sections = config.sections()
     # First search in included configs
     if "Include" in sections:
-        for site in config["Include"]:
-            dictConfig.update(getTaskConfig(taskName, site))
+        for includedSite in config["Include"]:
+            dictConfig.update(_readTaskConfig(taskName, includedSite, dictStamp))
     # Then update with the current config
     if taskName in sections:
         dictConfig.update(dict(config[taskName]))
+    return dictConfig
+
+
+def _getRawTaskConfig(taskName, site=None):
+    """
+    Returns a read-only view of the merged task config, parsed once and
+    kept until one of the config files read is modified.
+    """
+    if site is None:
+        site = getSite()
+    key = (str(getConfigDir()), site.lower(), taskName)
+    entry = _dictCache.get(key)
+    if entry is not None:
+        dictStamp, dictConfig = entry
+        if all(_getFileStamp(path) == stamp
+               for path, stamp in dictStamp.items()):
+            return dictConfig
+    with _cacheLock:
+        dictStamp = {}
+        dictConfig = types.MappingProxyType(
+            _readTaskConfig(taskName, site, dictStamp))
+        _dictCache[key] = (dictStamp, dictConfig)
+    return dictConfig
+
+
+def reload():
+    """
+    Discards all cached configs, they are read again at the next lookup.
+    """
+    with _cacheLock:
+        _dictCache.clear()
+
+
+def getTaskConfig(taskName, site=None):
     # Substitute ${} from os.environ
-    for key in dictConfig:
-        dictConfig[key] = os.path.expandvars(dictConfig[key])
+    dictConfig = {}
+    for key, value in _getRawTaskConfig(taskName, site).items():
+        dictConfig[key] = os.path.expandvars(value)
     return dictConfig
 
 
@@ -106,8 +161,11 @@ def isESRF():
 
 def get(task, parameterName, defaultValue=None):
     if isinstance(task, str):
-        taskConfig = getTaskConfig(task)
+        taskName = task
     else:
-        taskConfig = getTaskConfig(task.__class__.__name__)
-    value = taskConfig.get(parameterName.lower(), defaultValue)
-    return value
+        taskName = task.__class__.__name__
+    value = _getRawTaskConfig(taskName).get(parameterName.lower())
+    if value is None:
+        return defaultValue
+    # Only the requested value is substituted
+    return os.path.expandvars(value)
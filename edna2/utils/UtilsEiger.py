@@ -0,0 +1,319 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Reader of the metadata of Eiger HDF5 master files. All the metadata is
+# read in one open of the master file, and the number of images is taken
+# from the master file whenever possible so that the data files need not
+# be opened:
+#
+# 1. Datasets stored in the master file (e.g. virtual datasets): their
+#    shape is in the master file.
+# 2. The nimages and ntrigger entries of detectorSpecific.
+# 3. The image_nr_high attribute of the data of the last data file.
+# 4. The shape of the data of each data file.
+#
+# Frames are converted to CBF files in process, with the header and the
+# pixel values written by eiger2cbf.
+
+import os
+import json
+import hashlib
+import concurrent.futures
+
+from edna2.utils import UtilsCBF
+from edna2.utils import UtilsCache
+from edna2.utils import UtilsLogging
+
+logger = UtilsLogging.getLogger()
+
+# Version of the entries stored in the header cache, to be increased
+# when they change
+MASTER_CACHE_VERSION = 2
+
+# Datasets read from the master file
+DICT_MASTER_DATASET = {
+    'wavelength': 'entry/instrument/beam/incident_wavelength',
+    'beam_center_x': 'entry/instrument/detector/beam_center_x',
+    'beam_center_y': 'entry/instrument/detector/beam_center_y',
+    'count_time': 'entry/instrument/detector/count_time',
+    'detector_distance': 'entry/instrument/detector/detector_distance',
+    'orientation': 'entry/instrument/detector/geometry/orientation/value',
+    'translation': 'entry/instrument/detector/geometry/translation/distances',
+    'x_pixel_size': 'entry/instrument/detector/x_pixel_size',
+    'y_pixel_size': 'entry/instrument/detector/y_pixel_size',
+    'omega_start': 'entry/sample/goniometer/omega_start',
+    'omega_increment': 'entry/sample/goniometer/omega_increment',
+    'detector_number': 'entry/instrument/detector/detector_number',
+    'description': 'entry/instrument/detector/description',
+    'data_collection_date':
+        'entry/instrument/detector/detectorSpecific/data_collection_date',
+    'nimages': 'entry/instrument/detector/detectorSpecific/nimages',
+    'ntrigger': 'entry/instrument/detector/detectorSpecific/ntrigger',
+    'sensor_thickness': 'entry/instrument/detector/sensor_thickness',
+    'frame_time': 'entry/instrument/detector/frame_time',
+    'count_cutoff': 'entry/instrument/detector/detectorSpecific/'
+                    'countrate_correction_count_cutoff'
+}
+
+LIST_OPTIONAL_DATASET = ['nimages', 'ntrigger', 'sensor_thickness',
+                         'frame_time', 'count_cutoff']
+
+DATA_GROUP = 'entry/data'
+DATA_DATASET = 'entry/data/data'
+PIXEL_MASK_DATASET = 'entry/instrument/detector/detectorSpecific/pixel_mask'
+
+# Values of masked pixels in CBF files: gaps between modules (bit 0 of
+# the pixel mask) and dead, cold, hot or noisy pixels (bits 1 to 4)
+GAP_PIXEL_VALUE = -1
+BAD_PIXEL_VALUE = -2
+
+
+def readMasterHeader(masterPath):
+    """
+    Returns a dictionary with the metadata of an Eiger master file, the
+    names of the data entries ('data'), the paths of the external data
+    files ('dataFiles') and the total number of images
+    ('numberOfImages'). The results are kept in the header cache, keyed
+    by the path, size and modification time of the master file.
+    """
+    masterPath = str(masterPath)
+    stat = os.stat(masterPath)
+    keyString = json.dumps([__name__, MASTER_CACHE_VERSION, masterPath,
+                            stat.st_size, stat.st_mtime_ns])
+    key = hashlib.sha256(keyString.encode('utf-8')).hexdigest()
+    headerCache = UtilsCache.getHeaderCache()
+    value = headerCache.get(key)
+    if value is not None:
+        entry = json.loads(value)
+        # Numbers of images read from data files are only valid as long
+        # as these files are unchanged
+        listFingerprint = UtilsCache.getFileFingerprints(entry['probedFiles'])
+        if listFingerprint == entry['files']:
+            return entry['header']
+    dictHeader, listProbedFile = _readMasterHeader(masterPath)
+    entry = {
+        'header': dictHeader,
+        'probedFiles': listProbedFile,
+        'files': UtilsCache.getFileFingerprints(listProbedFile)
+    }
+    headerCache.put(key, json.dumps(entry))
+    return dictHeader
+
+
+def _readMasterHeader(masterPath):
+    import h5py
+    masterDirectory = os.path.dirname(os.path.abspath(masterPath))
+    with h5py.File(masterPath, 'r') as f:
+        dictHeader = {}
+        for key, datasetPath in DICT_MASTER_DATASET.items():
+            dataset = f.get(datasetPath)
+            if dataset is None:
+                if key in LIST_OPTIONAL_DATASET:
+                    dictHeader[key] = None
+                    continue
+                raise KeyError('Missing dataset {0} in {1}'.format(
+                    datasetPath, masterPath))
+            dictHeader[key] = _toPython(dataset[()])
+        # Only the links are read: data files are not opened
+        group = f[DATA_GROUP]
+        listDataName = list(group)
+        listDataFile = []
+        listInternalName = []
+        for dataName in listDataName:
+            link = group.get(dataName, getlink=True)
+            if isinstance(link, h5py.ExternalLink):
+                listDataFile.append(
+                    os.path.join(masterDirectory, link.filename))
+            else:
+                listInternalName.append(dataName)
+        numberOfImages = None
+        if listInternalName and not listDataFile:
+            numberOfImages = sum(group[dataName].shape[0]
+                                 for dataName in listInternalName)
+    listProbedFile = []
+    if numberOfImages is None and dictHeader['nimages'] is not None:
+        numberOfImages = dictHeader['nimages'] * (dictHeader['ntrigger'] or 1)
+    if numberOfImages is None and listDataFile:
+        numberOfImages, listProbedFile = _probeDataFiles(listDataFile)
+    dictHeader['data'] = listDataName
+    dictHeader['dataFiles'] = listDataFile
+    dictHeader['numberOfImages'] = numberOfImages
+    return dictHeader, listProbedFile
+
+
+def _probeDataFiles(listDataFile):
+    """
+    Returns the number of images in the data files and the list of data
+    files which were opened
+    """
+    import h5py
+    # The last image number is an attribute of the data of each file
+    with h5py.File(listDataFile[-1], 'r') as f:
+        imageNumberHigh = f[DATA_DATASET].attrs.get('image_nr_high')
+    if imageNumberHigh is not None:
+        return int(imageNumberHigh), listDataFile[-1:]
+    logger.debug('Reading the number of images of {0} data files'.format(
+        len(listDataFile)))
+    numberOfImages = 0
+    for dataFile in listDataFile:
+        with h5py.File(dataFile, 'r') as f:
+            numberOfImages += f[DATA_DATASET].shape[0]
+    return numberOfImages, listDataFile
+
+
+def convertToCBF(masterPath, listFrame, maxWorkers=None):
+    """
+    Converts frames of an Eiger master file to CBF files. listFrame
+    contains (imageNumber, cbfPath) pairs, image numbers starting at 1
+    in the master file. Frames are read, masked, compressed and written
+    by a pool of at most maxWorkers threads (default number of CPUs).
+    Returns the list of CBF paths.
+    """
+    import h5py
+    try:
+        # Registers the bitshuffle / LZ4 filters of Eiger data files
+        import hdf5plugin  # noqa: F401
+    except ImportError:
+        pass
+    listFrame = list(listFrame)
+    if not listFrame:
+        return []
+    dictHeader = readMasterHeader(masterPath)
+    if maxWorkers is None:
+        maxWorkers = os.cpu_count() or 1
+    maxWorkers = max(1, min(maxWorkers, len(listFrame)))
+    lastImageNumber = max(imageNumber for imageNumber, _ in listFrame)
+    with h5py.File(str(masterPath), 'r') as f:
+        pixelMask = f[PIXEL_MASK_DATASET][()] \
+            if PIXEL_MASK_DATASET in f else None
+        listDataset = _getDatasets(f, lastImageNumber)
+
+        def convertFrame(frame):
+            imageNumber, cbfPath = frame
+            data = _readFrame(listDataset, imageNumber)
+            data = toCBFValues(data, pixelMask)
+            UtilsCBF.writeImage(cbfPath, data,
+                                getCBFHeaderLines(dictHeader, imageNumber))
+            return str(cbfPath)
+
+        if maxWorkers == 1:
+            return [convertFrame(frame) for frame in listFrame]
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=maxWorkers) as executor:
+            return list(executor.map(convertFrame, listFrame))
+
+
+def _getDatasets(f, lastImageNumber):
+    """
+    Returns (first image number, dataset) of the data sets of a master
+    file, until the one containing lastImageNumber
+    """
+    listDataset = []
+    firstImageNumber = 1
+    group = f[DATA_GROUP]
+    for dataName in group:
+        if firstImageNumber > lastImageNumber:
+            break
+        dataset = group[dataName]
+        listDataset.append((firstImageNumber, dataset))
+        firstImageNumber += dataset.shape[0]
+    if firstImageNumber <= lastImageNumber:
+        raise IndexError('Image {0} not found in {1}'.format(
+            lastImageNumber, f.filename))
+    return listDataset
+
+
+def _readFrame(listDataset, imageNumber):
+    for firstImageNumber, dataset in reversed(listDataset):
+        if imageNumber >= firstImageNumber:
+            return dataset[imageNumber - firstImageNumber]
+    raise IndexError('Image number {0} out of range'.format(imageNumber))
+
+
+def toCBFValues(data, pixelMask=None):
+    """
+    Returns an Eiger frame as int32 values as written by eiger2cbf:
+    saturated pixels (all bits set) are -1, and pixels of the pixel mask
+    are GAP_PIXEL_VALUE or BAD_PIXEL_VALUE.
+    """
+    import numpy
+    if data.dtype.kind == 'u' and data.dtype.itemsize < 4:
+        saturated = data == numpy.iinfo(data.dtype).max
+        data = data.astype(numpy.int32)
+        data[saturated] = -1
+    else:
+        # 0xffffffff becomes -1
+        data = data.astype(data.dtype.newbyteorder('=')).view(
+            'i{0}'.format(data.dtype.itemsize)).astype(numpy.int32)
+    if pixelMask is not None:
+        data[(pixelMask & 0x1e) != 0] = BAD_PIXEL_VALUE
+        data[(pixelMask & 0x01) != 0] = GAP_PIXEL_VALUE
+    return data
+
+
+def getCBFHeaderLines(dictHeader, imageNumber):
+    """
+    Returns the Pilatus header lines of a frame, with the entries
+    written by eiger2cbf
+    """
+    startAngle = dictHeader['omega_start'] + \
+        dictHeader['omega_increment'] * (imageNumber - 1)
+    listLine = [
+        'Detector: {0}, S/N {1}'.format(dictHeader['description'],
+                                       dictHeader['detector_number']),
+        dictHeader['data_collection_date'],
+        'Pixel_size {0:g} m x {1:g} m'.format(dictHeader['x_pixel_size'],
+                                              dictHeader['y_pixel_size'])
+    ]
+    if dictHeader.get('sensor_thickness') is not None:
+        listLine.append('Silicon sensor, thickness {0:.6f} m'.format(
+            dictHeader['sensor_thickness']))
+    listLine.append('Exposure_time {0:.7f} s'.format(dictHeader['count_time']))
+    if dictHeader.get('frame_time') is not None:
+        listLine.append('Exposure_period {0:.7f} s'.format(
+            dictHeader['frame_time']))
+    if dictHeader.get('count_cutoff') is not None:
+        listLine.append('Count_cutoff {0} counts'.format(
+            dictHeader['count_cutoff']))
+    listLine += [
+        'Wavelength {0:.5f} A'.format(dictHeader['wavelength']),
+        'Detector_distance {0:.5f} m'.format(dictHeader['detector_distance']),
+        'Beam_xy ({0:.2f}, {1:.2f}) pixels'.format(
+            dictHeader['beam_center_x'], dictHeader['beam_center_y']),
+        'Start_angle {0:.4f} deg.'.format(startAngle),
+        'Angle_increment {0:.4f} deg.'.format(dictHeader['omega_increment']),
+    ]
+    return listLine
+
+
+def _toPython(value):
+    # JSON serialisable value of a dataset
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    if hasattr(value, 'tolist'):
+        value = value.tolist()
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
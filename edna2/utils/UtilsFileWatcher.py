@@ -0,0 +1,584 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Watcher for sets of expected files, for example the images of a data
+# collection. One background thread per process serves all waiting tasks:
+#
+# - on local file systems changes are reported by inotify, the watched
+#   directories are only scanned from time to time as a safety net. A
+#   file without minimum size arrives once closed after writing;
+# - on network file systems (NFS, GPFS, ...) inotify doesn't see files
+#   written by other hosts, so the directories are scanned with an
+#   adaptive back-off: every min_interval seconds while files arrive, up
+#   to max_interval seconds when nothing happens. One directory listing
+#   replaces one stat per expected file.
+#
+# [FileWatcher]
+# inotify = <false to always scan, default true>
+# min_interval = <seconds, default 0.1>
+# max_interval = <seconds, default 2>
+# safety_interval = <seconds between scans of directories watched
+#                    with inotify, default 5>
+
+import os
+import time
+import ctypes
+import select
+import struct
+import asyncio
+import threading
+import ctypes.util
+
+from edna2.utils import UtilsConfig
+from edna2.utils import UtilsLogging
+
+logger = UtilsLogging.getLogger()
+
+DEFAULT_MIN_INTERVAL = 0.1  # s
+DEFAULT_MAX_INTERVAL = 2.0  # s
+DEFAULT_SAFETY_INTERVAL = 5.0  # s
+
+# Up to this number of expected files the directory is not listed, the
+# files are checked one by one
+MAX_FILES_STAT = 4
+
+# A file modified less than this number of seconds ago and without
+# minimum size may still be written: it only arrives when closed or when
+# found unchanged during min_interval seconds
+SETTLE_TIME = 1.0  # s
+
+# File systems on which inotify misses changes made by other hosts
+LIST_NETWORK_FILE_SYSTEM = ['nfs', 'nfs4', 'gpfs', 'lustre', 'cifs',
+                            'smb3', 'smbfs', 'ceph', 'beegfs', 'afs',
+                            'panfs', 'wekafs', 'fuse.glusterfs',
+                            'fuse.sshfs', 'fuse.cephfs']
+
+# See inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+INOTIFY_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT = struct.Struct('iIII')
+
+_watcher = None
+_watcherPid = None
+_watcherLock = threading.Lock()
+_listMount = None
+
+
+def _getMounts():
+    # List of (mount point, file system type), longest mount point first
+    global _listMount
+    if _listMount is None:
+        listMount = []
+        try:
+            with open('/proc/mounts') as f:
+                for line in f:
+                    listField = line.split()
+                    if len(listField) >= 3:
+                        mountPoint = listField[1].replace('\\040', ' ')
+                        listMount.append((mountPoint, listField[2]))
+        except OSError:
+            pass
+        _listMount = sorted(listMount, key=lambda mount: -len(mount[0]))
+    return _listMount
+
+
+def getFileSystemType(path):
+    """
+    Returns the type of the file system containing path, None if unknown
+    """
+    path = os.path.realpath(str(path))
+    for mountPoint, fileSystemType in _getMounts():
+        if path == mountPoint or \
+                path.startswith(mountPoint.rstrip('/') + '/'):
+            return fileSystemType
+    return None
+
+
+def isNetworkFileSystem(path):
+    return getFileSystemType(path) in LIST_NETWORK_FILE_SYSTEM
+
+
+def getWatcher():
+    """
+    Returns the file watcher of this process
+    """
+    global _watcher
+    global _watcherPid
+    with _watcherLock:
+        # The thread of the parent doesn't exist in a forked child
+        if _watcher is None or _watcherPid != os.getpid():
+            _watcher = FileWatcher()
+            _watcherPid = os.getpid()
+        return _watcher
+
+
+def watch(listPath, minSize=None):
+    return getWatcher().watch(listPath, minSize=minSize)
+
+
+class Inotify(object):
+    """
+    Minimal ctypes binding of the Linux inotify API
+    """
+
+    def __init__(self):
+        libcName = ctypes.util.find_library('c') or 'libc.so.6'
+        self._libc = ctypes.CDLL(libcName, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    def addWatch(self, directory):
+        # Returns the watch descriptor, None if the directory can't be
+        # watched, for example if it doesn't exist yet
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(str(directory)), INOTIFY_MASK)
+        return None if wd < 0 else wd
+
+    def removeWatch(self, wd):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self):
+        """
+        Returns the list of pending events as (wd, mask, name)
+        """
+        listEvent = []
+        try:
+            buffer = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return listEvent
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(buffer):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(buffer, offset)
+            offset += INOTIFY_EVENT.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+            listEvent.append((wd, mask, os.fsdecode(name)))
+        return listEvent
+
+
+class FileSet(object):
+    """
+    A set of expected files. A file has arrived when it exists and, if
+    minSize is given, is larger than minSize bytes. Paths are made
+    absolute.
+    """
+
+    def __init__(self, watcher, listPath, minSize=None):
+        self._watcher = watcher
+        self.listPath = list(dict.fromkeys(
+            os.path.abspath(str(path)) for path in listPath))
+        self.minSize = minSize
+        self._condition = threading.Condition(watcher._lock)
+        # Path -> {'size', 'mtime', 'time'}
+        self._dictArrived = {}
+        self._listCallback = []
+
+    def _setArrived(self, path, size, mtime):
+        # Must be called with the lock acquired, returns True if the file
+        # has just arrived
+        if path in self._dictArrived:
+            return False
+        if self.minSize is not None and size <= self.minSize:
+            return False
+        self._dictArrived[path] = {
+            'size': size, 'mtime': mtime, 'time': time.time()}
+        self._condition.notify_all()
+        return True
+
+    def _isComplete(self):
+        return len(self._dictArrived) == len(self.listPath)
+
+    def isComplete(self):
+        with self._condition:
+            return self._isComplete()
+
+    def getArrived(self):
+        """
+        Returns a dictionary path -> {'size', 'mtime', 'time'} of the
+        files which have arrived, 'time' is when the watcher saw them
+        """
+        with self._condition:
+            return dict(self._dictArrived)
+
+    def getMissing(self):
+        with self._condition:
+            return [path for path in self.listPath
+                    if path not in self._dictArrived]
+
+    def wait(self, path, timeout=None):
+        """
+        Waits for one file of the set, returns True if it has arrived
+        """
+        path = os.path.abspath(str(path))
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: path in self._dictArrived, timeout)
+
+    def waitAny(self, timeout=None):
+        """
+        Waits until at least one file has arrived, returns the list of
+        arrived files (empty in case of time-out)
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._dictArrived, timeout)
+            return list(self._dictArrived)
+
+    def waitAll(self, timeout=None):
+        """
+        Waits until all files have arrived, returns False in case of
+        time-out
+        """
+        with self._condition:
+            return self._condition.wait_for(self._isComplete, timeout)
+
+    async def waitAllAsync(self, timeout=None):
+        """
+        Same as waitAll without blocking the event loop
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def setDone():
+            if not future.done():
+                future.set_result(True)
+
+        self.addCallback(
+            lambda fileSet: loop.call_soon_threadsafe(setDone))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.isComplete()
+
+    def addCallback(self, callback):
+        """
+        Adds a callable called with this set once all files have arrived.
+        It runs in the watcher thread (or immediately if the set is
+        already complete) so it should return quickly.
+        """
+        with self._condition:
+            isComplete = self._isComplete()
+            if not isComplete:
+                self._listCallback.append(callback)
+        if isComplete:
+            callback(self)
+
+    def close(self):
+        """
+        Stops watching the files which haven't arrived
+        """
+        self._watcher._unregister(self)
+
+
+class _Directory(object):
+    # State of one watched directory
+
+    def __init__(self, path, isNetwork):
+        self.path = path
+        self.isNetwork = isNetwork
+        # File name -> list of FileSet waiting for it
+        self.dictName = {}
+        # File name -> ((size, mtime), time seen unchanged since) of
+        # recently modified files
+        self.dictRecent = {}
+        self.wd = None
+        self.interval = None
+        self.nextScan = 0.0
+
+
+class FileWatcher(object):
+    """
+    Watches sets of files, see FileSet
+    """
+
+    def __init__(self, useInotify=None):
+        if useInotify is None:
+            useInotify = str(UtilsConfig.get(
+                'FileWatcher', 'inotify', True)).lower() in ['true', 'yes', '1']
+        self.minInterval = float(UtilsConfig.get(
+            'FileWatcher', 'min_interval', DEFAULT_MIN_INTERVAL))
+        self.maxInterval = float(UtilsConfig.get(
+            'FileWatcher', 'max_interval', DEFAULT_MAX_INTERVAL))
+        self.safetyInterval = float(UtilsConfig.get(
+            'FileWatcher', 'safety_interval', DEFAULT_SAFETY_INTERVAL))
+        self._lock = threading.Lock()
+        # Directory path -> _Directory
+        self._dictDirectory = {}
+        # inotify watch descriptor -> _Directory
+        self._dictWatch = {}
+        self._inotify = None
+        if useInotify:
+            try:
+                self._inotify = Inotify()
+            except (OSError, AttributeError) as e:
+                logger.debug('inotify not available: {0}'.format(e))
+        self._wakeupRead, self._wakeupWrite = os.pipe()
+        os.set_blocking(self._wakeupRead, False)
+        self._thread = threading.Thread(target=self._run,
+                                        name='edna2-filewatcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def isUsingInotify(self):
+        return self._inotify is not None
+
+    def watch(self, listPath, minSize=None):
+        """
+        Returns a FileSet for the files in listPath
+        """
+        fileSet = FileSet(self, listPath, minSize)
+        listDirectory = []
+        with self._lock:
+            for path in fileSet.listPath:
+                directoryPath, name = os.path.split(path)
+                directory = self._dictDirectory.get(directoryPath)
+                if directory is None:
+                    directory = _Directory(
+                        directoryPath, isNetworkFileSystem(directoryPath))
+                    self._dictDirectory[directoryPath] = directory
+                    self._addWatch(directory)
+                directory.dictName.setdefault(name, []).append(fileSet)
+                if directory not in listDirectory:
+                    listDirectory.append(directory)
+        # Files which are already there are seen without waiting for the
+        # watcher thread. The inotify watch is added before this scan so
+        # no file can be missed in between.
+        for directory in listDirectory:
+            self._scan(directory)
+        self._wakeup()
+        return fileSet
+
+    def watchBatches(self, listBatch, minSize=None, callback=None):
+        """
+        Returns one FileSet per batch (list of paths). If given, callback
+        is called with the index of the batch and its FileSet when the
+        batch is complete.
+        """
+        listFileSet = []
+        for index, listPath in enumerate(listBatch):
+            fileSet = self.watch(listPath, minSize=minSize)
+            if callback is not None:
+                fileSet.addCallback(
+                    lambda fileSet, index=index: callback(index, fileSet))
+            listFileSet.append(fileSet)
+        return listFileSet
+
+    def getNumberOfWatchedFiles(self):
+        with self._lock:
+            return sum(len(directory.dictName)
+                       for directory in self._dictDirectory.values())
+
+    def _wakeup(self):
+        try:
+            os.write(self._wakeupWrite, b'\0')
+        except BlockingIOError:
+            pass
+
+    def _addWatch(self, directory):
+        # Must be called with the lock acquired
+        if self._inotify is not None and not directory.isNetwork:
+            directory.wd = self._inotify.addWatch(directory.path)
+            if directory.wd is not None:
+                self._dictWatch[directory.wd] = directory
+
+    def _unregister(self, fileSet):
+        with self._lock:
+            self._unregisterLocked(fileSet)
+
+    def _unregisterLocked(self, fileSet):
+        for path in fileSet.listPath:
+            directoryPath, name = os.path.split(path)
+            directory = self._dictDirectory.get(directoryPath)
+            if directory is None:
+                continue
+            listFileSet = directory.dictName.get(name, [])
+            if fileSet in listFileSet:
+                listFileSet.remove(fileSet)
+            if not listFileSet:
+                directory.dictName.pop(name, None)
+            if not directory.dictName:
+                del self._dictDirectory[directoryPath]
+                if directory.wd is not None:
+                    del self._dictWatch[directory.wd]
+                    self._inotify.removeWatch(directory.wd)
+
+    def _update(self, directory, dictFound, setWriting=()):
+        # dictFound: file name -> (size, mtime). Files in setWriting may
+        # still be written, they only arrive in sets with a minimum size.
+        # Returns the number of files which have arrived.
+        numberOfArrived = 0
+        listComplete = []
+        with self._lock:
+            for name, (size, mtime) in dictFound.items():
+                path = os.path.join(directory.path, name)
+                for fileSet in list(directory.dictName.get(name, [])):
+                    if name in setWriting and fileSet.minSize is None:
+                        continue
+                    if fileSet._setArrived(path, size, mtime):
+                        numberOfArrived += 1
+                        if fileSet._isComplete():
+                            listComplete.append(fileSet)
+            listCallback = []
+            for fileSet in listComplete:
+                self._unregisterLocked(fileSet)
+                listCallback += [(callback, fileSet)
+                                 for callback in fileSet._listCallback]
+                fileSet._listCallback = []
+        for callback, fileSet in listCallback:
+            try:
+                callback(fileSet)
+            except Exception:
+                logger.exception('Error in file watcher callback')
+        return numberOfArrived
+
+    def _scan(self, directory):
+        with self._lock:
+            listName = list(directory.dictName)
+        dictFound = {}
+        if listName:
+            try:
+                if len(listName) <= MAX_FILES_STAT:
+                    # Opening the directory refreshes the NFS attribute
+                    # cache, then the few files are checked one by one
+                    fd = os.open(directory.path, os.O_RDONLY | os.O_DIRECTORY)
+                    os.close(fd)
+                    for name in listName:
+                        try:
+                            stat = os.stat(os.path.join(directory.path, name))
+                        except OSError:
+                            continue
+                        dictFound[name] = (stat.st_size, stat.st_mtime)
+                else:
+                    # One listing for all the files of the directory
+                    setName = set(listName)
+                    with os.scandir(directory.path) as iterator:
+                        for entry in iterator:
+                            if entry.name in setName:
+                                try:
+                                    stat = entry.stat()
+                                except OSError:
+                                    continue
+                                dictFound[entry.name] = (stat.st_size,
+                                                         stat.st_mtime)
+            except OSError:
+                # The directory doesn't exist yet
+                pass
+        setWriting = set()
+        now = time.time()
+        with self._lock:
+            dictRecent = {}
+            for name, sizeAndTime in dictFound.items():
+                if now - sizeAndTime[1] >= SETTLE_TIME:
+                    continue
+                # Unchanged since seenTime
+                seenSizeAndTime, seenTime = directory.dictRecent.get(
+                    name, (None, now))
+                if seenSizeAndTime != sizeAndTime:
+                    seenTime = now
+                dictRecent[name] = (sizeAndTime, seenTime)
+                if now - seenTime < self.minInterval:
+                    setWriting.add(name)
+            directory.dictRecent = dictRecent
+        numberOfArrived = self._update(directory, dictFound, setWriting)
+        with self._lock:
+            if directory.wd is None and self._dictDirectory.get(
+                    directory.path) is directory:
+                # The directory may have been created in the meantime
+                self._addWatch(directory)
+            if directory.wd is not None:
+                directory.interval = self.minInterval if setWriting \
+                    else self.safetyInterval
+            elif numberOfArrived > 0 or directory.interval is None or \
+                    setWriting:
+                directory.interval = self.minInterval
+            else:
+                directory.interval = min(2 * directory.interval,
+                                         self.maxInterval)
+            directory.nextScan = time.monotonic() + directory.interval
+        return numberOfArrived
+
+    def _handleEvents(self):
+        # Directory -> {file name: True if the file has been closed}
+        dictName = {}
+        listRescan = []
+        with self._lock:
+            for wd, mask, name in self._inotify.read():
+                if mask & IN_Q_OVERFLOW:
+                    # Events have been lost
+                    listRescan = list(self._dictDirectory.values())
+                    continue
+                directory = self._dictWatch.get(wd)
+                if directory is not None and name in directory.dictName:
+                    dictClosed = dictName.setdefault(directory, {})
+                    dictClosed[name] = dictClosed.get(name, False) or \
+                        bool(mask & (IN_CLOSE_WRITE | IN_MOVED_TO))
+        for directory, dictClosed in dictName.items():
+            dictFound = {}
+            for name in dictClosed:
+                try:
+                    stat = os.stat(os.path.join(directory.path, name))
+                except OSError:
+                    continue
+                dictFound[name] = (stat.st_size, stat.st_mtime)
+            setWriting = set(name for name, isClosed in dictClosed.items()
+                             if not isClosed)
+            self._update(directory, dictFound, setWriting)
+        for directory in listRescan:
+            self._scan(directory)
+
+    def _run(self):
+        listFd = [self._wakeupRead]
+        if self._inotify is not None:
+            listFd.append(self._inotify.fd)
+        while True:
+            with self._lock:
+                listNextScan = [directory.nextScan for directory
+                                in self._dictDirectory.values()]
+            if listNextScan:
+                timeout = max(0.0, min(listNextScan) - time.monotonic())
+            else:
+                timeout = None
+            try:
+                listReady = select.select(listFd, [], [], timeout)[0]
+                if self._wakeupRead in listReady:
+                    os.read(self._wakeupRead, 4096)
+                if self._inotify is not None and \
+                        self._inotify.fd in listReady:
+                    self._handleEvents()
+                now = time.monotonic()
+                with self._lock:
+                    listDue = [directory for directory
+                               in self._dictDirectory.values()
+                               if directory.nextScan <= now]
+                for directory in listDue:
+                    self._scan(directory)
+            except Exception:
+                logger.exception('Error in file watcher')
+                time.sleep(self.maxInterval)
@@ -27,6 +27,7 @@ __date__ = "21/04/2019"
 # https://github.com/olofsvensson/edna-mx
 # kernel/src/EDUtilsImage.py
 
+import os
 import re
 import pathlib
 
@@ -86,3 +87,17 @@ def getSuffix(pathToImage):
     if listResult is not None:
         suffix = listResult[4]
     return suffix
+
+
+def getImagePaths(directory, template, startNo, endNo, symbol="#"):
+    """
+    Returns the paths of the images startNo to endNo of a template where
+    the image number is given by symbols, e.g. "ref-test_1_####.img"
+    """
+    noWildCards = template.count(symbol)
+    if noWildCards == 0:
+        return [os.path.join(str(directory), template)]
+    template = template.replace(symbol * noWildCards,
+                                "{0:0" + str(noWildCards) + "d}")
+    return [os.path.join(str(directory), template.format(imageNumber))
+            for imageNumber in range(startNo, endNo + 1)]
@@ -25,7 +25,6 @@ __date__ = '05/09/2019'
 
 import os
 import json
-import requests
 
 from edna2.utils import UtilsLogging
 
@@ -33,6 +32,8 @@ logger = UtilsLogging.getLogger()
 
 
 def getDataFromURL(url):
+    # requests is only imported when ISPyB is accessed
+    import requests
     if "http_proxy" in os.environ:
         os.environ["http_proxy"] = ""
     response = requests.get(url)
@@ -47,6 +48,8 @@ def getDataFromURL(url):
 
 
 def getRawDataFromURL(url):
+    # requests is only imported when ISPyB is accessed
+    import requests
     if "http_proxy" in os.environ:
         os.environ["http_proxy"] = ""
     response = requests.get(url)
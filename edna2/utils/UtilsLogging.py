@@ -23,57 +23,176 @@ __authors__ = ["O. Svensson"]
 __license__ = "MIT"
 __date__ = "21/04/2019"
 
+# Log records of all EDNA2 loggers go through a bounded queue to a single
+# listener thread in the main process, which owns the actual handlers
+# (stream, rotating file and graylog). Task processes forked from the main
+# process inherit the queue, so only one process writes and rotates the
+# log file and logging never waits for I/O in the tasks.
+#
+# When the queue is full debug records are dropped, other records wait
+# for at most QUEUE_PUT_TIMEOUT. The number of dropped records is logged
+# with the next record that gets through.
+
 import os
+import queue
+import atexit
 import graypy
 import logging
+import logging.handlers
+import threading
+import multiprocessing
 
 from edna2.utils import UtilsConfig
 
+DEFAULT_QUEUE_SIZE = 10000
+QUEUE_PUT_TIMEOUT = 1.0  # s
+
+_lock = threading.Lock()
+_listener = None
+_listenerPid = None
+# Handlers added with addHandler, attached to each listener started
+_listAddedHandler = []
+
+
+class EDNA2QueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler which doesn't block when the queue is full
+    """
+
+    def __init__(self, queue):
+        logging.handlers.QueueHandler.__init__(self, queue)
+        self.numberOfDropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            isQueued = False
+            if record.levelno > logging.DEBUG:
+                try:
+                    self.queue.put(record, timeout=QUEUE_PUT_TIMEOUT)
+                    isQueued = True
+                except queue.Full:
+                    pass
+            if not isQueued:
+                self.numberOfDropped += 1
+                return
+        if self.numberOfDropped > 0:
+            numberOfDropped = self.numberOfDropped
+            self.numberOfDropped = 0
+            warning = logging.LogRecord(
+                record.name, logging.WARNING, __file__, 0,
+                '{0} log record(s) dropped, logging queue full'.format(
+                    numberOfDropped), None, None)
+            try:
+                self.queue.put_nowait(warning)
+            except queue.Full:
+                self.numberOfDropped += numberOfDropped
+
+
+def createHandlers():
+    """
+    Returns the handlers configured in the [Logging] section of the config
+    """
+    listHandler = []
+    server = UtilsConfig.get('Logging', 'graylog_server')
+    port = UtilsConfig.get('Logging', 'graylog_port')
+    if server is not None and port is not None:
+        graylogHandler = graypy.GELFUDPHandler(server, int(port))
+        listHandler.append(graylogHandler)
+    streamHandler = logging.StreamHandler()
+    logFileFormat = '%(asctime)s %(levelname)-8s %(message)s'
+    formatter = logging.Formatter(logFileFormat)
+    streamHandler.setFormatter(formatter)
+    listHandler.append(streamHandler)
+    logPath = UtilsConfig.get('Logging', 'log_file_path')
+    if logPath is not None:
+        if not os.path.exists(os.path.dirname(logPath)):
+            os.makedirs(os.path.dirname(logPath))
+        maxBytes = int(UtilsConfig.get('Logging', 'log_file_maxbytes', 1e6))
+        backupCount = int(UtilsConfig.get('Logging', 'log_file_backupCount', 10))
+        fileHandler = logging.handlers.RotatingFileHandler(
+            logPath, maxBytes=maxBytes, backupCount=backupCount)
+        logFileFormat = UtilsConfig.get('Logging', 'log_file_format')
+        if logFileFormat is None:
+            logFileFormat = '%(asctime)s %(levelname)-8s %(message)s'
+        formatter = logging.Formatter(logFileFormat)
+        fileHandler.setFormatter(formatter)
+        listHandler.append(fileHandler)
+    return listHandler
+
+
+def _startListener(logger):
+    # Must be called with _lock acquired
+    global _listener
+    global _listenerPid
+    queueSize = int(UtilsConfig.get('Logging', 'queue_size',
+                                    DEFAULT_QUEUE_SIZE))
+    logQueue = multiprocessing.Queue(maxsize=queueSize)
+    # Creating the queue registers the exit handler of multiprocessing,
+    # which closes the queue: the listener must be stopped before that
+    atexit.unregister(shutdown)
+    atexit.register(shutdown)
+    _listener = logging.handlers.QueueListener(
+        logQueue, *(createHandlers() + _listAddedHandler),
+        respect_handler_level=True)
+    _listener.start()
+    _listenerPid = os.getpid()
+    logger.addHandler(EDNA2QueueHandler(logQueue))
+
+
+def shutdown():
+    """
+    Stops the listener once all queued records have been handled. The
+    next call to getLogger starts a new one.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None and _listenerPid == os.getpid():
+            _listener.stop()
+            logger = logging.getLogger('edna2')
+            for handler in list(logger.handlers):
+                if isinstance(handler, EDNA2QueueHandler):
+                    logger.removeHandler(handler)
+            _listener = None
+
+
+def addHandler(handler):
+    """
+    Adds a handler to the listener in the main process. If the listener
+    is not running the handler is attached when it starts.
+    """
+    with _lock:
+        _listAddedHandler.append(handler)
+        if _listener is not None and _listenerPid == os.getpid():
+            _listener.handlers = _listener.handlers + (handler,)
+
+
+def removeHandler(handler):
+    """
+    Removes a handler added with addHandler
+    """
+    with _lock:
+        if handler in _listAddedHandler:
+            _listAddedHandler.remove(handler)
+        if _listener is not None:
+            _listener.handlers = tuple(
+                listenerHandler for listenerHandler in _listener.handlers
+                if listenerHandler is not handler)
+
 
 def getLogger(level=None):
     if level is None:
         level = UtilsConfig.get('Logging', 'level')
     if level is None:
         level = 'INFO'
-    # Check if graylog handler already added:
     logger = logging.getLogger('edna2')
-    hasGraylogHandler = False
-    hasStreamHandler = False
-    hasFileHandler = False
-    for handler in logger.handlers:
-        if isinstance(handler, graypy.GELFUDPHandler):
-            hasGraylogHandler = True
-        elif isinstance(handler, logging.handlers.RotatingFileHandler):
-            hasFileHandler = True
-        elif isinstance(handler, logging.StreamHandler):
-            hasStreamHandler = True
-    if not hasGraylogHandler:
-        server = UtilsConfig.get('Logging', 'graylog_server')
-        port = UtilsConfig.get('Logging', 'graylog_port')
-        if server is not None and port is not None:
-            graylogHandler = graypy.GELFUDPHandler(server, int(port))
-            logger.addHandler(graylogHandler)
-    if not hasStreamHandler:
-        streamHandler = logging.StreamHandler()
-        logFileFormat = '%(asctime)s %(levelname)-8s %(message)s'
-        formatter = logging.Formatter(logFileFormat)
-        streamHandler.setFormatter(formatter)
-        logger.addHandler(streamHandler)
-    if not hasFileHandler:
-        logPath = UtilsConfig.get('Logging', 'log_file_path')
-        if logPath is not None:
-            if not os.path.exists(os.path.dirname(logPath)):
-                os.makedirs(os.path.dirname(logPath))
-            maxBytes = int(UtilsConfig.get('Logging', 'log_file_maxbytes', 1e6))
-            backupCount = int(UtilsConfig.get('Logging', 'log_file_backupCount', 10))
-            fileHandler = logging.handlers.RotatingFileHandler(
-                logPath, maxBytes=maxBytes, backupCount=backupCount)
-            logFileFormat = UtilsConfig.get('Logging', 'log_file_format')
-            if logFileFormat is None:
-                logFileFormat = '%(asctime)s %(levelname)-8s %(message)s'
-            formatter = logging.Formatter(logFileFormat)
-            fileHandler.setFormatter(formatter)
-            logger.addHandler(fileHandler)
+    with _lock:
+        # The handlers are set up once, in the main process. Forked
+        # processes keep the queue handler of their parent
+        if not any(isinstance(handler, EDNA2QueueHandler)
+                   for handler in logger.handlers):
+            _startListener(logger)
     # Set level
     if level == 'DEBUG':
         loggingLevel = logging.DEBUG
@@ -92,4 +211,3 @@ def getLogger(level=None):
     logger.setLevel(loggingLevel)
     return logger
 
-
@@ -0,0 +1,383 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Task metrics: wall time, CPU time, maximum resident set size and I/O of
+# each task run, time spent waiting in the scheduler, and histograms of
+# other durations such as the image arrival to quality indicator latency.
+#
+# Metrics are aggregated in memory by the main process. Task processes
+# forked from it forward their records with the task result (see
+# startForwarding / stopForwarding), so only one process writes the
+# exports:
+#
+# [Metrics]
+# metrics_file = <path of a JSON lines file, one line per task run>
+# prometheus_file = <path of a Prometheus textfile (node_exporter)>
+# prometheus_interval = <minimum seconds between rewrites of the textfile>
+
+import os
+import json
+import time
+import atexit
+import resource
+import threading
+
+from edna2.utils import UtilsConfig
+
+# Seconds
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300,
+                   600, 1800, 3600)
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60, 120)
+DEFAULT_PROMETHEUS_INTERVAL = 10
+
+RECORD_OBSERVE = 'observe'
+RECORD_INC = 'inc'
+RECORD_MAX = 'max'
+RECORD_TASK = 'task'
+
+_lock = threading.Lock()
+_dictHistogram = {}
+_dictCounter = {}
+_dictMaximum = {}
+_listForward = None
+_lastPrometheusTime = 0
+
+
+class Histogram(object):
+    """
+    Cumulative histogram as exported to Prometheus
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _getKey(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(name, value, buckets=None, **labels):
+    """
+    Adds a value to the histogram 'name' with the given labels
+    """
+    _addRecord((RECORD_OBSERVE, name, value, buckets, labels))
+
+
+def inc(name, value=1, **labels):
+    """
+    Increments the counter 'name' with the given labels
+    """
+    _addRecord((RECORD_INC, name, value, None, labels))
+
+
+def setMaximum(name, value, **labels):
+    """
+    Sets the gauge 'name' to value if it is larger than the current value
+    """
+    _addRecord((RECORD_MAX, name, value, None, labels))
+
+
+def recordTask(taskName, metrics, isFailure=False):
+    """
+    Records the metrics of one task run, see AbstractTask.getMetrics
+    """
+    record = {
+        'time': time.time(),
+        'task': taskName,
+        'site': UtilsConfig.getSite(),
+        'status': 'failure' if isFailure else 'success'
+    }
+    record.update(metrics)
+    _addRecord((RECORD_TASK, None, record, None, None))
+
+
+def getHistogram(name, **labels):
+    with _lock:
+        return _dictHistogram.get(_getKey(name, labels))
+
+
+def getCounter(name, **labels):
+    with _lock:
+        return _dictCounter.get(_getKey(name, labels), 0)
+
+
+def getMaximum(name, **labels):
+    with _lock:
+        return _dictMaximum.get(_getKey(name, labels))
+
+
+def reset():
+    global _lastPrometheusTime
+    with _lock:
+        _dictHistogram.clear()
+        _dictCounter.clear()
+        _dictMaximum.clear()
+        _lastPrometheusTime = 0
+
+
+def startForwarding():
+    """
+    Called in a forked task process: records are kept until
+    stopForwarding instead of being exported
+    """
+    global _listForward
+    with _lock:
+        _listForward = []
+
+
+def stopForwarding():
+    """
+    Returns the records kept since startForwarding, to be passed to
+    addRecords in the parent process
+    """
+    global _listForward
+    with _lock:
+        listRecord = _listForward
+        _listForward = None
+    return listRecord or []
+
+
+def addRecords(listRecord):
+    for record in listRecord:
+        _addRecord(record)
+
+
+def _addRecord(record):
+    with _lock:
+        if _listForward is not None:
+            _listForward.append(record)
+            return
+        recordType, name, value, buckets, labels = record
+        if recordType == RECORD_TASK:
+            _applyTaskRecord(value)
+        else:
+            _applyRecord(recordType, name, value, buckets, labels)
+    if recordType == RECORD_TASK:
+        _writeRecord(value)
+        writePrometheus(force=False)
+
+
+def _applyRecord(recordType, name, value, buckets, labels):
+    # Must be called with _lock acquired
+    key = _getKey(name, labels)
+    if recordType == RECORD_OBSERVE:
+        histogram = _dictHistogram.get(key)
+        if histogram is None:
+            histogram = Histogram(buckets or DEFAULT_BUCKETS)
+            _dictHistogram[key] = histogram
+        histogram.observe(value)
+    elif recordType == RECORD_INC:
+        _dictCounter[key] = _dictCounter.get(key, 0) + value
+    elif recordType == RECORD_MAX:
+        _dictMaximum[key] = max(_dictMaximum.get(key, value), value)
+
+
+def _applyTaskRecord(record):
+    # Must be called with _lock acquired
+    labels = {'task': record['task'], 'site': record['site']}
+    _applyRecord(RECORD_INC, 'edna2_task_runs_total', 1, None,
+                 dict(labels, status=record['status']))
+    for name, metricName in [
+        ('wallTime', 'edna2_task_wall_seconds'),
+        ('cpuTime', 'edna2_task_cpu_seconds'),
+        ('commandCpuTime', 'edna2_task_command_cpu_seconds'),
+        ('queueWaitTime', 'edna2_task_queue_wait_seconds')
+    ]:
+        if record.get(name) is not None:
+            _applyRecord(RECORD_OBSERVE, metricName, record[name], None,
+                         labels)
+    for name, metricName in [
+        ('readBytes', 'edna2_task_read_bytes_total'),
+        ('writtenBytes', 'edna2_task_written_bytes_total'),
+        ('commandReadBytes', 'edna2_task_command_read_bytes_total'),
+        ('commandWrittenBytes', 'edna2_task_command_written_bytes_total')
+    ]:
+        if record.get(name) is not None:
+            _applyRecord(RECORD_INC, metricName, record[name], None, labels)
+    for name, metricName in [
+        ('maxRss', 'edna2_task_max_rss_bytes'),
+        ('commandMaxRss', 'edna2_task_command_max_rss_bytes')
+    ]:
+        if record.get(name) is not None:
+            _applyRecord(RECORD_MAX, metricName, record[name], None, labels)
+
+
+def _writeRecord(record):
+    metricsFile = UtilsConfig.get('Metrics', 'metrics_file')
+    if metricsFile is not None:
+        # One write per line, lines of several processes don't mix
+        line = json.dumps(record, default=str) + '\n'
+        fd = os.open(metricsFile, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                     0o644)
+        try:
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+
+def _formatLabels(labels):
+    listLabel = ['{0}="{1}"'.format(
+        key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for key, value in labels]
+    return '{' + ','.join(listLabel) + '}' if listLabel else ''
+
+
+def _formatValue(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def getPrometheusText():
+    """
+    Returns the metrics in the Prometheus text exposition format
+    """
+    listLine = []
+    with _lock:
+        for metricType, dictMetric in [('counter', _dictCounter),
+                                       ('gauge', _dictMaximum)]:
+            lastName = None
+            for (name, labels), value in sorted(dictMetric.items()):
+                if name != lastName:
+                    listLine.append('# TYPE {0} {1}'.format(name, metricType))
+                    lastName = name
+                listLine.append('{0}{1} {2}'.format(
+                    name, _formatLabels(labels), _formatValue(value)))
+        lastName = None
+        for (name, labels), histogram in sorted(
+                _dictHistogram.items(), key=lambda item: item[0]):
+            if name != lastName:
+                listLine.append('# TYPE {0} histogram'.format(name))
+                lastName = name
+            for bucket, count in zip(histogram.buckets + ('+Inf',),
+                                     histogram.counts + [histogram.count]):
+                listLine.append('{0}_bucket{1} {2}'.format(
+                    name, _formatLabels(labels + (('le', bucket),)), count))
+            listLine.append('{0}_sum{1} {2}'.format(
+                name, _formatLabels(labels), _formatValue(histogram.sum)))
+            listLine.append('{0}_count{1} {2}'.format(
+                name, _formatLabels(labels), histogram.count))
+    return '\n'.join(listLine) + '\n'
+
+
+def writePrometheus(path=None, force=True):
+    """
+    Writes the Prometheus textfile, by default [Metrics] prometheus_file.
+    Unless force is True the file is rewritten at most every
+    prometheus_interval seconds.
+    """
+    global _lastPrometheusTime
+    if path is None:
+        path = UtilsConfig.get('Metrics', 'prometheus_file')
+        if path is None:
+            return
+    if not force:
+        interval = float(UtilsConfig.get('Metrics', 'prometheus_interval',
+                                         DEFAULT_PROMETHEUS_INTERVAL))
+        if time.time() - _lastPrometheusTime < interval:
+            return
+    _lastPrometheusTime = time.time()
+    text = getPrometheusText()
+    # Written to a temporary file and renamed, the collector never
+    # sees a partial file
+    tmpPath = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmpPath, 'w') as f:
+        f.write(text)
+    os.replace(tmpPath, path)
+
+
+def _readProcIo(path):
+    dictIo = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                key, value = line.split(':')
+                dictIo[key] = int(value)
+    except (OSError, ValueError):
+        return None
+    return dictIo
+
+
+def getUsage(perThread=False):
+    """
+    Returns a snapshot of the resource usage of the calling process, or of
+    the calling thread if perThread is True, and of its terminated child
+    processes. Two snapshots are compared with getUsageDifference.
+    """
+    who = resource.RUSAGE_SELF
+    procIoPath = '/proc/self/io'
+    if perThread:
+        who = getattr(resource, 'RUSAGE_THREAD', None)
+        procIoPath = '/proc/thread-self/io'
+    usage = {
+        'time': time.perf_counter(),
+        'self': resource.getrusage(who) if who is not None else None,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN),
+        'io': _readProcIo(procIoPath)
+    }
+    return usage
+
+
+def getUsageDifference(start, end):
+    """
+    Returns the metrics between two snapshots taken with getUsage. Sizes
+    are in bytes, times in seconds. Note that the maximum resident set
+    size of commands is the one of the largest child process so far.
+    """
+    metrics = {'wallTime': end['time'] - start['time']}
+    if start['self'] is not None:
+        metrics['cpuTime'] = \
+            (end['self'].ru_utime + end['self'].ru_stime) - \
+            (start['self'].ru_utime + start['self'].ru_stime)
+        # ru_maxrss is in kilobytes on Linux
+        metrics['maxRss'] = end['self'].ru_maxrss * 1024
+    startChildren = start['children']
+    endChildren = end['children']
+    metrics['commandCpuTime'] = \
+        (endChildren.ru_utime + endChildren.ru_stime) - \
+        (startChildren.ru_utime + startChildren.ru_stime)
+    metrics['commandMaxRss'] = endChildren.ru_maxrss * 1024
+    # Blocks of 512 bytes
+    metrics['commandReadBytes'] = \
+        (endChildren.ru_inblock - startChildren.ru_inblock) * 512
+    metrics['commandWrittenBytes'] = \
+        (endChildren.ru_oublock - startChildren.ru_oublock) * 512
+    if start['io'] is not None and end['io'] is not None:
+        metrics['readBytes'] = end['io']['rchar'] - start['io']['rchar']
+        metrics['writtenBytes'] = end['io']['wchar'] - start['io']['wchar']
+    return metrics
+
+
+atexit.register(writePrometheus)
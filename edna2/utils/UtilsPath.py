@@ -28,28 +28,55 @@ __date__ = '21/04/2019'
 # mxv1/src/EDHandlerESRFPyarchv1_0.py
 
 import os
-import time
+import json
 import pathlib
 import tempfile
 
 from edna2.utils import UtilsConfig
 from edna2.utils import UtilsLogging
+from edna2.utils import UtilsTrace
+from edna2.utils import UtilsFileWatcher
 
 logger = UtilsLogging.getLogger()
 
 DEFAULT_TIMEOUT = 120 # s
 
 
-def getWorkingDirectory(task, inData):
+def getParentDirectory(inData):
+    """
+    Returns the directory in which the working directory of a task is
+    created: inData['workingDirectory'] or the current directory.
+    """
     parentDirectory = inData.get('workingDirectory', None)
     if parentDirectory is None:
         parentDirectory = os.getcwd()
+    return pathlib.Path(parentDirectory)
+
+
+def createWorkingDirectory(task, parentDirectory):
     workingDirectory = tempfile.mkdtemp(
         prefix=task.__class__.__name__ + '_',
-        dir=parentDirectory)
+        dir=str(parentDirectory))
     return pathlib.Path(workingDirectory)
 
 
+def getWorkingDirectory(task, inData):
+    return createWorkingDirectory(task, getParentDirectory(inData))
+
+
+def appendJsonLine(path, record):
+    """
+    Appends a record to a JSON lines file with a single write, lines
+    appended by several processes don't mix.
+    """
+    line = json.dumps(record, default=str) + '\n'
+    fd = os.open(str(path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode('utf-8'))
+    finally:
+        os.close(fd)
+
+
 def createPyarchFilePath(filePath):
     """
     This method translates from an ESRF "visitor" path to a "pyarch" path:
@@ -114,56 +141,52 @@ def createPyarchFilePath(filePath):
     return pyarchFilePath
 
 
+def _watchFile(file, expectedSize):
+    """
+    Returns the watched file set and the size of the file if it's already
+    there with the expected size, otherwise None
+    """
+    fileSet = UtilsFileWatcher.watch([file], minSize=expectedSize)
+    dictArrived = fileSet.getArrived()
+    if dictArrived:
+        return fileSet, dictArrived[fileSet.listPath[0]]['size']
+    logger.info("Waiting for file %s" % file)
+    return fileSet, None
+
+
+def _getWaitResult(file, fileSet, hasArrived):
+    fileSet.close()
+    if hasArrived:
+        return False, fileSet.getArrived()[fileSet.listPath[0]]['size']
+    logger.warning("Timeout while waiting for file %s" % file)
+    # The file may be there but too small
+    try:
+        finalSize = os.stat(str(file)).st_size
+    except OSError:
+        finalSize = None
+    return True, finalSize
+
+
 def waitForFile(file, expectedSize=None, timeOut=DEFAULT_TIMEOUT):
-    filePath = pathlib.Path(file)
-    finalSize = None
-    hasTimedOut = False
-    shouldContinue = True
-    fileDir = filePath.parent
-    if os.name != 'nt' and fileDir.exists():
-        # Patch provided by Sebastien 2018/02/09 for forcing NFS cache:
-        # logger.debug("NFS cache clear, doing os.fstat on directory {0}".format(fileDir))
-        fd = os.open(fileDir.as_posix(), os.O_DIRECTORY)
-        statResult = os.fstat(fd)
-        os.close(fd)
-        # logger.debug("Results of os.fstat: {0}".format(statResult))
-    # Check if file is there
-    if filePath.exists():
-        fileSize = filePath.stat().st_size
-        if expectedSize is not None:
-            # Check size
-            if fileSize > expectedSize:
-                shouldContinue = False
-        finalSize = fileSize
-    if shouldContinue:
-        logger.info("Waiting for file %s" % filePath)
-        #
-        timeStart = time.time()
-        while shouldContinue and not hasTimedOut:
-            # Sleep 1 s
-            time.sleep(1)
-            if os.name != 'nt' and fileDir.exists():
-                # Patch provided by Sebastien 2018/02/09 for forcing NFS cache:
-                # logger.debug("NFS cache clear, doing os.fstat on directory {0}".format(fileDir))
-                fd = os.open(fileDir.as_posix(), os.O_DIRECTORY)
-                statResult = os.fstat(fd)
-                os.close(fd)
-                # logger.debug("Results of os.fstat: {0}".format(statResult))
-            timeElapsed = time.time() - timeStart
-            # Check if time out
-            if timeElapsed > timeOut:
-                hasTimedOut = True
-                strWarning = "Timeout while waiting for file %s" % filePath
-                logger.warning(strWarning)
-            else:
-                # Check if file is there
-                if filePath.exists():
-                    fileSize = filePath.stat().st_size
-                    if expectedSize is not None:
-                        # Check that it has right size
-                        if fileSize > expectedSize:
-                            shouldContinue = False
-                    else:
-                        shouldContinue = False
-                    finalSize = fileSize
-    return hasTimedOut, finalSize
+    """
+    Waits until the file exists and, if expectedSize is given, is larger
+    than expectedSize bytes. Returns (hasTimedOut, finalSize).
+    """
+    with UtilsTrace.span('waitForFile', file=str(file)):
+        fileSet, finalSize = _watchFile(file, expectedSize)
+        if finalSize is not None:
+            return False, finalSize
+        hasArrived = fileSet.waitAll(timeOut)
+        return _getWaitResult(file, fileSet, hasArrived)
+
+
+async def waitForFileAsync(file, expectedSize=None, timeOut=DEFAULT_TIMEOUT):
+    """
+    Same as waitForFile but doesn't block the event loop while waiting
+    """
+    with UtilsTrace.span('waitForFile', file=str(file)):
+        fileSet, finalSize = _watchFile(file, expectedSize)
+        if finalSize is not None:
+            return False, finalSize
+        hasArrived = await fileSet.waitAllAsync(timeOut)
+        return _getWaitResult(file, fileSet, hasArrived)
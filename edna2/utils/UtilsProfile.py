@@ -0,0 +1,166 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Opt-in profiling of task runs. The run method of the selected tasks is
+# profiled with cProfile and, optionally, its memory allocations traced
+# with tracemalloc. The results are written to the working directory of
+# the task, next to its inData / outData files:
+#
+# profile<TaskName>.prof        cProfile statistics, see pstats
+# profile<TaskName>.txt         the most expensive functions
+# allocations<TaskName>.snapshot  tracemalloc snapshot, see
+#                                 tracemalloc.Snapshot.load
+# allocations<TaskName>.txt     the largest allocations and the peak
+#
+# Configuration, the environment variables take precedence:
+#
+# [Profile]
+# tasks = <comma separated task names, or all>    EDNA2_PROFILE
+# rate = <fraction of the runs profiled, 1.0>     EDNA2_PROFILE_RATE
+# memory = <true to trace allocations>            EDNA2_PROFILE_MEMORY
+# functions = <comma separated regular expressions restricting the
+#              functions listed in profile<TaskName>.txt, for example
+#              createSPOT_XDS,read_chunks,get_dozor_peaks>
+
+import os
+import io
+import pstats
+import random
+import cProfile
+import contextlib
+import tracemalloc
+
+from edna2.utils import UtilsConfig
+from edna2.utils import UtilsLogging
+
+logger = UtilsLogging.getLogger()
+
+DEFAULT_NUMBER_OF_LINES = 50
+TRACEBACK_DEPTH = 10
+
+
+def _getSetting(envName, parameterName, defaultValue=None):
+    value = os.environ.get(envName)
+    if value is None:
+        value = UtilsConfig.get('Profile', parameterName, defaultValue)
+    return value
+
+
+def _getList(value):
+    if value is None:
+        return []
+    return [item.strip() for item in str(value).split(',') if item.strip()]
+
+
+def isProfiled(task):
+    """
+    Returns True if this run of the task is to be profiled
+    """
+    listTaskName = _getList(_getSetting('EDNA2_PROFILE', 'tasks'))
+    if task.__class__.__name__ not in listTaskName and \
+            'all' not in listTaskName:
+        return False
+    rate = float(_getSetting('EDNA2_PROFILE_RATE', 'rate', 1.0))
+    return random.random() < rate
+
+
+def isMemoryProfiled():
+    memory = str(_getSetting('EDNA2_PROFILE_MEMORY', 'memory', False))
+    return memory.lower() in ['true', 'yes', '1']
+
+
+@contextlib.contextmanager
+def profile(task):
+    """
+    Context manager profiling the enclosed code if the task is selected
+    for profiling, see isProfiled
+    """
+    if not isProfiled(task):
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # Only one profiler can be active at a time (Python >= 3.12)
+        logger.warning('Task {0} not profiled: {1}'.format(
+            task.__class__.__name__, e))
+        profiler = None
+    # tracemalloc is process wide, it's left alone if another task
+    # is already tracing
+    doMemory = isMemoryProfiled() and not tracemalloc.is_tracing()
+    if doMemory:
+        tracemalloc.start(TRACEBACK_DEPTH)
+    try:
+        yield
+    finally:
+        snapshot = None
+        peakSize = None
+        if doMemory:
+            snapshot = tracemalloc.take_snapshot()
+            peakSize = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        if profiler is not None:
+            profiler.disable()
+        workingDirectory = task.getWorkingDirectory()
+        if workingDirectory is not None:
+            taskName = task.__class__.__name__
+            if profiler is not None:
+                writeProfile(profiler, workingDirectory, taskName)
+            if snapshot is not None:
+                writeAllocations(snapshot, peakSize, workingDirectory,
+                                 taskName)
+
+
+def writeProfile(profiler, workingDirectory, taskName):
+    profiler.dump_stats(
+        str(workingDirectory / 'profile{0}.prof'.format(taskName)))
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('cumulative')
+    listFunction = _getList(UtilsConfig.get('Profile', 'functions'))
+    if listFunction:
+        stats.print_stats('|'.join(listFunction))
+    else:
+        stats.print_stats(DEFAULT_NUMBER_OF_LINES)
+    with open(str(workingDirectory / 'profile{0}.txt'.format(taskName)),
+              'w') as f:
+        f.write(stream.getvalue())
+
+
+def writeAllocations(snapshot, peakSize, workingDirectory, taskName):
+    snapshot.dump(
+        str(workingDirectory / 'allocations{0}.snapshot'.format(taskName)))
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__)
+    ])
+    listLine = ['Peak traced memory: {0:.1f} MiB'.format(
+        peakSize / 1024 ** 2)]
+    for statistic in snapshot.statistics('lineno')[:DEFAULT_NUMBER_OF_LINES]:
+        listLine.append(str(statistic))
+    with open(str(workingDirectory / 'allocations{0}.txt'.format(taskName)),
+              'w') as f:
+        f.write('\n'.join(listLine) + '\n')
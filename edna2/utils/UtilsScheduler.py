@@ -0,0 +1,211 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import os
+import time
+import threading
+import contextvars
+import concurrent.futures
+
+from edna2.utils import UtilsConfig
+from edna2.utils import UtilsLogging
+
+logger = UtilsLogging.getLogger()
+
+_scheduler = None
+_schedulerPid = None
+_schedulerLock = threading.Lock()
+# (cores, memory) given to the task started in the current thread. A task
+# process forked from that thread limits its own scheduler to them.
+_grantedResources = contextvars.ContextVar('grantedResources', default=None)
+_inheritedResources = None
+
+
+def _afterForkInChild():
+    # The child only has a copy of the forking thread, keep its resources
+    # for the threads started later in the child
+    global _inheritedResources
+    _inheritedResources = _grantedResources.get()
+
+
+os.register_at_fork(after_in_child=_afterForkInChild)
+
+
+class ScheduledTask(object):
+    """
+    A task waiting in, or started by, the TaskScheduler.
+    """
+
+    def __init__(self, task, dependencies, cores, memory, executor):
+        self.task = task
+        self.dependencies = dependencies
+        self.cores = cores
+        self.memory = memory
+        self.executor = executor
+        self.submitTime = time.time()
+        self.future = concurrent.futures.Future()
+
+
+class TaskScheduler(object):
+    """
+    Runs tasks with a limited number of cores and amount of memory (MB).
+
+    Tasks are submitted together with the futures of the tasks they depend
+    on and their resource needs. A task is started when all its
+    dependencies have finished and enough resources are free. submit
+    returns a concurrent.futures.Future which is resolved with the task
+    once it has finished. If a dependency fails the task is not started
+    but flagged as failed.
+
+    The limits apply to the tasks of one process. A task run in its own
+    process gets a scheduler limited to the cores and memory it was given
+    (see getScheduler), so nested tasks stay within the budget of their
+    parent. Note that a task waiting for its own children blocks its
+    resources, nested tasks should therefore use a separate process.
+    """
+
+    def __init__(self, maxCores=None, maxMemory=None):
+        if maxCores is None:
+            maxCores = int(UtilsConfig.get(
+                'TaskScheduler', 'max_cores', os.cpu_count() or 1))
+        if maxMemory is None:
+            maxMemory = UtilsConfig.get('TaskScheduler', 'max_memory')
+            if maxMemory is not None:
+                maxMemory = int(maxMemory)
+        self.maxCores = maxCores
+        self.maxMemory = maxMemory
+        self._usedCores = 0
+        self._usedMemory = 0
+        self._listPending = []
+        self._condition = threading.Condition()
+
+    def submit(self, task, dependencies=None, cores=None, memory=None,
+               executor=None):
+        """
+        Submits a task, the number of cores and memory defaults to
+        the 'cores' and 'memory' entries of the task config, otherwise
+        one core and no memory limit.
+        """
+        if cores is None:
+            cores = int(UtilsConfig.get(task, 'cores', 1))
+        if memory is None:
+            memory = int(UtilsConfig.get(task, 'memory', 0))
+        # A task needing more than available is run alone
+        cores = min(cores, self.maxCores)
+        if self.maxMemory is not None:
+            memory = min(memory, self.maxMemory)
+        scheduledTask = ScheduledTask(task=task,
+                                      dependencies=list(dependencies or []),
+                                      cores=cores,
+                                      memory=memory,
+                                      executor=executor)
+        with self._condition:
+            self._listPending.append(scheduledTask)
+            self._schedule()
+        return scheduledTask.future
+
+    def map(self, listTask, **kwargs):
+        """
+        Submits a list of independent tasks, returns the list of futures.
+        """
+        return [self.submit(task, **kwargs) for task in listTask]
+
+    def getNumberOfPendingTasks(self):
+        with self._condition:
+            return len(self._listPending)
+
+    def _hasResources(self, scheduledTask):
+        if self._usedCores + scheduledTask.cores > self.maxCores:
+            return False
+        if self.maxMemory is not None and \
+                self._usedMemory + scheduledTask.memory > self.maxMemory:
+            return False
+        return True
+
+    def _schedule(self):
+        # Must be called with the condition acquired
+        for scheduledTask in list(self._listPending):
+            dependencies = scheduledTask.dependencies
+            if not all(future.done() for future in dependencies):
+                continue
+            if any(future.result().isFailure() for future in dependencies):
+                self._listPending.remove(scheduledTask)
+                logger.error('Task {0} not started, dependency failed'.format(
+                    scheduledTask.task.__class__.__name__))
+                scheduledTask.task.setFailure()
+                scheduledTask.future.set_result(scheduledTask.task)
+                # Tasks depending on this one may now be resolved
+                self._schedule()
+                return
+            if self._hasResources(scheduledTask):
+                self._listPending.remove(scheduledTask)
+                self._usedCores += scheduledTask.cores
+                self._usedMemory += scheduledTask.memory
+                thread = threading.Thread(target=self._runTask,
+                                          args=(scheduledTask,))
+                thread.daemon = True
+                thread.start()
+
+    def _runTask(self, scheduledTask):
+        task = scheduledTask.task
+        task.setMetric('queueWaitTime', time.time() - scheduledTask.submitTime)
+        # Inherited by the task process if the task is forked from here
+        _grantedResources.set((scheduledTask.cores, scheduledTask.memory))
+        try:
+            task.start(executor=scheduledTask.executor)
+            task.join()
+        except Exception as e:
+            logger.error(e)
+            task.setFailure()
+        with self._condition:
+            self._usedCores -= scheduledTask.cores
+            self._usedMemory -= scheduledTask.memory
+            scheduledTask.future.set_result(task)
+            self._schedule()
+            self._condition.notify_all()
+
+
+def getScheduler():
+    """
+    Returns the scheduler shared by all tasks in this process. In the
+    process of a task started by a scheduler it is limited to the cores
+    and memory given to that task, otherwise the limits come from the
+    config.
+    """
+    global _scheduler
+    global _schedulerPid
+    with _schedulerLock:
+        # A forked child must not reuse the scheduler of its parent
+        if _scheduler is None or _schedulerPid != os.getpid():
+            maxCores = None
+            maxMemory = None
+            if _inheritedResources is not None:
+                cores, memory = _inheritedResources
+                maxCores = max(1, cores)
+                if memory > 0:
+                    maxMemory = memory
+            _scheduler = TaskScheduler(maxCores=maxCores, maxMemory=maxMemory)
+            _schedulerPid = os.getpid()
+    return _scheduler
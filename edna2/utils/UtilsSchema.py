@@ -0,0 +1,204 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Validation of task inData / outData against JSON schemas. The schemas in
+# edna2/schema are loaded once into an in-memory registry so that "$ref"
+# items pointing to them (see AbstractTask.getSchemaUrl) are resolved
+# without reading the files again, and validators are compiled once per
+# task class.
+#
+# For production runs with huge arrays the validation can be limited with
+# the [Schema] 'validation' config entry (or a 'schema_validation' entry in
+# the task section):
+#
+#   full     : the complete instance is validated (default)
+#   sampled  : arrays longer than 'sample_size' are reduced to 'sample_size'
+#              evenly spaced items, including the first and the last
+#   boundary : arrays are reduced to their first and last items
+#
+# Note that array level constraints (minItems, uniqueItems, ...) are
+# checked on the reduced arrays in sampled and boundary mode.
+
+import json
+import pathlib
+import threading
+
+import jsonschema
+
+try:
+    import referencing
+    import referencing.jsonschema
+except ImportError:
+    # jsonschema < 4.18
+    referencing = None
+
+from edna2.utils import UtilsConfig
+from edna2.utils import UtilsLogging
+
+logger = UtilsLogging.getLogger()
+
+SCHEMA_PATH = pathlib.Path(__file__).parents[1] / 'schema'
+
+VALIDATION_FULL = 'full'
+VALIDATION_SAMPLED = 'sampled'
+VALIDATION_BOUNDARY = 'boundary'
+LIST_VALIDATION = [VALIDATION_FULL, VALIDATION_SAMPLED, VALIDATION_BOUNDARY]
+
+DEFAULT_SAMPLE_SIZE = 100
+
+_lock = threading.Lock()
+_dictSchema = None
+_registry = None
+_dictValidator = {}
+
+
+def getSchemaUrl(schemaName):
+    return 'file://' + str(SCHEMA_PATH / schemaName)
+
+
+def getSchemaStore():
+    """
+    Returns a dictionary of all schemas in edna2/schema, keyed both by
+    their file URL and by their 'id'.
+    """
+    global _dictSchema
+    with _lock:
+        if _dictSchema is None:
+            dictSchema = {}
+            for schemaPath in sorted(SCHEMA_PATH.glob('*.json')):
+                try:
+                    with open(str(schemaPath)) as f:
+                        schema = json.load(f)
+                except ValueError:
+                    # Not (yet) a JSON schema
+                    logger.debug('Skipping invalid schema {0}'.format(
+                        schemaPath))
+                    continue
+                dictSchema[getSchemaUrl(schemaPath.name)] = schema
+                schemaId = schema.get('$id', schema.get('id'))
+                if schemaId is not None:
+                    dictSchema[schemaId.rstrip('#')] = schema
+            _dictSchema = dictSchema
+    return _dictSchema
+
+
+def getRegistry():
+    global _registry
+    dictSchema = getSchemaStore()
+    with _lock:
+        if _registry is None:
+            defaultSpecification = referencing.jsonschema.DRAFT4
+            listResource = []
+            for url, schema in dictSchema.items():
+                resource = referencing.Resource.from_contents(
+                    schema, default_specification=defaultSpecification)
+                listResource.append((url, resource))
+            _registry = referencing.Registry().with_resources(listResource)
+    return _registry
+
+
+def createValidator(schema):
+    validatorClass = jsonschema.validators.validator_for(schema)
+    if referencing is not None:
+        validator = validatorClass(schema, registry=getRegistry())
+    else:
+        resolver = jsonschema.RefResolver.from_schema(
+            schema, store=getSchemaStore())
+        validator = validatorClass(schema, resolver=resolver)
+    return validator
+
+
+def getValidator(task, dataType):
+    """
+    Returns the compiled validator for the inData ('inData') or outData
+    ('outData') schema of a task, or None if the task has no schema.
+    Validators are compiled once per task class.
+    """
+    key = (task.__class__, dataType)
+    if key not in _dictValidator:
+        if dataType == 'inData':
+            schema = task.getInDataSchema()
+        else:
+            schema = task.getOutDataSchema()
+        _dictValidator[key] = None if schema is None \
+            else createValidator(schema)
+    return _dictValidator[key]
+
+
+def getValidationMode(task):
+    defaultMode = UtilsConfig.get('Schema', 'validation', VALIDATION_FULL)
+    mode = UtilsConfig.get(task, 'schema_validation', defaultMode).lower()
+    if mode not in LIST_VALIDATION:
+        logger.warning('Unknown schema validation mode {0}, using {1}'.format(
+            mode, VALIDATION_FULL))
+        mode = VALIDATION_FULL
+    return mode
+
+
+def getSampleSize():
+    sampleSize = UtilsConfig.get('Schema', 'sample_size', DEFAULT_SAMPLE_SIZE)
+    return max(2, int(sampleSize))
+
+
+def reduceInstance(instance, mode, sampleSize=DEFAULT_SAMPLE_SIZE):
+    """
+    Returns a copy of instance where all arrays are reduced according to
+    the validation mode. The instance is returned as is in full mode.
+    """
+    if mode == VALIDATION_FULL:
+        return instance
+    if isinstance(instance, dict):
+        return {key: reduceInstance(value, mode, sampleSize)
+                for key, value in instance.items()}
+    elif isinstance(instance, list):
+        size = len(instance)
+        if mode == VALIDATION_BOUNDARY and size > 2:
+            listIndex = [0, size - 1]
+        elif mode == VALIDATION_SAMPLED and size > sampleSize:
+            step = (size - 1) / (sampleSize - 1)
+            listIndex = sorted(set(round(index * step)
+                                   for index in range(sampleSize)))
+        else:
+            listIndex = range(size)
+        return [reduceInstance(instance[index], mode, sampleSize)
+                for index in listIndex]
+    else:
+        return instance
+
+
+def validate(task, dataType, instance):
+    """
+    Validates inData or outData of a task, raises
+    jsonschema.ValidationError if the instance is not valid.
+    Returns False if the task has no schema for this data type.
+    """
+    validator = getValidator(task, dataType)
+    if validator is None:
+        return False
+    mode = getValidationMode(task)
+    if mode != VALIDATION_FULL:
+        instance = reduceInstance(instance, mode, getSampleSize())
+    validator.validate(instance)
+    return True
@@ -0,0 +1,187 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Execution in a node local scratch directory. A task with the 'scratch'
+# entry set in its config runs in a directory created in
+# [Scratch] directory (for example on tmpfs or a local SSD), only its
+# result files (see AbstractTask.getResultFilePatterns) are then moved
+# to its working directory on the shared file system, by a bounded pool
+# of background threads:
+#
+# [Scratch]
+# directory = <node local directory, scratch execution is off if unset>
+# max_workers = <number of copying threads, default 2>
+# max_pending = <maximum number of pending write-backs, default 100>
+#
+# Tasks wait for the write-back of their sub-tasks (waitForWriteBack)
+# before reading their result files.
+
+import os
+import glob
+import shutil
+import pathlib
+import tempfile
+import threading
+import concurrent.futures
+
+from edna2.utils import UtilsConfig
+from edna2.utils import UtilsLogging
+
+logger = UtilsLogging.getLogger()
+
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_MAX_PENDING = 100
+
+# Files written by AbstractTask
+LIST_DEFAULT_RESULT = ['inData*.json', 'outData*.json', '*.log.txt',
+                       '*.err.txt', '*.commandLine.txt', '*.partial.jsonl',
+                       '*_slurm.*', 'trace.json', 'profile*', 'allocations*']
+
+_copier = None
+_copierPid = None
+_copierLock = threading.Lock()
+
+
+def getScratchRoot():
+    return UtilsConfig.get('Scratch', 'directory')
+
+
+def isScratchEnabled(task):
+    """
+    Returns True if the task is configured to run in a scratch directory
+    """
+    if getScratchRoot() is None:
+        return False
+    scratch = str(UtilsConfig.get(task, 'scratch', False)).lower()
+    return scratch in ['true', 'yes', '1']
+
+
+def createScratchDirectory(task):
+    scratchRoot = getScratchRoot()
+    os.makedirs(scratchRoot, exist_ok=True)
+    scratchDirectory = tempfile.mkdtemp(
+        prefix=task.__class__.__name__ + '_', dir=scratchRoot)
+    return pathlib.Path(scratchDirectory)
+
+
+def moveResults(scratchDirectory, workingDirectory, listPattern):
+    """
+    Moves the files in scratchDirectory matching the glob patterns to
+    workingDirectory and removes scratchDirectory. Returns the list of
+    moved files.
+    """
+    scratchDirectory = pathlib.Path(scratchDirectory)
+    workingDirectory = pathlib.Path(workingDirectory)
+    listMoved = []
+    for pattern in listPattern:
+        for path in glob.glob(str(scratchDirectory / pattern),
+                              recursive=True):
+            path = pathlib.Path(path)
+            if not path.is_file():
+                continue
+            destination = workingDirectory / path.relative_to(scratchDirectory)
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(path), str(destination))
+            listMoved.append(destination)
+    shutil.rmtree(str(scratchDirectory), ignore_errors=True)
+    if not listMoved and workingDirectory.exists() and \
+            not os.listdir(str(workingDirectory)):
+        workingDirectory.rmdir()
+    return listMoved
+
+
+class ScratchCopier(object):
+    """
+    Moves results from scratch directories in background threads. When
+    max_pending write-backs are pending submit blocks, so that the scratch
+    space doesn't fill up faster than it can be emptied.
+    """
+
+    def __init__(self, maxWorkers=None, maxPending=None):
+        if maxWorkers is None:
+            maxWorkers = int(UtilsConfig.get(
+                'Scratch', 'max_workers', DEFAULT_MAX_WORKERS))
+        if maxPending is None:
+            maxPending = int(UtilsConfig.get(
+                'Scratch', 'max_pending', DEFAULT_MAX_PENDING))
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=maxWorkers, thread_name_prefix='edna2-scratch')
+        self._semaphore = threading.BoundedSemaphore(maxPending)
+        self._lock = threading.Lock()
+        self._setFuture = set()
+
+    def submit(self, scratchDirectory, workingDirectory, listPattern):
+        """
+        Starts moving the results, returns a concurrent.futures.Future
+        """
+        self._semaphore.acquire()
+        future = self._executor.submit(
+            moveResults, scratchDirectory, workingDirectory, listPattern)
+        with self._lock:
+            self._setFuture.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._setFuture.discard(future)
+        self._semaphore.release()
+        if future.exception() is not None:
+            logger.error('Write-back from scratch failed: {0}'.format(
+                future.exception()))
+
+    def getNumberOfPending(self):
+        with self._lock:
+            return len(self._setFuture)
+
+    def wait(self, timeout=None):
+        """
+        Completion barrier: waits until all submitted write-backs are done
+        """
+        with self._lock:
+            listFuture = list(self._setFuture)
+        concurrent.futures.wait(listFuture, timeout=timeout)
+
+
+def getCopier():
+    """
+    Returns the copier shared by all tasks in this process
+    """
+    global _copier
+    global _copierPid
+    with _copierLock:
+        # The threads of the parent don't exist in a forked child
+        if _copier is None or _copierPid != os.getpid():
+            _copier = ScratchCopier()
+            _copierPid = os.getpid()
+    return _copier
+
+
+def waitForWriteBack(timeout=None):
+    """
+    Waits for all write-backs of this process
+    """
+    if _copier is not None and _copierPid == os.getpid():
+        _copier.wait(timeout)
@@ -0,0 +1,202 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Service mode: a long running process accepting task requests on a local
+# Unix socket, so that the Python start up, the module imports and the
+# config and logger set up are done once instead of for every request.
+#
+# Protocol: one JSON document per line. The client sends
+#   {"taskName": "ImageQualityIndicatorsTask", "inData": {...},
+#    "workingDirectory": "/current/directory/of/the/client"}
+# and the server answers, once the task has finished, with
+#   {"isFailure": false, "outData": {...}}
+# or, if the request could not be run, {"isFailure": true, "error": "..."}.
+#
+# The number of tasks running at the same time is limited by the
+# [Service] 'max_workers' config entry, further requests wait.
+
+import os
+import json
+import socket
+import threading
+import concurrent.futures
+
+from edna2.utils import UtilsConfig
+
+# The logging and the task registry are only imported on the server side,
+# a client sending a request does not need them
+
+DEFAULT_SOCKET_PATH = '/tmp/edna2_{0}.sock'.format(os.getuid())
+
+
+def getSocketPath():
+    return UtilsConfig.get('Service', 'socket_path', DEFAULT_SOCKET_PATH)
+
+
+def runTask(request):
+    """
+    Runs the task of a request, returns the response
+    """
+    from edna2.utils import UtilsLogging
+    from edna2.utils import UtilsTaskRegistry
+    try:
+        taskName = request['taskName']
+        TaskClass = UtilsTaskRegistry.getTaskClass(taskName)
+        inData = request.get('inData', {})
+        # As when run from the command line the task working directory is
+        # created in the current directory of the client
+        if 'workingDirectory' in request and 'workingDirectory' not in inData:
+            inData['workingDirectory'] = request['workingDirectory']
+        task = TaskClass(inData=inData)
+        task.execute()
+        task.waitForWriteBack()
+    except Exception as e:
+        UtilsLogging.getLogger().exception(e)
+        return {'isFailure': True, 'error': repr(e)}
+    response = {'isFailure': task.isFailure()}
+    if task.isSuccess():
+        response['outData'] = task.outData
+    return response
+
+
+class TaskServer(object):
+    """
+    Accepts task requests on a Unix socket and runs them with a bounded
+    pool of workers
+    """
+
+    def __init__(self, socketPath=None, maxWorkers=None):
+        if socketPath is None:
+            socketPath = getSocketPath()
+        if maxWorkers is None:
+            maxWorkers = int(UtilsConfig.get(
+                'Service', 'max_workers', os.cpu_count() or 1))
+        self.socketPath = str(socketPath)
+        self.maxWorkers = maxWorkers
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=maxWorkers, thread_name_prefix='EDNA2Service')
+        self._socket = None
+        self._isRunning = False
+
+    def start(self):
+        if os.path.exists(self.socketPath):
+            # Left behind by a server that is not running any more
+            if isServerRunning(self.socketPath):
+                raise RuntimeError('A server is already listening on {0}'.format(
+                    self.socketPath))
+            os.remove(self.socketPath)
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.bind(self.socketPath)
+        os.chmod(self.socketPath, 0o600)
+        self._socket.listen()
+        self._isRunning = True
+        from edna2.utils import UtilsLogging
+        UtilsLogging.getLogger().info('EDNA2 service listening on {0} with {1} workers'.format(
+            self.socketPath, self.maxWorkers))
+
+    def serveForever(self):
+        try:
+            while self._isRunning:
+                try:
+                    connection, _ = self._socket.accept()
+                except OSError:
+                    # Socket closed by stop()
+                    break
+                thread = threading.Thread(target=self.handleConnection,
+                                          args=(connection,))
+                thread.daemon = True
+                thread.start()
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self._isRunning:
+            self._isRunning = False
+            try:
+                # Wakes up accept() in serveForever
+                self._socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._socket.close()
+            if os.path.exists(self.socketPath):
+                os.remove(self.socketPath)
+            self._executor.shutdown(wait=False)
+
+    def handleConnection(self, connection):
+        with connection, connection.makefile('rwb') as stream:
+            for line in stream:
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    response = {'isFailure': True, 'error': repr(e)}
+                else:
+                    response = self._executor.submit(runTask, request).result()
+                stream.write(json.dumps(response, default=str).encode() + b'\n')
+                stream.flush()
+
+
+def serve(socketPath=None, maxWorkers=None):
+    server = TaskServer(socketPath=socketPath, maxWorkers=maxWorkers)
+    server.start()
+    try:
+        server.serveForever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+def isServerRunning(socketPath=None):
+    if socketPath is None:
+        socketPath = getSocketPath()
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(socketPath))
+        return True
+    except OSError:
+        return False
+
+
+def executeTask(taskName, inData, socketPath=None, timeout=None):
+    """
+    Sends a task request to the server and returns the response
+    """
+    if socketPath is None:
+        socketPath = getSocketPath()
+    request = {
+        'taskName': taskName,
+        'inData': inData,
+        'workingDirectory': os.getcwd()
+    }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(str(socketPath))
+        with client.makefile('rwb') as stream:
+            stream.write(json.dumps(request).encode() + b'\n')
+            stream.flush()
+            line = stream.readline()
+    if not line:
+        raise RuntimeError('No response from EDNA2 service')
+    return json.loads(line)
@@ -0,0 +1,354 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Submission of command lines to a Slurm cluster.
+#
+# Command lines submitted with the same resources within a short delay are
+# grouped into one job array, each command becoming one array task. sbatch
+# returns immediately and a single thread per process polls for the exit
+# code files written by the array tasks, instead of one blocking
+# 'sbatch --wait' per command.
+#
+# Resources are taken from, in order of precedence, the 'slurm' dictionary
+# in the task inData (keys partition, cores, memory, time, nodes), the
+# 'slurm_partition', 'slurm_cores', ... entries of the task config and the
+# [Slurm] section of the config. The [Slurm] section also contains:
+#
+#   sbatch           : sbatch command (default 'sbatch')
+#   squeue           : squeue command (default 'squeue')
+#   batch_delay      : time (s) to wait for more commands before submitting
+#   max_array_size   : maximum number of commands in one job array
+#   poll_interval    : interval (s) between checks of the exit code files
+#   script_directory : directory for the job array scripts (default: the
+#                      working directory of the first command)
+#
+# The working directory of a command may be seen under another path by the
+# compute nodes (clusterDirectory). The job array scripts use that path,
+# the submit host polls the exit code files under its own path.
+
+import os
+import time
+import shlex
+import threading
+import subprocess
+
+from edna2.utils import UtilsConfig
+from edna2.utils import UtilsLogging
+
+logger = UtilsLogging.getLogger()
+
+DEFAULT_RESOURCES = {
+    'partition': 'mx',
+    'cores': 20,
+    'memory': 2000,  # MB
+    'time': '0:10:00',
+    'nodes': 1
+}
+DEFAULT_BATCH_DELAY = 1.0  # seconds
+DEFAULT_MAX_ARRAY_SIZE = 1000
+DEFAULT_POLL_INTERVAL = 1.0  # seconds
+# Number of polls between two checks that the job array is still known
+# to squeue
+SQUEUE_CHECK_PERIOD = 10
+
+_submitter = None
+_submitterPid = None
+_submitterLock = threading.Lock()
+
+
+def getResources(task, inData=None):
+    """
+    Returns the Slurm resources for a task
+    """
+    resources = {}
+    for name, defaultValue in DEFAULT_RESOURCES.items():
+        value = UtilsConfig.get('Slurm', name, defaultValue)
+        value = UtilsConfig.get(task, 'slurm_' + name, value)
+        if inData is not None and name in inData.get('slurm', {}):
+            value = inData['slurm'][name]
+        resources[name] = value
+    for name in ['cores', 'memory', 'nodes']:
+        resources[name] = int(resources[name])
+    return resources
+
+
+class SlurmJob(object):
+    """
+    One command line, run as one task of a job array. poll() and wait()
+    behave like the corresponding subprocess.Popen methods.
+    """
+
+    def __init__(self, jobName, commandLine, workingDirectory, resources,
+                 clusterDirectory=None):
+        self.jobName = jobName
+        self.commandLine = commandLine
+        self.workingDirectory = str(workingDirectory)
+        if clusterDirectory is None:
+            clusterDirectory = workingDirectory
+        self.clusterDirectory = str(clusterDirectory)
+        self.resources = resources
+        self.jobId = None
+        self.returncode = None
+        self.errorMessage = None
+        self._event = threading.Event()
+
+    @property
+    def exitCodePath(self):
+        # Path on the submit host
+        return os.path.join(self.workingDirectory, self.getExitCodeFileName())
+
+    @property
+    def clusterExitCodePath(self):
+        # Path on the compute nodes
+        return os.path.join(self.clusterDirectory, self.getExitCodeFileName())
+
+    def getExitCodeFileName(self):
+        return self.jobName + '_slurm.exitcode'
+
+    def setFinished(self, returncode, errorMessage=None):
+        self.returncode = returncode
+        self.errorMessage = errorMessage
+        self._event.set()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        self._event.wait(timeout)
+        return self.returncode
+
+
+class SlurmSubmitter(object):
+    """
+    Groups submitted commands into job arrays and follows their execution
+    """
+
+    def __init__(self):
+        self.sbatch = UtilsConfig.get('Slurm', 'sbatch', 'sbatch')
+        self.squeue = UtilsConfig.get('Slurm', 'squeue', 'squeue')
+        self.batchDelay = float(UtilsConfig.get(
+            'Slurm', 'batch_delay', DEFAULT_BATCH_DELAY))
+        self.maxArraySize = int(UtilsConfig.get(
+            'Slurm', 'max_array_size', DEFAULT_MAX_ARRAY_SIZE))
+        self.pollInterval = float(UtilsConfig.get(
+            'Slurm', 'poll_interval', DEFAULT_POLL_INTERVAL))
+        self.scriptDirectory = UtilsConfig.get('Slurm', 'script_directory')
+        self._lock = threading.Lock()
+        # Jobs waiting to be submitted, grouped by resources
+        self._dictPending = {}
+        self._listRunning = []
+        self._pollThread = None
+        self._arrayIndex = 0
+
+    def submit(self, jobName, commandLine, workingDirectory, resources,
+               clusterDirectory=None):
+        """
+        Submits a command line, returns a SlurmJob. clusterDirectory is the
+        working directory as seen by the compute nodes, by default the
+        same path.
+        """
+        job = SlurmJob(jobName, commandLine, workingDirectory, resources,
+                       clusterDirectory=clusterDirectory)
+        if os.path.exists(job.exitCodePath):
+            os.remove(job.exitCodePath)
+        key = tuple(sorted(resources.items()))
+        listJob = None
+        with self._lock:
+            if key not in self._dictPending:
+                self._dictPending[key] = []
+                timer = threading.Timer(self.batchDelay, self._flush,
+                                        args=(key,))
+                timer.daemon = True
+                timer.start()
+            self._dictPending[key].append(job)
+            if len(self._dictPending[key]) >= self.maxArraySize:
+                listJob = self._dictPending.pop(key)
+        if listJob is not None:
+            self._submitArray(listJob)
+        return job
+
+    def _flush(self, key):
+        with self._lock:
+            listJob = self._dictPending.pop(key, None)
+        if listJob:
+            self._submitArray(listJob)
+
+    def createScript(self, listJob, arrayName):
+        resources = listJob[0].resources
+        if self.scriptDirectory is not None:
+            scriptDirectory = self.scriptDirectory
+            logDirectory = self.scriptDirectory
+        else:
+            scriptDirectory = listJob[0].workingDirectory
+            logDirectory = listJob[0].clusterDirectory
+        logPath = os.path.join(logDirectory, arrayName + '_%a.log')
+        script = '#!/bin/bash\n'
+        script += '#SBATCH --job-name="{0}"\n'.format(arrayName)
+        script += '#SBATCH --partition={0}\n'.format(resources['partition'])
+        script += '#SBATCH --mem={0}\n'.format(resources['memory'])
+        script += '#SBATCH --nodes={0}\n'.format(resources['nodes'])
+        script += '#SBATCH --cpus-per-task={0}\n'.format(resources['cores'])
+        script += '#SBATCH --time={0}\n'.format(resources['time'])
+        script += '#SBATCH --output={0}\n'.format(logPath)
+        script += 'case $SLURM_ARRAY_TASK_ID in\n'
+        for index, job in enumerate(listJob):
+            workingDirectory = shlex.quote(job.clusterDirectory)
+            slurmLog = shlex.quote(job.jobName + '_slurm.log')
+            slurmErrorLog = shlex.quote(job.jobName + '_slurm.error.log')
+            exitCodePath = shlex.quote(job.clusterExitCodePath)
+            script += '{0})\n'.format(index)
+            script += 'cd {0}\n'.format(workingDirectory)
+            script += '(\n{0}\n) 1>{1} 2>{2}\n'.format(
+                job.commandLine, slurmLog, slurmErrorLog)
+            # Write the exit code atomically
+            script += 'echo $? > {0}.tmp && mv {0}.tmp {0}\n'.format(
+                exitCodePath)
+            script += ';;\n'
+        script += 'esac\n'
+        scriptPath = os.path.join(scriptDirectory, arrayName + '_slurm.sh')
+        with open(scriptPath, 'w') as f:
+            f.write(script)
+        os.chmod(scriptPath, 0o755)
+        return scriptPath
+
+    def _submitArray(self, listJob):
+        with self._lock:
+            self._arrayIndex += 1
+            arrayName = '{0}_{1}_{2}'.format(
+                listJob[0].jobName, os.getpid(), self._arrayIndex)
+        try:
+            scriptPath = self.createScript(listJob, arrayName)
+            commandLine = shlex.split(self.sbatch) + [
+                '--parsable', '--array=0-{0}'.format(len(listJob) - 1),
+                scriptPath
+            ]
+            logger.debug('Submitting job array: {0}'.format(
+                ' '.join(commandLine)))
+            pipes = subprocess.run(
+                commandLine,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=os.path.dirname(scriptPath)
+            )
+            if pipes.returncode != 0:
+                raise RuntimeError('{0}, code {1}'.format(
+                    str(pipes.stderr, 'utf-8'), pipes.returncode))
+            # Output of --parsable: jobId[;cluster]
+            jobId = str(pipes.stdout, 'utf-8').strip().split(';')[0]
+        except Exception as e:
+            logger.error('Submission of job array {0} failed: {1}'.format(
+                arrayName, e))
+            for job in listJob:
+                job.setFinished(1, str(e))
+            return
+        with self._lock:
+            for job in listJob:
+                job.jobId = jobId
+                self._listRunning.append(job)
+            if self._pollThread is None:
+                self._pollThread = threading.Thread(target=self._poll)
+                self._pollThread.daemon = True
+                self._pollThread.start()
+
+    def _poll(self):
+        pollNumber = 0
+        while True:
+            time.sleep(self.pollInterval)
+            pollNumber += 1
+            with self._lock:
+                listRunning = list(self._listRunning)
+            if pollNumber % SQUEUE_CHECK_PERIOD == 0:
+                setActiveJobId = self.getActiveJobIds(
+                    set(job.jobId for job in listRunning))
+            else:
+                setActiveJobId = None
+            listFinished = []
+            for job in listRunning:
+                returncode = self.readExitCode(job)
+                if returncode is not None:
+                    job.setFinished(returncode)
+                    listFinished.append(job)
+                elif setActiveJobId is not None and \
+                        job.jobId not in setActiveJobId:
+                    # The exit code could have been written meanwhile
+                    returncode = self.readExitCode(job)
+                    if returncode is None:
+                        job.setFinished(
+                            1, 'Job {0} ended without exit code'.format(
+                                job.jobId))
+                    else:
+                        job.setFinished(returncode)
+                    listFinished.append(job)
+            with self._lock:
+                for job in listFinished:
+                    self._listRunning.remove(job)
+                if len(self._listRunning) == 0:
+                    self._pollThread = None
+                    return
+
+    @staticmethod
+    def readExitCode(job):
+        returncode = None
+        if os.path.exists(job.exitCodePath):
+            try:
+                with open(job.exitCodePath) as f:
+                    returncode = int(f.read().strip())
+            except ValueError:
+                returncode = 1
+        return returncode
+
+    def getActiveJobIds(self, setJobId):
+        """
+        Returns the subset of the job ids known to squeue, or None if
+        squeue cannot be run
+        """
+        commandLine = shlex.split(self.squeue) + [
+            '--noheader', '--format=%F', '--jobs=' + ','.join(sorted(setJobId))
+        ]
+        try:
+            pipes = subprocess.run(commandLine, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        except OSError:
+            return None
+        if pipes.returncode != 0:
+            # squeue also fails if none of the jobs is known any more
+            if b'Invalid job id' in pipes.stderr:
+                return set()
+            return None
+        listLine = str(pipes.stdout, 'utf-8').split()
+        return set(jobId for jobId in setJobId if jobId in listLine)
+
+
+def getSubmitter():
+    """
+    Returns the submitter shared by all tasks in this process.
+    """
+    global _submitter
+    global _submitterPid
+    with _submitterLock:
+        if _submitter is None or _submitterPid != os.getpid():
+            _submitter = SlurmSubmitter()
+            _submitterPid = os.getpid()
+    return _submitter
@@ -0,0 +1,166 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Registry of the EDNA2 tasks. The name of every task class is mapped to
+# the module in edna2/tasks defining it, so that a task can be found by
+# name without importing all task modules. The index is precomputed in
+# edna2/tasks/taskIndex.json, update it after adding a task with:
+#
+#   python -m edna2.utils.UtilsTaskRegistry
+#
+# Tasks missing from the index are found by scanning the task modules
+# (without importing them): only the classes deriving from AbstractTask
+# and implementing run are tasks.
+
+import ast
+import json
+import pathlib
+import importlib
+
+from edna2.utils import UtilsLogging
+
+logger = UtilsLogging.getLogger()
+
+TASKS_PATH = pathlib.Path(__file__).parents[1] / 'tasks'
+INDEX_PATH = TASKS_PATH / 'taskIndex.json'
+# Modules in edna2/tasks not containing tasks
+LIST_EXCLUDED_MODULE = ['__init__', 'AbstractTask']
+TASK_BASE_CLASS = 'AbstractTask'
+# Prefix of the common base classes of tasks, e.g. AbstractMosflmTask
+ABSTRACT_PREFIX = 'Abstract'
+
+_dictIndex = None
+
+
+def _getBaseName(node):
+    # 'AbstractTask' or 'AbstractTask.AbstractTask'
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return getattr(node, 'id', None)
+
+
+def _isTask(className, dictClass, listVisited=None):
+    """
+    Returns (derives from AbstractTask, defines or inherits run) for a
+    class of dictClass, following its base classes in dictClass
+    """
+    listVisited = listVisited or []
+    if className == TASK_BASE_CLASS:
+        return True, False
+    if className not in dictClass or className in listVisited:
+        return False, False
+    listBaseName, hasRun = dictClass[className]
+    isTask = False
+    for baseName in listBaseName:
+        isBaseTask, hasBaseRun = _isTask(
+            baseName, dictClass, listVisited + [className])
+        isTask = isTask or isBaseTask
+        hasRun = hasRun or (isBaseTask and hasBaseRun)
+    return isTask, hasRun
+
+
+def scanTasks(tasksPath=TASKS_PATH):
+    """
+    Returns a dictionary task name -> module name built by parsing the
+    modules in edna2/tasks. Tasks are the top level classes deriving from
+    AbstractTask which define or inherit run, apart from the Abstract*
+    base classes.
+    """
+    dictClass = {}
+    dictModule = {}
+    for modulePath in sorted(pathlib.Path(tasksPath).glob('*.py')):
+        moduleName = modulePath.stem
+        if moduleName in LIST_EXCLUDED_MODULE:
+            continue
+        tree = ast.parse(modulePath.read_text(), filename=str(modulePath))
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef):
+                if node.name in dictModule:
+                    logger.warning('Task {0} defined in both {1} and {2}'.format(
+                        node.name, dictModule[node.name], moduleName))
+                    continue
+                hasRun = any(
+                    isinstance(child, ast.FunctionDef) and child.name == 'run'
+                    for child in node.body)
+                dictClass[node.name] = (
+                    [_getBaseName(base) for base in node.bases], hasRun)
+                dictModule[node.name] = moduleName
+    dictIndex = {}
+    for className, moduleName in dictModule.items():
+        if not className.startswith(ABSTRACT_PREFIX) and \
+                _isTask(className, dictClass) == (True, True):
+            dictIndex[className] = moduleName
+    return dictIndex
+
+
+def writeIndex(indexPath=INDEX_PATH):
+    dictIndex = scanTasks()
+    with open(str(indexPath), 'w') as f:
+        f.write(json.dumps(dictIndex, indent=4, sort_keys=True) + '\n')
+    return dictIndex
+
+
+def getIndex():
+    global _dictIndex
+    if _dictIndex is None:
+        if INDEX_PATH.exists():
+            with open(str(INDEX_PATH)) as f:
+                _dictIndex = json.load(f)
+        else:
+            _dictIndex = scanTasks()
+    return _dictIndex
+
+
+def getTaskModuleName(taskName):
+    global _dictIndex
+    dictIndex = getIndex()
+    if taskName not in dictIndex:
+        # Index out of date?
+        dictIndex = scanTasks()
+        if taskName in dictIndex:
+            logger.warning('Task {0} missing in {1}'.format(
+                taskName, INDEX_PATH))
+            _dictIndex = dictIndex
+        else:
+            raise RuntimeError('Unknown task: "{0}"'.format(taskName))
+    return dictIndex[taskName]
+
+
+def getTaskClass(taskName):
+    """
+    Returns the task class, only the module defining it is imported
+    """
+    moduleName = getTaskModuleName(taskName)
+    tasksModule = importlib.import_module('edna2.tasks.' + moduleName)
+    return getattr(tasksModule, taskName)
+
+
+def getListTaskName():
+    return sorted(getIndex())
+
+
+if __name__ == '__main__':
+    dictIndex = writeIndex()
+    print('{0} tasks written to {1}'.format(len(dictIndex), INDEX_PATH))
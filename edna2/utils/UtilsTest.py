@@ -30,6 +30,7 @@ __date__ = "21/04/2019"
 import os
 import re
 import json
+import random
 import pathlib
 import datetime
 import tempfile
@@ -44,6 +45,12 @@ logger = UtilsLogging.getLogger()
 URL_EDNA_SITE = "http://www.edna-site.org/data/tests/images"
 MAX_DOWNLOAD_TIME = 300
 
+# Image size (fast, slow) of the Pilatus detectors
+DICT_PILATUS_DIMENSION = {
+    'PILATUS3 2M': (1475, 1679),
+    'PILATUS3 6M': (2463, 2527)
+}
+
 
 def __timeoutDuringDownload():
     """
@@ -187,4 +194,143 @@ def prepareTestDataPath(modulePath):
     dataPath = pathlib.Path(modulePath).parent / 'data'
     os.chdir(str(getTestRunPath()))
     return dataPath
-    
\ No newline at end of file
+    
+
+
+def createSyntheticCBF(path, detector='PILATUS3 2M', startAngle=0.0,
+                       binaryData=None, seed=0):
+    """
+    Writes a CBF file with a Pilatus header. Unless binaryData is given
+    the binary section contains one random byte per pixel, about the
+    size of a compressed image with few counts.
+    """
+    fastDimension, slowDimension = DICT_PILATUS_DIMENSION[detector]
+    if binaryData is None:
+        binaryData = random.Random(seed).randbytes(fastDimension * slowDimension)
+    listLine = [
+        '###CBF: VERSION 1.5, CBFlib v0.7.8 - PILATUS detectors',
+        '',
+        'data_' + pathlib.Path(path).stem,
+        '',
+        '_array_data.header_convention "PILATUS_1.2"',
+        '_array_data.header_contents',
+        ';',
+        '# Detector: {0}, S/N 60-0101, ESRF ID30'.format(detector),
+        '# 2020-02-04T10:00:00.000',
+        '# Pixel_size 172e-6 m x 172e-6 m',
+        '# Silicon sensor, thickness 0.001000 m',
+        '# Exposure_time 0.0100000 s',
+        '# Exposure_period 0.0100000 s',
+        '# Tau = 0 s',
+        '# Count_cutoff 1048574 counts',
+        '# Threshold_setting: 6331 eV',
+        '# Wavelength 0.9763 A',
+        '# Detector_distance 0.30000 m',
+        '# Beam_xy (735.00, 840.00) pixels',
+        '# Start_angle {0:.4f} deg.'.format(startAngle),
+        '# Angle_increment 0.1000 deg.',
+        '# Oscillation_axis X, CW',
+        ';',
+        '',
+        '_array_data.data',
+        ';',
+        '--CIF-BINARY-FORMAT-SECTION--',
+        'Content-Type: application/octet-stream;',
+        '     conversions="x-CBF_BYTE_OFFSET"',
+        'Content-Transfer-Encoding: BINARY',
+        'X-Binary-Size: {0}'.format(len(binaryData)),
+        'X-Binary-ID: 1',
+        'X-Binary-Element-Type: "signed 32-bit integer"',
+        'X-Binary-Element-Byte-Order: LITTLE_ENDIAN',
+        'X-Binary-Number-of-Elements: {0}'.format(fastDimension * slowDimension),
+        'X-Binary-Size-Fastest-Dimension: {0}'.format(fastDimension),
+        'X-Binary-Size-Second-Dimension: {0}'.format(slowDimension),
+        'X-Binary-Size-Padding: 4095',
+        ''
+    ]
+    with open(str(path), 'wb') as f:
+        f.write('\r\n'.join(listLine).encode('ascii') + b'\r\n')
+        f.write(b'\x0c\x1a\x04\xd5')
+        f.write(binaryData)
+        f.write(b'\0' * 4095)
+        f.write(b'\r\n--CIF-BINARY-FORMAT-SECTION----\r\n;\r\n\r\n')
+    return path
+
+
+def createSyntheticEigerMaster(directory, prefix='mesh_1', listNumberOfImages=(2,),
+                               nimages=True, imageNumberHigh=True,
+                               virtual=False, shape=(4, 4), seed=0):
+    """
+    Writes an Eiger 4M master file '<prefix>_master.h5' with one data
+    file per entry of listNumberOfImages. The data files are referenced
+    by external links, or by one virtual dataset if virtual is True.
+    nimages and imageNumberHigh control whether the master contains the
+    detectorSpecific/nimages entry and the data files the image_nr_high
+    attribute. Frames contain random counts, the first pixel of each
+    frame is saturated, and the pixel mask flags the last row as a gap
+    and the second pixel as dead.
+    """
+    import h5py
+    import numpy
+    directory = pathlib.Path(directory)
+    generator = numpy.random.default_rng(seed)
+    listDataPath = []
+    imageNumberLow = 1
+    for index, numberOfImages in enumerate(listNumberOfImages):
+        dataPath = directory / '{0}_data_{1:06d}.h5'.format(prefix, index + 1)
+        data = generator.poisson(
+            5, (numberOfImages,) + tuple(shape)).astype(numpy.uint32)
+        data[:, 0, 0] = 0xffffffff
+        with h5py.File(str(dataPath), 'w') as f:
+            dataset = f.create_dataset('entry/data/data', data=data)
+            if imageNumberHigh:
+                dataset.attrs['image_nr_low'] = imageNumberLow
+                dataset.attrs['image_nr_high'] = \
+                    imageNumberLow + numberOfImages - 1
+        imageNumberLow += numberOfImages
+        listDataPath.append(dataPath)
+    masterPath = directory / '{0}_master.h5'.format(prefix)
+    with h5py.File(str(masterPath), 'w') as f:
+        detector = f.create_group('entry/instrument/detector')
+        f['entry/instrument/beam/incident_wavelength'] = 0.9763
+        detector['beam_center_x'] = 1035.0
+        detector['beam_center_y'] = 1083.5
+        detector['count_time'] = 0.01
+        detector['detector_distance'] = 0.2
+        detector['geometry/orientation/value'] = [-1.0, 0.0, 0.0, 0.0, -1.0, 0.0]
+        detector['geometry/translation/distances'] = [0.077, 0.081, 0.2]
+        detector['x_pixel_size'] = 75e-6
+        detector['y_pixel_size'] = 75e-6
+        detector['detector_number'] = b'E-08-0106'
+        detector['description'] = b'Dectris Eiger 4M'
+        detector['sensor_thickness'] = 0.00045
+        detector['frame_time'] = 0.0101
+        pixelMask = numpy.zeros(shape, dtype=numpy.uint32)
+        pixelMask[-1, :] = 1
+        pixelMask[0, 1] = 2
+        detector['detectorSpecific/pixel_mask'] = pixelMask
+        detector['detectorSpecific/data_collection_date'] = \
+            b'2020-02-04T10:00:00.000'
+        if nimages:
+            detector['detectorSpecific/nimages'] = sum(listNumberOfImages)
+            detector['detectorSpecific/ntrigger'] = 1
+        f['entry/sample/goniometer/omega_start'] = 10.0
+        f['entry/sample/goniometer/omega_increment'] = 0.1
+        data = f.create_group('entry/data')
+        if virtual:
+            layout = h5py.VirtualLayout(
+                shape=(sum(listNumberOfImages),) + tuple(shape),
+                dtype=numpy.uint32)
+            start = 0
+            for dataPath, numberOfImages in zip(listDataPath, listNumberOfImages):
+                source = h5py.VirtualSource(
+                    dataPath.name, 'entry/data/data',
+                    shape=(numberOfImages,) + tuple(shape))
+                layout[start:start + numberOfImages] = source
+                start += numberOfImages
+            data.create_virtual_dataset('data', layout)
+        else:
+            for index, dataPath in enumerate(listDataPath):
+                data['data_{0:06d}'.format(index + 1)] = h5py.ExternalLink(
+                    dataPath.name, 'entry/data/data')
+    return masterPath
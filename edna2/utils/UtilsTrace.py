@@ -0,0 +1,265 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Hierarchical tracing of task execution.
+#
+# Each task run is a span, the phases of a run (schema validation,
+# working directory creation, waiting for files, external commands,
+# output parsing) are child spans. The context of the current span is
+# passed to sub-tasks in inData['traceContext'], so that spans of tasks
+# running in other threads or processes are attached to their parent.
+#
+# Finished spans are appended, one JSON line each, to a spool file shared
+# by all spans of a trace. When the top-level task has finished the spool
+# is merged into <workingDirectory>/trace.json, in the Chrome trace event
+# format (chrome://tracing, https://ui.perfetto.dev).
+#
+# Tracing of top-level tasks is enabled with:
+#
+# [Trace]
+# enabled = true
+# directory = <directory of the spool files, default the temp directory>
+
+import os
+import json
+import time
+import uuid
+import tempfile
+import threading
+import contextlib
+import contextvars
+
+from edna2.utils import UtilsConfig
+
+TRACE_CONTEXT = 'traceContext'
+TRACE_FILE_NAME = 'trace.json'
+
+CATEGORY_TASK = 'task'
+CATEGORY_PHASE = 'phase'
+
+_currentSpan = contextvars.ContextVar('edna2TraceSpan', default=None)
+
+
+class Span(object):
+
+    def __init__(self, name, category, traceId, parentId, spoolPath,
+                 args=None):
+        self.name = name
+        self.category = category
+        self.traceId = traceId
+        self.spanId = uuid.uuid4().hex[:16]
+        self.parentId = parentId
+        self.spoolPath = spoolPath
+        self.args = dict(args or {})
+        self.startTime = None
+        self._startCounter = None
+
+    def start(self):
+        self.startTime = time.time()
+        self._startCounter = time.perf_counter()
+
+    def finish(self):
+        duration = time.perf_counter() - self._startCounter
+        args = dict(self.args, spanId=self.spanId, parentId=self.parentId)
+        # Complete event, times in microseconds
+        event = {
+            'name': self.name,
+            'cat': self.category,
+            'ph': 'X',
+            'ts': int(self.startTime * 1e6),
+            'dur': int(duration * 1e6),
+            'pid': os.getpid(),
+            'tid': _getThreadId(),
+            'args': args
+        }
+        _appendToSpool(self.spoolPath, event)
+
+    def getContext(self):
+        """
+        Returns the context passed to sub-tasks in inData
+        """
+        return {
+            'traceId': self.traceId,
+            'parentId': self.spanId,
+            'spoolPath': self.spoolPath
+        }
+
+
+def _getThreadId():
+    # Python < 3.8 has no native thread id
+    if hasattr(threading, 'get_native_id'):
+        return threading.get_native_id()
+    return threading.get_ident()
+
+
+def isEnabled():
+    enabled = str(UtilsConfig.get('Trace', 'enabled', False)).lower()
+    return enabled in ['true', 'yes', '1']
+
+
+def getCurrentContext():
+    """
+    Returns the context of the innermost running span, None if not tracing
+    """
+    span = _currentSpan.get()
+    return None if span is None else span.getContext()
+
+
+def getSpoolPath(traceId):
+    directory = UtilsConfig.get('Trace', 'directory', tempfile.gettempdir())
+    return os.path.join(directory, 'edna2_trace_{0}.jsonl'.format(traceId))
+
+
+def _appendToSpool(spoolPath, event):
+    # One write per span, lines of several processes don't mix
+    line = json.dumps(event, default=str) + '\n'
+    fd = os.open(spoolPath, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode('utf-8'))
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def _runSpan(span):
+    token = _currentSpan.set(span)
+    span.start()
+    try:
+        yield span
+    finally:
+        span.finish()
+        _currentSpan.reset(token)
+
+
+@contextlib.contextmanager
+def span(name, category=CATEGORY_PHASE, **args):
+    """
+    Context manager recording a child span of the current span, does
+    nothing if there is no current span
+    """
+    parent = _currentSpan.get()
+    if parent is None:
+        yield None
+    else:
+        with _runSpan(Span(name, category, parent.traceId, parent.spanId,
+                           parent.spoolPath, args)) as childSpan:
+            yield childSpan
+
+
+@contextlib.contextmanager
+def taskSpan(task, context=None):
+    """
+    Context manager recording the run of a task. The parent span is given
+    by context (see AbstractTask.start) or is the current span. Otherwise,
+    if tracing is enabled, a new trace is started and written to the
+    working directory of the task once it has finished.
+    """
+    if context is None:
+        context = getCurrentContext()
+    if context is None and not isEnabled():
+        yield None
+        return
+    isRoot = context is None
+    if isRoot:
+        traceId = uuid.uuid4().hex
+        context = {
+            'traceId': traceId,
+            'parentId': None,
+            'spoolPath': getSpoolPath(traceId)
+        }
+    spanTask = Span(task.__class__.__name__, CATEGORY_TASK,
+                    context['traceId'], context['parentId'],
+                    context['spoolPath'])
+    try:
+        with _runSpan(spanTask):
+            yield spanTask
+    finally:
+        # getWorkingDirectory would create a working directory already
+        # removed, or never needed, by the task
+        workingDirectory = task._workingDirectory if isRoot else None
+        if workingDirectory is not None and \
+                os.path.exists(str(workingDirectory)):
+            writeTrace(spanTask.spoolPath,
+                       os.path.join(str(workingDirectory), TRACE_FILE_NAME))
+
+
+def readSpool(spoolPath):
+    listEvent = []
+    if os.path.exists(spoolPath):
+        with open(spoolPath) as f:
+            for line in f:
+                if line.strip():
+                    listEvent.append(json.loads(line))
+    return listEvent
+
+
+def getTraceEvents(listSpan):
+    """
+    Returns the trace events of a list of spans: the spans, a flow event
+    from each parent task to its sub-tasks, so that the calls between
+    threads and processes can be followed, and the names of the processes.
+    """
+    dictSpan = {event['args']['spanId']: event for event in listSpan}
+    listEvent = []
+    listPid = []
+    for event in sorted(listSpan, key=lambda event: event['ts']):
+        listEvent.append(event)
+        if event['pid'] not in listPid:
+            listPid.append(event['pid'])
+        parent = dictSpan.get(event['args']['parentId'])
+        if parent is not None and (parent['pid'], parent['tid']) != \
+                (event['pid'], event['tid']):
+            flowId = event['args']['spanId']
+            listEvent.append({
+                'name': event['name'], 'cat': 'flow', 'ph': 's',
+                'id': flowId, 'ts': event['ts'],
+                'pid': parent['pid'], 'tid': parent['tid']
+            })
+            listEvent.append({
+                'name': event['name'], 'cat': 'flow', 'ph': 'f', 'bp': 'e',
+                'id': flowId, 'ts': event['ts'],
+                'pid': event['pid'], 'tid': event['tid']
+            })
+    for index, pid in enumerate(listPid):
+        listEvent.append({
+            'name': 'process_name', 'ph': 'M', 'pid': pid,
+            'args': {'name': 'edna2 process {0}'.format(index)}
+        })
+    return listEvent
+
+
+def writeTrace(spoolPath, tracePath):
+    """
+    Merges the spans in a spool file into a Chrome trace file, the spool
+    file is removed
+    """
+    trace = {
+        'traceEvents': getTraceEvents(readSpool(spoolPath)),
+        'displayTimeUnit': 'ms'
+    }
+    with open(tracePath, 'w') as f:
+        json.dump(trace, f, indent=1)
+    if os.path.exists(spoolPath):
+        os.remove(spoolPath)
@@ -0,0 +1,99 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Transport of task results from a child process back to the parent.
+# Small payloads are sent as they are over the pipe, large ones are
+# copied once into a shared memory block and only the name of the block
+# is sent. The receiving side releases the block.
+
+try:
+    from multiprocessing import shared_memory
+    from multiprocessing import resource_tracker
+except ImportError:
+    # Python < 3.8
+    shared_memory = None
+
+from edna2.utils import UtilsConfig
+
+DEFAULT_SHARED_MEMORY_THRESHOLD = 1000000  # bytes
+
+TYPE_BYTES = 'bytes'
+TYPE_SHARED_MEMORY = 'sharedMemory'
+
+
+def getSharedMemoryThreshold():
+    threshold = UtilsConfig.get('Transport', 'shared_memory_threshold',
+                                DEFAULT_SHARED_MEMORY_THRESHOLD)
+    return int(threshold)
+
+
+def pack(data, threshold=None):
+    """
+    Returns a picklable message containing the bytes in data.
+    """
+    if threshold is None:
+        threshold = getSharedMemoryThreshold()
+    size = len(data)
+    if shared_memory is None or size == 0 or size < threshold:
+        message = (TYPE_BYTES, data)
+    else:
+        sharedMemory = _createSharedMemory(size)
+        sharedMemory.buf[:size] = data
+        message = (TYPE_SHARED_MEMORY, sharedMemory.name, size)
+        sharedMemory.close()
+    return message
+
+
+def unpack(message):
+    """
+    Returns the bytes contained in a message created by pack. A shared
+    memory block is released once it has been read.
+    """
+    if message[0] == TYPE_BYTES:
+        data = message[1]
+    elif message[0] == TYPE_SHARED_MEMORY:
+        name, size = message[1:]
+        sharedMemory = shared_memory.SharedMemory(name=name)
+        try:
+            data = bytes(sharedMemory.buf[:size])
+        finally:
+            sharedMemory.close()
+            sharedMemory.unlink()
+    else:
+        raise RuntimeError('Unknown message type: "{0}"'.format(message[0]))
+    return data
+
+
+def _createSharedMemory(size):
+    # The block must survive the process that creates it, so it
+    # must not be cleaned up by the resource tracker of that process
+    try:
+        sharedMemory = shared_memory.SharedMemory(
+            create=True, size=size, track=False)
+    except TypeError:
+        # Python < 3.13
+        sharedMemory = shared_memory.SharedMemory(create=True, size=size)
+        resource_tracker.unregister(sharedMemory._name, 'shared_memory')
+    return sharedMemory
@@ -0,0 +1,157 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+# Benchmark of the CBF header parser on synthetic Pilatus 2M and 6M
+# images, compared with the line based readers it replaces, and of the
+# numpy byte offset decoder compared with fabio. Files are in the page cache,
+# so this measures parsing, decoding and I/O system calls.
+#
+# python -m edna2.utils.test.UtilsCBF_benchmark [number of reads]
+
+import sys
+import time
+import shutil
+import pathlib
+import tempfile
+
+from edna2.utils import UtilsCBF
+from edna2.utils import UtilsTest
+
+
+def readLines60(filePath):
+    # Previous ReadImageHeader.readCBFHeader: up to 60 lines
+    dictHeader = None
+    with open(filePath, 'rb') as f:
+        index = 0
+        while True:
+            line = f.readline().decode('utf-8')
+            index += 1
+            if '_array_data.header_contents' in line:
+                dictHeader = {}
+            if '_array_data.data' in line or index > 60:
+                break
+            if dictHeader is not None and line[0] == '#':
+                strTmp = line[2:].replace('\r\n', '')
+                strKey = strTmp.split(' ')[0]
+                dictHeader[strKey] = strTmp.replace(strKey, '')[1:]
+    return dictHeader
+
+
+def readRecords(filePath):
+    # Previous autocryst CBFreader.read_cbfheaders: iterates over the
+    # binary file until X-Binary-Size-Padding
+    headers = {'dimension': []}
+    with open(filePath, 'rb') as fh:
+        for record in fh:
+            if b'X-Binary-Size-Padding' in record:
+                break
+            if b'Pixel_size' in record:
+                headers['pixel_size'] = float(record.decode().split()[2])
+            if b'Detector_distance' in record:
+                headers['detector_distance'] = float(record.decode().split()[2])
+            if b'Wavelength' in record:
+                headers['photon_energy'] = 12398 / float(record.decode().split()[2])
+            if b'Start_angle' in record:
+                headers['starting_angle'] = float(record.decode().split()[2])
+            if b'X-Binary-Size-Fastest-Dimension' in record:
+                headers['dimension'].append(int(record.decode().split()[1]))
+            if b'X-Binary-Size-Second-Dimension' in record:
+                headers['dimension'].append(int(record.decode().split()[1]))
+    return headers
+
+
+def timeReader(reader, filePath, numberOfReads):
+    reader(filePath)
+    timeStart = time.perf_counter()
+    for _ in range(numberOfReads):
+        reader(filePath)
+    return (time.perf_counter() - timeStart) / numberOfReads
+
+
+def readFabio(filePath):
+    import fabio
+    return fabio.open(filePath).data
+
+
+def createImage(filePath, detector, meanCount):
+    # Poisson background, gaps between modules and a few strong spots
+    import numpy
+    generator = numpy.random.default_rng(0)
+    fastDimension, slowDimension = UtilsTest.DICT_PILATUS_DIMENSION[detector]
+    data = generator.poisson(
+        meanCount, (slowDimension, fastDimension)).astype(numpy.int32)
+    data[195:213, :] = -1
+    data[:, 487:495] = -1
+    spot = generator.integers(0, data.size, 500)
+    data.reshape(-1)[spot] = generator.integers(1000, 1000000, 500)
+    return str(UtilsCBF.writeImage(filePath, data, [
+        'Detector: {0}, S/N 60-0101'.format(detector),
+        'Start_angle 0.0000 deg.'
+    ]))
+
+
+def run(numberOfReads=200):
+    runHeader(numberOfReads)
+    runData(max(1, numberOfReads // 20))
+
+
+def runData(numberOfReads=10):
+    tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='UtilsCBF_benchmark_'))
+    try:
+        print('{0:12s} {1:>8s} {2:>12s} {3:>13s}'.format(
+            'Detector', 'counts', 'fabio (ms)', 'UtilsCBF (ms)'))
+        for detector in UtilsTest.DICT_PILATUS_DIMENSION:
+            for meanCount in [0.1, 10, 1000]:
+                filePath = createImage(
+                    tmpDir / (detector.replace(' ', '_') + '_0001.cbf'),
+                    detector, meanCount)
+                listTime = [timeReader(reader, filePath, numberOfReads) * 1e3
+                            for reader in [readFabio, UtilsCBF.decodeImage]]
+                print('{0:12s} {1:8g} {2:12.1f} {3:13.1f}'.format(
+                    detector, meanCount, *listTime))
+    finally:
+        shutil.rmtree(str(tmpDir), ignore_errors=True)
+
+
+def runHeader(numberOfReads=200):
+    tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='UtilsCBF_benchmark_'))
+    try:
+        print('{0:12s} {1:>12s} {2:>12s} {3:>12s}'.format(
+            'Detector', 'lines (us)', 'records (us)', 'UtilsCBF (us)'))
+        for detector in UtilsTest.DICT_PILATUS_DIMENSION:
+            filePath = str(UtilsTest.createSyntheticCBF(
+                tmpDir / (detector.replace(' ', '_') + '_0001.cbf'),
+                detector=detector))
+            listTime = [timeReader(reader, filePath, numberOfReads) * 1e6
+                        for reader in [readLines60, readRecords,
+                                       UtilsCBF.readHeader]]
+            print('{0:12s} {1:12.1f} {2:12.1f} {3:12.1f}'.format(
+                detector, *listTime))
+    finally:
+        shutil.rmtree(str(tmpDir), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:2]])
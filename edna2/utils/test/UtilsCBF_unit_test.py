@@ -0,0 +1,215 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import mmap
+import shutil
+import struct
+import pathlib
+import tempfile
+import unittest
+
+from edna2.utils import UtilsCBF
+from edna2.utils import UtilsTest
+
+from edna2.tasks.ReadImageHeader import ReadImageHeader
+
+
+class UtilsCBFUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='UtilsCBF_'))
+        self.imagePath = UtilsTest.createSyntheticCBF(
+            self.tmpDir / 'mesh_1_0001.cbf', startAngle=12.5)
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmpDir), ignore_errors=True)
+
+    def test_readHeader(self):
+        cbfHeader = UtilsCBF.readHeader(self.imagePath)
+        self.assertEqual(cbfHeader.getDetectorName(), ['PILATUS3', '2M'])
+        self.assertAlmostEqual(cbfHeader.pixelSizeX, 172e-6)
+        self.assertAlmostEqual(cbfHeader.pixelSizeY, 172e-6)
+        self.assertEqual(cbfHeader.exposureTime, 0.01)
+        self.assertEqual(cbfHeader.wavelength, 0.9763)
+        self.assertEqual(cbfHeader.detectorDistance, 0.3)
+        self.assertEqual((cbfHeader.beamX, cbfHeader.beamY), (735.0, 840.0))
+        self.assertEqual(cbfHeader.startAngle, 12.5)
+        self.assertEqual(cbfHeader.angleIncrement, 0.1)
+        self.assertEqual(cbfHeader.conversions, 'x-CBF_BYTE_OFFSET')
+        self.assertEqual(cbfHeader.elementType, 'signed 32-bit integer')
+        self.assertEqual((cbfHeader.fastDimension, cbfHeader.slowDimension),
+                         (1475, 1679))
+        self.assertEqual(cbfHeader.binarySize, 1475 * 1679)
+        with open(str(self.imagePath), 'rb') as f:
+            f.seek(cbfHeader.binaryOffset - len(UtilsCBF.BINARY_MARKER))
+            self.assertEqual(f.read(4), UtilsCBF.BINARY_MARKER)
+
+    def test_readHeaderBlock(self):
+        # Only the beginning of the file is read
+        block, binaryOffset = UtilsCBF.readHeaderBlock(self.imagePath)
+        self.assertLess(len(block), UtilsCBF.READ_SIZE)
+        self.assertNotIn(UtilsCBF.BINARY_MARKER, block)
+        # No binary section
+        headerPath = self.tmpDir / 'header.cbf'
+        headerPath.write_bytes(block)
+        cbfHeader = UtilsCBF.readHeader(headerPath)
+        self.assertIsNone(cbfHeader.binaryOffset)
+        self.assertEqual(cbfHeader.startAngle, 12.5)
+
+    def test_readCBFHeader(self):
+        dictHeader = ReadImageHeader.readCBFHeader(str(self.imagePath))
+        self.assertEqual(dictHeader['Detector:'],
+                         'PILATUS3 2M, S/N 60-0101, ESRF ID30')
+        self.assertEqual(dictHeader['Start_angle'], '12.5000 deg.')
+        subWedge = ReadImageHeader.createCBFHeaderData(str(self.imagePath))
+        detector = subWedge['experimentalCondition']['detector']
+        self.assertEqual(detector['type'], 'pilatus2m')
+        self.assertAlmostEqual(detector['beamPositionX'], 735.0 * 0.172)
+
+    def test_autocrystCBFreader(self):
+        from edna2.lib.autocryst.src.Image import CBFreader
+        cbfReader = CBFreader(str(self.imagePath))
+        cbfReader.read_cbfheaders()
+        headers = cbfReader.headers
+        self.assertEqual(headers['detector_name'], ['PILATUS3', '2M'])
+        self.assertEqual(headers['dimension'], [1475, 1679])
+        self.assertAlmostEqual(headers['pixel_size'], 172e-6)
+        self.assertAlmostEqual(headers['photon_energy'], 12398 / 0.9763)
+        self.assertEqual(headers['starting_angle'], 12.5)
+
+    def test_compressByteOffset(self):
+        import numpy
+        data = numpy.array([3, 130, 129, 1129, -32700, 100000, 99999,
+                            -2 ** 31 + 1, 2 ** 31 - 1], dtype=numpy.int32)
+        binaryData = UtilsCBF.compressByteOffset(data)
+        escape16 = b'\x80'
+        escape32 = escape16 + b'\x00\x80'
+        escape64 = escape32 + b'\x00\x00\x00\x80'
+        # int32 differences wrap around modulo 2**32
+        self.assertEqual(
+            binaryData,
+            struct.pack('<bbb', 3, 127, -1) +
+            escape16 + struct.pack('<h', 1000) +
+            escape32 + struct.pack('<i', -33829) +
+            escape32 + struct.pack('<i', 132700) +
+            struct.pack('<b', -1) +
+            escape32 + struct.pack('<i', 2 ** 32 - 2 ** 31 + 1 - 99999) +
+            struct.pack('<b', -2))
+        # The int64 escape is only used for wider data
+        self.assertEqual(UtilsCBF.compressByteOffset(
+            numpy.array([0, 2 ** 40], dtype=numpy.int64)),
+            b'\x00' + escape64 + struct.pack('<q', 2 ** 40))
+        # Only single byte differences
+        self.assertEqual(UtilsCBF.compressByteOffset(
+            numpy.array([[1, 2], [0, -5]], dtype=numpy.int16)),
+            b'\x01\x01\xfe\xfb')
+
+    def test_compressByteOffsetWrap(self):
+        import numpy
+        import fabio
+        data = numpy.array([[0, 2 ** 31 - 1, -2 ** 31, 5]],
+                           dtype=numpy.int32)
+        binaryData = UtilsCBF.compressByteOffset(data)
+        self.assertTrue((UtilsCBF.decompressByteOffset(
+            binaryData, data.size) == data.ravel()).all())
+        imagePath = UtilsCBF.writeImage(
+            self.tmpDir / 'wrap_0001.cbf', data, ['Start_angle 0.0000 deg.'])
+        self.assertTrue((fabio.open(str(imagePath)).data == data).all())
+
+    def test_writeImage(self):
+        import numpy
+        data = numpy.random.default_rng(0).poisson(
+            10, (50, 40)).astype(numpy.int32)
+        data[0, :] = -1
+        data[10, 10] = 1000000
+        imagePath = UtilsCBF.writeImage(
+            self.tmpDir / 'image_0001.cbf', data,
+            ['Detector: Dectris Eiger 4M, S/N E-08-0106',
+             'Start_angle 1.0000 deg.'])
+        cbfHeader = UtilsCBF.readHeader(imagePath)
+        self.assertEqual(cbfHeader.startAngle, 1.0)
+        self.assertEqual((cbfHeader.fastDimension, cbfHeader.slowDimension),
+                         (40, 50))
+        with open(str(imagePath), 'rb') as f:
+            f.seek(cbfHeader.binaryOffset)
+            binaryData = f.read(cbfHeader.binarySize)
+        self.assertEqual(binaryData, UtilsCBF.compressByteOffset(data))
+
+    def test_decompressByteOffset(self):
+        import numpy
+        generator = numpy.random.default_rng(0)
+        data = numpy.concatenate([
+            generator.integers(-200, 200, 1000),
+            generator.integers(-70000, 70000, 1000),
+            generator.integers(-2 ** 31, 2 ** 31, 100),
+            # Values whose bytes contain 0x80
+            [0x80, 0x8000, 0x800080, -2 ** 31 + 0x80, -128, 127, -32768]
+        ]).astype(numpy.int32)
+        binaryData = UtilsCBF.compressByteOffset(data)
+        self.assertTrue((UtilsCBF.decompressByteOffset(
+            binaryData, data.size) == data).all())
+        # Only single byte differences
+        self.assertTrue((UtilsCBF.decompressByteOffset(
+            b'\x01\x01\xfe\xfb', 4) == [1, 2, 0, -5]).all())
+        # Into a slice of a 3D stack, from a memory mapped file
+        binaryPath = self.tmpDir / 'data.bin'
+        binaryPath.write_bytes(binaryData)
+        stack = numpy.zeros((3, 1, data.size), dtype=numpy.int32)
+        with open(str(binaryPath), 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                UtilsCBF.decompressByteOffset(buffer, data.size, out=stack[1])
+        self.assertTrue((stack[1, 0] == data).all())
+        self.assertTrue((stack[0] == 0).all() and (stack[2] == 0).all())
+        # Not contiguous
+        with self.assertRaises(ValueError):
+            UtilsCBF.decompressByteOffset(
+                binaryData, data.size,
+                out=numpy.zeros((7, data.size // 7 + 1),
+                                dtype=numpy.int32)[:, 1:])
+
+    def test_readImage(self):
+        import numpy
+        import fabio
+        data = numpy.random.default_rng(0).poisson(
+            3, (1679, 1475)).astype(numpy.int32)
+        data[195:213, :] = -1
+        data[100, 100] = 500000
+        listPath = []
+        for index in range(3):
+            listPath.append(str(UtilsCBF.writeImage(
+                self.tmpDir / 'image_{0:04d}.cbf'.format(index + 1),
+                data + index, ['Start_angle 0.0000 deg.'])))
+        image = UtilsCBF.readImage(listPath[0])
+        self.assertEqual(image.shape, (1679, 1475))
+        self.assertTrue((image == fabio.open(listPath[0]).data).all())
+        image = UtilsCBF.decodeImage(listPath[0])
+        self.assertTrue((image == data).all())
+        stack = UtilsCBF.readStack(listPath)
+        self.assertEqual(stack.shape, (3, 1679, 1475))
+        self.assertTrue((stack[2] == data + 2).all())
+        from edna2.lib.autocryst.src.Image import CBFreader
+        cbfReader = CBFreader(listPath[1])
+        cbfReader.read_cbfdata()
+        self.assertTrue((cbfReader.data == (data + 1).ravel()).all())
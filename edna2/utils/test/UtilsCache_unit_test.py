@@ -0,0 +1,116 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import os
+import shutil
+import pathlib
+import tempfile
+import unittest
+
+from edna2.utils import UtilsCache
+
+from edna2.tasks.DozorTasks import ExecDozor
+from edna2.tasks.HelloWorldTask import HelloWorldTask
+
+
+class UtilsCacheUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='UtilsCache_'))
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmpDir), ignore_errors=True)
+
+    def test_getCacheKey(self):
+        task = HelloWorldTask(inData={})
+        filePath = self.tmpDir / 'image_0001.cbf'
+        filePath.write_text('data')
+        inData = {'name': 'key', 'image': [str(filePath)]}
+        key = UtilsCache.getCacheKey(task, inData)
+        # Same key for same input in a different order
+        inData2 = {'image': [str(filePath)], 'name': 'key',
+                   'workingDirectory': str(self.tmpDir)}
+        self.assertEqual(key, UtilsCache.getCacheKey(task, inData2))
+        # New key if the referenced file changes
+        os.utime(str(filePath), ns=(0, 0))
+        self.assertNotEqual(key, UtilsCache.getCacheKey(task, inData))
+
+    def test_getCacheKey_templateImages(self):
+        # Images given by a template are declared by the task, the key
+        # changes when they appear and when they are rewritten
+        task = ExecDozor(inData={})
+        inData = {
+            'nameTemplateImage': str(self.tmpDir / 'mesh_1_????.cbf'),
+            'firstImageNumber': 1,
+            'numberImages': 2
+        }
+        self.assertEqual(task.getCacheInputFiles(inData), [
+            str(self.tmpDir / 'mesh_1_0001.cbf'),
+            str(self.tmpDir / 'mesh_1_0002.cbf')
+        ])
+        keyBefore = UtilsCache.getCacheKey(task, inData)
+        imagePath = self.tmpDir / 'mesh_1_0002.cbf'
+        imagePath.write_text('data')
+        keyAfter = UtilsCache.getCacheKey(task, inData)
+        self.assertNotEqual(keyBefore, keyAfter)
+        self.assertEqual(keyAfter, UtilsCache.getCacheKey(task, inData))
+        imagePath.write_text('reprocessed data')
+        self.assertNotEqual(keyAfter, UtilsCache.getCacheKey(task, inData))
+
+    def test_memoryLRU(self):
+        cache = UtilsCache.ResultCache(maxEntries=2)
+        cache.put('a', '1')
+        cache.put('b', '2')
+        self.assertEqual(cache.get('a'), '1')
+        cache.put('c', '3')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), '1')
+        self.assertEqual(cache.get('c'), '3')
+
+    def test_diskStore(self):
+        cacheDir = self.tmpDir / 'cache'
+        cache = UtilsCache.ResultCache(directory=cacheDir, maxSize=1)
+        cache.put('abcd', '{"results": 1}')
+        # A new cache instance finds the entry on disk
+        cache = UtilsCache.ResultCache(directory=cacheDir, maxSize=1)
+        self.assertEqual(cache.get('abcd'), '{"results": 1}')
+        # Size eviction
+        for index in range(20):
+            cache.put('key{0:02d}'.format(index), 'x' * 100000)
+        totalSize = sum(p.stat().st_size for p in cacheDir.glob('*/*.json'))
+        self.assertTrue(totalSize <= 1000000)
+
+    def test_acquireRelease(self):
+        cache = UtilsCache.ResultCache()
+        value, event = cache.acquire('key')
+        self.assertIsNone(value)
+        self.assertIsNone(event)
+        # Second identical request waits
+        value, event = cache.acquire('key')
+        self.assertIsNone(value)
+        self.assertFalse(event.is_set())
+        cache.release('key', 'result')
+        self.assertTrue(event.is_set())
+        self.assertEqual(cache.acquire('key'), ('result', None))
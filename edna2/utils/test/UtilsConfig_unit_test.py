@@ -25,6 +25,10 @@ __date__ = "21/04/2019"
 
 
 import os
+import time
+import shutil
+import pathlib
+import tempfile
 import unittest
 
 from edna2.utils import UtilsConfig
@@ -67,3 +71,38 @@ class UtilsConfigUnitTest(unittest.TestCase):
 
 
 
+
+    def test_configCache(self):
+        configDir = pathlib.Path(tempfile.mkdtemp(prefix='UtilsConfig_'))
+        oldConfigDir = os.environ.get('EDNA2_CONFIG')
+        os.environ['EDNA2_CONFIG'] = str(configDir)
+        try:
+            configPath = configDir / 'test_site.ini'
+            includedPath = configDir / 'test_include.ini'
+            includedPath.write_text('[Test]\nvalue = included\nuser = ${ISPyB_user}\n')
+            configPath.write_text('[Include]\ntest_include =\n\n[Test]\ncores = 4\n')
+            dictConfig = UtilsConfig.getTaskConfig('Test', site='test_site')
+            self.assertEqual(dictConfig, {'value': 'included',
+                                          'user': 'ispybuser',
+                                          'cores': '4'})
+            # Parsed once
+            self.assertTrue(UtilsConfig._getRawTaskConfig('Test', 'test_site') is
+                            UtilsConfig._getRawTaskConfig('Test', 'test_site'))
+            # Environment variables are substituted at each lookup
+            os.environ['ISPyB_user'] = 'otheruser'
+            dictConfig = UtilsConfig.getTaskConfig('Test', site='test_site')
+            self.assertEqual(dictConfig['user'], 'otheruser')
+            # Modified included file
+            time.sleep(0.01)
+            includedPath.write_text('[Test]\nvalue = modified\n')
+            dictConfig = UtilsConfig.getTaskConfig('Test', site='test_site')
+            self.assertEqual(dictConfig['value'], 'modified')
+            raw = UtilsConfig._getRawTaskConfig('Test', 'test_site')
+            UtilsConfig.reload()
+            self.assertFalse(raw is UtilsConfig._getRawTaskConfig('Test', 'test_site'))
+        finally:
+            if oldConfigDir is None:
+                del os.environ['EDNA2_CONFIG']
+            else:
+                os.environ['EDNA2_CONFIG'] = oldConfigDir
+            shutil.rmtree(str(configDir), ignore_errors=True)
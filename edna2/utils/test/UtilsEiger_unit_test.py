@@ -0,0 +1,136 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import shutil
+import pathlib
+import tempfile
+import unittest
+
+from edna2.utils import UtilsTest
+from edna2.utils import UtilsCBF
+from edna2.utils import UtilsEiger
+
+from edna2.tasks.ReadImageHeader import ReadImageHeader
+
+
+class UtilsEigerUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='UtilsEiger_'))
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmpDir), ignore_errors=True)
+
+    def removeDataFiles(self, listDataFile):
+        for dataFile in listDataFile:
+            pathlib.Path(dataFile).unlink()
+
+    def test_readMasterHeader_nimages(self):
+        masterPath = UtilsTest.createSyntheticEigerMaster(
+            self.tmpDir, listNumberOfImages=(3, 3, 2))
+        listDataFile = [str(self.tmpDir / 'mesh_1_data_{0:06d}.h5'.format(index))
+                        for index in range(1, 4)]
+        # The data files are not needed
+        self.removeDataFiles(listDataFile)
+        dictHeader = UtilsEiger.readMasterHeader(masterPath)
+        self.assertEqual(dictHeader['numberOfImages'], 8)
+        self.assertEqual(dictHeader['dataFiles'], listDataFile)
+        self.assertEqual(dictHeader['data'],
+                         ['data_000001', 'data_000002', 'data_000003'])
+        self.assertEqual(dictHeader['description'], 'Dectris Eiger 4M')
+        self.assertEqual(dictHeader['x_pixel_size'], 75e-6)
+        self.assertEqual(len(dictHeader['orientation']), 6)
+
+    def test_readMasterHeader_virtual(self):
+        masterPath = UtilsTest.createSyntheticEigerMaster(
+            self.tmpDir, listNumberOfImages=(3, 2), nimages=False, virtual=True)
+        self.removeDataFiles(list(self.tmpDir.glob('*_data_*.h5')))
+        dictHeader = UtilsEiger.readMasterHeader(masterPath)
+        self.assertEqual(dictHeader['numberOfImages'], 5)
+        self.assertEqual(dictHeader['dataFiles'], [])
+
+    def test_readMasterHeader_imageNumberHigh(self):
+        masterPath = UtilsTest.createSyntheticEigerMaster(
+            self.tmpDir, listNumberOfImages=(3, 3, 2), nimages=False)
+        # Only the last data file is opened
+        self.removeDataFiles([self.tmpDir / 'mesh_1_data_000001.h5',
+                              self.tmpDir / 'mesh_1_data_000002.h5'])
+        dictHeader = UtilsEiger.readMasterHeader(masterPath)
+        self.assertEqual(dictHeader['numberOfImages'], 8)
+
+    def test_readMasterHeader_probeDataFiles(self):
+        masterPath = UtilsTest.createSyntheticEigerMaster(
+            self.tmpDir, listNumberOfImages=(3, 3, 2), nimages=False,
+            imageNumberHigh=False)
+        dictHeader = UtilsEiger.readMasterHeader(masterPath)
+        self.assertEqual(dictHeader['numberOfImages'], 8)
+        # The cached number of images is discarded when a data file changes
+        UtilsTest.createSyntheticEigerMaster(
+            self.tmpDir, prefix='other', listNumberOfImages=(5,),
+            imageNumberHigh=False)
+        shutil.copy(str(self.tmpDir / 'other_data_000001.h5'),
+                    str(self.tmpDir / 'mesh_1_data_000003.h5'))
+        dictHeader = UtilsEiger.readMasterHeader(masterPath)
+        self.assertEqual(dictHeader['numberOfImages'], 11)
+
+    def test_createHdf5HeaderData(self):
+        masterPath = UtilsTest.createSyntheticEigerMaster(
+            self.tmpDir, listNumberOfImages=(100, 100, 50))
+        subWedge = ReadImageHeader.createHdf5HeaderData(str(masterPath))
+        goniostat = subWedge['experimentalCondition']['goniostat']
+        self.assertEqual(goniostat['rotationAxisStart'], 10.0)
+        self.assertAlmostEqual(goniostat['rotationAxisEnd'], 35.0)
+        detector = subWedge['experimentalCondition']['detector']
+        self.assertEqual(detector['type'], 'eiger4m')
+        self.assertEqual(detector['pixelSizeX'], 0.075)
+        self.assertEqual(len(subWedge['image']), 4)
+        self.assertEqual(subWedge['image'][0]['path'], str(masterPath))
+
+    def test_convertToCBF(self):
+        import h5py
+        import fabio
+        masterPath = UtilsTest.createSyntheticEigerMaster(
+            self.tmpDir, listNumberOfImages=(2, 2), shape=(20, 30))
+        listFrame = [(imageNumber, self.tmpDir / 'mesh_1_{0:04d}.cbf'.format(
+            imageNumber)) for imageNumber in range(1, 5)]
+        listPath = UtilsEiger.convertToCBF(masterPath, listFrame, maxWorkers=2)
+        self.assertEqual(listPath, [str(cbfPath) for _, cbfPath in listFrame])
+        with h5py.File(str(self.tmpDir / 'mesh_1_data_000002.h5'), 'r') as f:
+            frame = f['entry/data/data'][1].astype('int64')
+        image = fabio.open(listPath[3])
+        self.assertEqual(image.data.shape, (20, 30))
+        # Saturated, dead and gap pixels
+        self.assertEqual(image.data[0, 0], -1)
+        self.assertEqual(image.data[0, 1], -2)
+        self.assertTrue((image.data[-1] == -1).all())
+        self.assertTrue((image.data[1:-1] == frame[1:-1]).all())
+        cbfHeader = UtilsCBF.readHeader(listPath[3])
+        self.assertAlmostEqual(cbfHeader.startAngle, 10.3)
+        self.assertEqual(cbfHeader.angleIncrement, 0.1)
+        self.assertEqual(cbfHeader.wavelength, 0.9763)
+        self.assertEqual((cbfHeader.beamX, cbfHeader.beamY), (1035.0, 1083.5))
+        self.assertAlmostEqual(cbfHeader.pixelSizeX, 75e-6)
+        self.assertEqual(cbfHeader.exposurePeriod, 0.0101)
+        self.assertEqual(cbfHeader.detector, 'Dectris Eiger 4M, S/N E-08-0106')
@@ -0,0 +1,129 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import time
+import shutil
+import asyncio
+import pathlib
+import tempfile
+import unittest
+import threading
+
+from edna2.utils import UtilsPath
+from edna2.utils import UtilsFileWatcher
+
+
+def writeLater(path, delay, data=b'x'):
+    def write():
+        time.sleep(delay)
+        with open(str(path), 'wb') as f:
+            f.write(data)
+    thread = threading.Thread(target=write)
+    thread.start()
+    return thread
+
+
+class UtilsFileWatcherUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='UtilsFileWatcher_'))
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmpDir), ignore_errors=True)
+
+    def runWatcherTest(self, watcher):
+        listPath = [self.tmpDir / 'image_{0:04d}.cbf'.format(index)
+                    for index in range(1, 7)]
+        listPath[0].write_bytes(b'x')
+        fileSet = watcher.watch(listPath)
+        # Already existing files are seen without any write event
+        self.assertEqual(fileSet.waitAny(timeout=10), [str(listPath[0])])
+        self.assertFalse(fileSet.waitAll(timeout=0.1))
+        listThread = [writeLater(path, 0.1) for path in listPath[1:]]
+        self.assertTrue(fileSet.waitAll(timeout=10))
+        for thread in listThread:
+            thread.join()
+        dictArrived = fileSet.getArrived()
+        self.assertEqual(sorted(dictArrived), sorted(map(str, listPath)))
+        self.assertEqual(dictArrived[str(listPath[1])]['size'], 1)
+        self.assertEqual(fileSet.getMissing(), [])
+        self.assertEqual(watcher.getNumberOfWatchedFiles(), 0)
+
+    def test_watchInotify(self):
+        watcher = UtilsFileWatcher.FileWatcher(useInotify=True)
+        self.runWatcherTest(watcher)
+
+    def test_watchScan(self):
+        watcher = UtilsFileWatcher.FileWatcher(useInotify=False)
+        watcher.minInterval = 0.05
+        watcher.maxInterval = 0.2
+        self.assertFalse(watcher.isUsingInotify())
+        self.runWatcherTest(watcher)
+
+    def test_minSizeAndMissingDirectory(self):
+        # The directory is created after the watch has started
+        watcher = UtilsFileWatcher.FileWatcher()
+        watcher.minInterval = 0.05
+        path = self.tmpDir / 'later' / 'data_000001.h5'
+        fileSet = watcher.watch([path], minSize=10)
+        (self.tmpDir / 'later').mkdir()
+        path.write_bytes(b'small')
+        self.assertFalse(fileSet.wait(path, timeout=0.5))
+        path.write_bytes(b'large enough data')
+        self.assertTrue(fileSet.wait(path, timeout=10))
+        self.assertEqual(fileSet.getArrived()[str(path)]['size'], 17)
+
+    def test_watchBatches(self):
+        watcher = UtilsFileWatcher.FileWatcher()
+        listBatch = [[self.tmpDir / 'batch{0}_{1}.cbf'.format(batch, index)
+                      for index in range(3)] for batch in range(2)]
+        listComplete = []
+        event = threading.Event()
+
+        def onComplete(index, fileSet):
+            listComplete.append(index)
+            event.set()
+
+        watcher.watchBatches(listBatch, callback=onComplete)
+        for path in listBatch[1]:
+            path.write_bytes(b'x')
+        self.assertTrue(event.wait(10))
+        self.assertEqual(listComplete, [1])
+
+    def test_waitForFile(self):
+        path = self.tmpDir / 'image.cbf'
+        hasTimedOut, finalSize = UtilsPath.waitForFile(path, timeOut=0.2)
+        self.assertTrue(hasTimedOut)
+        self.assertIsNone(finalSize)
+        thread = writeLater(path, 0.2, data=b'12345')
+        hasTimedOut, finalSize = asyncio.run(
+            UtilsPath.waitForFileAsync(path, expectedSize=2, timeOut=10))
+        thread.join()
+        self.assertFalse(hasTimedOut)
+        self.assertEqual(finalSize, 5)
+        hasTimedOut, finalSize = UtilsPath.waitForFile(
+            path, expectedSize=100, timeOut=0.2)
+        self.assertTrue(hasTimedOut)
+        self.assertEqual(finalSize, 5)
@@ -49,3 +49,11 @@ class UtilsImageUnitTest(unittest.TestCase):
         templateReference = "ref-testscale_1_????.img"
         self.assertEqual(templateReference, template)
 
+    def test_getImagePaths(self):
+        listPath = UtilsImage.getImagePaths(
+            "/data", "ref-testscale_1_####.img", 9, 10)
+        self.assertEqual(listPath, ["/data/ref-testscale_1_0009.img",
+                                    "/data/ref-testscale_1_0010.img"])
+        listPath = UtilsImage.getImagePaths(
+            "/data", "ref-testscale_1_????.img", 1, 1, symbol="?")
+        self.assertEqual(listPath, ["/data/ref-testscale_1_0001.img"])
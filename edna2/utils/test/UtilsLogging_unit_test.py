@@ -0,0 +1,121 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import queue
+import shutil
+import logging
+import tempfile
+import unittest
+
+from edna2.utils import UtilsLogging
+
+from edna2.tasks.AbstractTask import AbstractTask
+from edna2.tasks.AbstractTask import EXECUTOR_PROCESS
+
+
+class ListHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.listMessage = []
+
+    def emit(self, record):
+        self.listMessage.append(record.getMessage())
+
+
+class LoggingTask(AbstractTask):
+
+    def run(self, inData):
+        logger = UtilsLogging.getLogger()
+        logger.info(inData['message'])
+        return {}
+
+
+class UtilsLoggingUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workingDirectory = tempfile.mkdtemp(prefix='UtilsLogging_')
+
+    def tearDown(self):
+        UtilsLogging.getLogger()
+        shutil.rmtree(self.workingDirectory, ignore_errors=True)
+
+    def test_singleQueueHandler(self):
+        UtilsLogging.getLogger()
+        logger = UtilsLogging.getLogger('DEBUG')
+        listQueueHandler = [
+            handler for handler in logger.handlers
+            if isinstance(handler, UtilsLogging.EDNA2QueueHandler)
+        ]
+        self.assertEqual(len(listQueueHandler), 1)
+
+    def test_recordFromProcess(self):
+        UtilsLogging.getLogger('INFO')
+        listHandler = ListHandler()
+        UtilsLogging.addHandler(listHandler)
+        message = 'Message from a task process'
+        task = LoggingTask(inData={
+            'message': message,
+            'workingDirectory': self.workingDirectory
+        })
+        task.setExecutor(EXECUTOR_PROCESS)
+        task.execute()
+        self.assertTrue(task.isSuccess())
+        # Stopping the listener handles all queued records
+        UtilsLogging.shutdown()
+        UtilsLogging.removeHandler(listHandler)
+        self.assertIn(message, listHandler.listMessage)
+
+    def test_addHandlerWithoutListener(self):
+        UtilsLogging.shutdown()
+        listHandler = ListHandler()
+        UtilsLogging.addHandler(listHandler)
+        try:
+            logger = UtilsLogging.getLogger('INFO')
+            logger.info('Message after the listener started')
+            UtilsLogging.shutdown()
+        finally:
+            UtilsLogging.removeHandler(listHandler)
+        self.assertIn('Message after the listener started',
+                      listHandler.listMessage)
+
+    def test_dropDebugRecords(self):
+        logQueue = queue.Queue(maxsize=2)
+        queueHandler = UtilsLogging.EDNA2QueueHandler(logQueue)
+        logger = logging.getLogger('edna2.test.dropDebugRecords')
+        logger.propagate = False
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(queueHandler)
+        for index in range(5):
+            logger.debug('Debug message {0}'.format(index))
+        self.assertEqual(logQueue.qsize(), 2)
+        self.assertEqual(queueHandler.numberOfDropped, 3)
+        logQueue.get()
+        logQueue.get()
+        logger.info('Info message')
+        self.assertEqual(queueHandler.numberOfDropped, 0)
+        self.assertEqual(logQueue.get().getMessage(), 'Info message')
+        self.assertIn('3 log record(s) dropped', logQueue.get().getMessage())
+        logger.removeHandler(queueHandler)
@@ -0,0 +1,119 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from edna2.tasks.AbstractTask import AbstractTask
+from edna2.tasks.AbstractTask import EXECUTOR_THREAD
+from edna2.tasks.AbstractTask import EXECUTOR_PROCESS
+
+from edna2.utils import UtilsConfig
+from edna2.utils import UtilsMetrics
+
+
+class CommandTask(AbstractTask):
+
+    def run(self, inData):
+        self.runCommandLine('dd if=/dev/zero of=data.bin bs=1M count=1')
+        return {}
+
+
+class ParentTask(AbstractTask):
+
+    def run(self, inData):
+        commandTask = CommandTask(inData={
+            'workingDirectory': inData['workingDirectory']})
+        commandTask.execute(executor=EXECUTOR_THREAD)
+        return {}
+
+
+class UtilsMetricsUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp(prefix='UtilsMetrics_')
+        UtilsMetrics.reset()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+        UtilsMetrics.reset()
+
+    def test_histogram(self):
+        for value in [0.5, 1.5, 100]:
+            UtilsMetrics.observe('test_seconds', value, buckets=(1, 10),
+                                 site='id30a2')
+        histogram = UtilsMetrics.getHistogram('test_seconds', site='id30a2')
+        self.assertEqual(histogram.counts, [1, 2])
+        self.assertEqual(histogram.count, 3)
+        self.assertEqual(histogram.sum, 102)
+        text = UtilsMetrics.getPrometheusText()
+        self.assertIn('# TYPE test_seconds histogram', text)
+        self.assertIn('test_seconds_bucket{site="id30a2",le="10"} 2', text)
+        self.assertIn('test_seconds_bucket{site="id30a2",le="+Inf"} 3', text)
+        self.assertIn('test_seconds_count{site="id30a2"} 3', text)
+
+    def test_writePrometheus(self):
+        UtilsMetrics.inc('test_total', 2)
+        UtilsMetrics.setMaximum('test_bytes', 10)
+        UtilsMetrics.setMaximum('test_bytes', 5)
+        path = os.path.join(self.tmpDir, 'edna2.prom')
+        UtilsMetrics.writePrometheus(path)
+        with open(path) as f:
+            text = f.read()
+        self.assertIn('# TYPE test_total counter\ntest_total 2\n', text)
+        self.assertIn('# TYPE test_bytes gauge\ntest_bytes 10\n', text)
+
+    def test_forwarding(self):
+        UtilsMetrics.startForwarding()
+        UtilsMetrics.inc('test_total')
+        listRecord = UtilsMetrics.stopForwarding()
+        self.assertEqual(UtilsMetrics.getCounter('test_total'), 0)
+        UtilsMetrics.addRecords(listRecord)
+        self.assertEqual(UtilsMetrics.getCounter('test_total'), 1)
+
+    def test_taskMetrics(self):
+        task = ParentTask(inData={'workingDirectory': self.tmpDir})
+        task.execute(executor=EXECUTOR_PROCESS)
+        self.assertTrue(task.isSuccess())
+        metrics = task.getMetrics()
+        for name in ['wallTime', 'cpuTime', 'maxRss', 'commandCpuTime']:
+            self.assertIn(name, metrics)
+        self.assertGreater(metrics['commandMaxRss'], 0)
+        # The metrics of the sub-task are sent back by the task process
+        site = UtilsConfig.getSite()
+        for taskName in ['ParentTask', 'CommandTask']:
+            self.assertEqual(UtilsMetrics.getCounter(
+                'edna2_task_runs_total', task=taskName, site=site,
+                status='success'), 1)
+        histogram = UtilsMetrics.getHistogram(
+            'edna2_task_wall_seconds', task='CommandTask', site=site)
+        self.assertEqual(histogram.count, 1)
+        if 'writtenBytes' in metrics:
+            writtenBytes = UtilsMetrics.getCounter(
+                'edna2_task_written_bytes_total', task='ParentTask',
+                site=site)
+            self.assertGreater(writtenBytes, 0)
@@ -0,0 +1,95 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import os
+import glob
+import shutil
+import pstats
+import tempfile
+import unittest
+import tracemalloc
+
+from edna2.tasks.AbstractTask import AbstractTask
+from edna2.tasks.AbstractTask import EXECUTOR_THREAD
+
+
+class ProfiledTask(AbstractTask):
+
+    def run(self, inData):
+        listValue = [str(index) for index in range(10000)]
+        return {'length': len(''.join(listValue))}
+
+
+class UtilsProfileUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp(prefix='UtilsProfile_')
+        self.dictOldEnv = {}
+        for name in ['EDNA2_PROFILE', 'EDNA2_PROFILE_RATE',
+                     'EDNA2_PROFILE_MEMORY']:
+            self.dictOldEnv[name] = os.environ.get(name)
+
+    def tearDown(self):
+        for name, value in self.dictOldEnv.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def runTask(self):
+        task = ProfiledTask(inData={'workingDirectory': self.tmpDir})
+        task.execute(executor=EXECUTOR_THREAD)
+        self.assertTrue(task.isSuccess())
+        return task.getWorkingDirectory()
+
+    def test_profile(self):
+        os.environ['EDNA2_PROFILE'] = 'OtherTask, ProfiledTask'
+        os.environ['EDNA2_PROFILE_MEMORY'] = 'true'
+        workingDirectory = self.runTask()
+        # Next to the inData / outData files
+        self.assertTrue((workingDirectory / 'outDataProfiledTask.json').exists())
+        stats = pstats.Stats(str(workingDirectory / 'profileProfiledTask.prof'))
+        listFunctionName = [key[2] for key in stats.stats]
+        self.assertIn('run', listFunctionName)
+        self.assertTrue((workingDirectory / 'profileProfiledTask.txt').exists())
+        snapshot = tracemalloc.Snapshot.load(
+            str(workingDirectory / 'allocationsProfiledTask.snapshot'))
+        self.assertGreater(len(snapshot.traces), 0)
+        with open(str(workingDirectory / 'allocationsProfiledTask.txt')) as f:
+            self.assertTrue(f.readline().startswith('Peak traced memory'))
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_notProfiled(self):
+        os.environ['EDNA2_PROFILE'] = 'ProfiledTask'
+        os.environ['EDNA2_PROFILE_RATE'] = '0'
+        workingDirectory = self.runTask()
+        self.assertEqual(
+            glob.glob(str(workingDirectory / 'profile*')), [])
+        os.environ['EDNA2_PROFILE'] = 'OtherTask'
+        os.environ['EDNA2_PROFILE_RATE'] = '1'
+        workingDirectory = self.runTask()
+        self.assertEqual(
+            glob.glob(str(workingDirectory / 'profile*')), [])
@@ -0,0 +1,143 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from edna2.tasks.AbstractTask import AbstractTask
+from edna2.tasks.AbstractTask import EXECUTOR_THREAD
+from edna2.tasks.AbstractTask import EXECUTOR_PROCESS
+
+from edna2.utils import UtilsScheduler
+
+
+class CountingTask(AbstractTask):
+    """
+    Keeps track of how many instances run at the same time
+    """
+    lock = threading.Lock()
+    running = 0
+    maxRunning = 0
+    listFinished = []
+
+    def run(self, inData):
+        with CountingTask.lock:
+            CountingTask.running += 1
+            CountingTask.maxRunning = max(CountingTask.maxRunning,
+                                          CountingTask.running)
+        time.sleep(0.1)
+        with CountingTask.lock:
+            CountingTask.running -= 1
+            CountingTask.listFinished.append(inData['name'])
+        if inData.get('fail', False):
+            raise RuntimeError('Failure requested by test')
+        return {'name': inData['name']}
+
+
+class BudgetTask(AbstractTask):
+
+    def run(self, inData):
+        scheduler = UtilsScheduler.getScheduler()
+        return {'maxCores': scheduler.maxCores,
+                'maxMemory': scheduler.maxMemory}
+
+
+class UtilsSchedulerUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp(prefix='UtilsScheduler_')
+        CountingTask.running = 0
+        CountingTask.maxRunning = 0
+        CountingTask.listFinished = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def createTask(self, name, fail=False):
+        inData = {'name': name, 'fail': fail,
+                  'workingDirectory': self.tmpDir}
+        return CountingTask(inData=inData)
+
+    def test_maxCores(self):
+        scheduler = UtilsScheduler.TaskScheduler(maxCores=2)
+        listTask = [self.createTask(str(index)) for index in range(6)]
+        listFuture = scheduler.map(listTask, executor=EXECUTOR_THREAD)
+        for future in listFuture:
+            self.assertTrue(future.result().isSuccess())
+        self.assertEqual(CountingTask.maxRunning, 2)
+
+    def test_maxMemory(self):
+        scheduler = UtilsScheduler.TaskScheduler(maxCores=4, maxMemory=1000)
+        listTask = [self.createTask(str(index)) for index in range(4)]
+        listFuture = scheduler.map(listTask, memory=600,
+                                   executor=EXECUTOR_THREAD)
+        for future in listFuture:
+            future.result()
+        self.assertEqual(CountingTask.maxRunning, 1)
+
+    def test_dependencies(self):
+        scheduler = UtilsScheduler.TaskScheduler(maxCores=4)
+        futureFirst = scheduler.submit(self.createTask('first'),
+                                       executor=EXECUTOR_THREAD)
+        futureSecond = scheduler.submit(self.createTask('second'),
+                                        dependencies=[futureFirst],
+                                        executor=EXECUTOR_THREAD)
+        futureThird = scheduler.submit(self.createTask('third'),
+                                       dependencies=[futureSecond],
+                                       executor=EXECUTOR_THREAD)
+        self.assertEqual(futureThird.result().outData['name'], 'third')
+        self.assertEqual(CountingTask.listFinished,
+                         ['first', 'second', 'third'])
+
+    def test_failedDependency(self):
+        scheduler = UtilsScheduler.TaskScheduler(maxCores=4)
+        futureFirst = scheduler.submit(self.createTask('first', fail=True),
+                                       executor=EXECUTOR_THREAD)
+        futureSecond = scheduler.submit(self.createTask('second'),
+                                        dependencies=[futureFirst],
+                                        executor=EXECUTOR_THREAD)
+        futureThird = scheduler.submit(self.createTask('third'),
+                                       dependencies=[futureSecond],
+                                       executor=EXECUTOR_THREAD)
+        self.assertTrue(futureSecond.result().isFailure())
+        self.assertTrue(futureThird.result().isFailure())
+        self.assertEqual(CountingTask.listFinished, ['first'])
+
+    def test_getScheduler(self):
+        scheduler = UtilsScheduler.getScheduler()
+        self.assertIs(scheduler, UtilsScheduler.getScheduler())
+        self.assertTrue(scheduler.maxCores >= 1)
+
+    def test_getSchedulerInTaskProcess(self):
+        # A task process gets the resources of the task as budget
+        scheduler = UtilsScheduler.TaskScheduler(maxCores=4, maxMemory=1000)
+        task = BudgetTask(inData={'workingDirectory': self.tmpDir})
+        future = scheduler.submit(task, cores=2, memory=600,
+                                  executor=EXECUTOR_PROCESS)
+        self.assertEqual(future.result().outData,
+                         {'maxCores': 2, 'maxMemory': 600})
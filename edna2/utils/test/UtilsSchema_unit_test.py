@@ -0,0 +1,106 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import unittest
+
+import jsonschema
+
+from edna2.utils import UtilsSchema
+
+from edna2.tasks.AbstractTask import AbstractTask
+
+
+class DozorResultTask(AbstractTask):
+
+    def run(self, inData):
+        return inData
+
+    def getInDataSchema(self):
+        return {
+            "type": "object",
+            "properties": {
+                "imageDozor": {
+                    "type": "array",
+                    "items": {
+                        "$ref": self.getSchemaUrl("imageDozor.json")
+                    }
+                }
+            }
+        }
+
+
+def getImageDozor(number):
+    return {
+        'number': number,
+        'image': 'image_{0:04d}.cbf'.format(number),
+        'angle': 0.1 * number,
+        'spotsNumOf': 10,
+        'spotsIntAver': 1.0,
+        'spotsResolution': 2.0,
+        'mainScore': 3.0,
+        'spotScore': 4.0,
+        'visibleResolution': 5.0
+    }
+
+
+class UtilsSchemaUnitTest(unittest.TestCase):
+
+    def test_getSchemaStore(self):
+        dictSchema = UtilsSchema.getSchemaStore()
+        url = UtilsSchema.getSchemaUrl('imageDozor.json')
+        self.assertTrue(url in dictSchema)
+        self.assertEqual(dictSchema[url]['type'], 'object')
+
+    def test_getValidator(self):
+        task = DozorResultTask(inData={})
+        validator = UtilsSchema.getValidator(task, 'inData')
+        self.assertIsNotNone(validator)
+        # Compiled once per task class
+        task2 = DozorResultTask(inData={})
+        self.assertTrue(validator is UtilsSchema.getValidator(task2, 'inData'))
+        self.assertIsNone(UtilsSchema.getValidator(task, 'outData'))
+
+    def test_validate(self):
+        task = DozorResultTask(inData={})
+        inData = {'imageDozor': [getImageDozor(i) for i in range(1, 11)]}
+        self.assertTrue(UtilsSchema.validate(task, 'inData', inData))
+        self.assertFalse(UtilsSchema.validate(task, 'outData', inData))
+        inData['imageDozor'][5]['number'] = 'six'
+        self.assertRaises(jsonschema.ValidationError, UtilsSchema.validate,
+                          task, 'inData', inData)
+
+    def test_reduceInstance(self):
+        instance = {'a': list(range(10)), 'b': {'c': list(range(1000))}}
+        self.assertTrue(UtilsSchema.reduceInstance(
+            instance, UtilsSchema.VALIDATION_FULL) is instance)
+        reduced = UtilsSchema.reduceInstance(
+            instance, UtilsSchema.VALIDATION_BOUNDARY)
+        self.assertEqual(reduced, {'a': [0, 9], 'b': {'c': [0, 999]}})
+        reduced = UtilsSchema.reduceInstance(
+            instance, UtilsSchema.VALIDATION_SAMPLED, sampleSize=100)
+        self.assertEqual(reduced['a'], list(range(10)))
+        self.assertEqual(len(reduced['b']['c']), 100)
+        self.assertEqual(reduced['b']['c'][0], 0)
+        self.assertEqual(reduced['b']['c'][-1], 999)
@@ -0,0 +1,129 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import os
+import shutil
+import pathlib
+import tempfile
+import unittest
+
+from edna2.tasks.AbstractTask import AbstractTask
+from edna2.tasks.AbstractTask import EXECUTOR_THREAD
+from edna2.tasks.AbstractTask import EXECUTOR_PROCESS
+
+from edna2.utils import UtilsScratch
+
+
+class ScratchTask(AbstractTask):
+
+    def run(self, inData):
+        workingDirectory = self.getWorkingDirectory()
+        with open(str(workingDirectory / 'intermediate.dat'), 'w') as f:
+            f.write('intermediate')
+        resultPath = workingDirectory / 'result.txt'
+        with open(str(resultPath), 'w') as f:
+            f.write('result')
+        scratchRoot = UtilsScratch.getScratchRoot()
+        return {'resultPath': str(resultPath),
+                'isScratch': str(workingDirectory).startswith(scratchRoot)}
+
+    def getResultFilePatterns(self):
+        return AbstractTask.getResultFilePatterns(self) + ['result.txt']
+
+
+class UtilsScratchUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='UtilsScratch_'))
+        self.scratchDir = self.tmpDir / 'scratch'
+        self.sharedDir = self.tmpDir / 'shared'
+        self.sharedDir.mkdir()
+        self.oldEdna2Config = os.environ.get('EDNA2_CONFIG', None)
+        self.oldEdna2Site = os.environ.get('EDNA2_SITE', None)
+        configPath = self.tmpDir / 'scratch_testconfig.ini'
+        configPath.write_text(
+            '[Scratch]\ndirectory = {0}\n\n'.format(self.scratchDir) +
+            '[ScratchTask]\nscratch = true\n')
+        os.environ['EDNA2_CONFIG'] = str(self.tmpDir)
+        os.environ['EDNA2_SITE'] = 'scratch_testconfig'
+
+    def tearDown(self):
+        if self.oldEdna2Config is not None:
+            os.environ['EDNA2_CONFIG'] = self.oldEdna2Config
+        else:
+            del os.environ['EDNA2_CONFIG']
+        if self.oldEdna2Site is not None:
+            os.environ['EDNA2_SITE'] = self.oldEdna2Site
+        else:
+            del os.environ['EDNA2_SITE']
+        shutil.rmtree(str(self.tmpDir), ignore_errors=True)
+
+    def test_scratchExecution(self):
+        for executor in [EXECUTOR_THREAD, EXECUTOR_PROCESS]:
+            task = ScratchTask(inData={'workingDirectory': str(self.sharedDir)})
+            task.execute(executor=executor)
+            task.waitForWriteBack()
+            self.assertTrue(task.isSuccess(), executor)
+            outData = task.outData
+            # Run in scratch, paths in outData refer to the shared directory
+            self.assertTrue(outData['isScratch'])
+            resultPath = pathlib.Path(outData['resultPath'])
+            self.assertEqual(resultPath.parent.parent, self.sharedDir)
+            self.assertEqual(resultPath.read_text(), 'result')
+            # Only the declared results are moved
+            self.assertFalse(
+                (resultPath.parent / 'intermediate.dat').exists())
+            self.assertTrue(
+                (resultPath.parent / 'outDataScratchTask.json').exists())
+            self.assertEqual(os.listdir(str(self.scratchDir)), [])
+            shutil.rmtree(str(resultPath.parent))
+
+    def test_doSubmit(self):
+        task = ScratchTask(inData={'workingDirectory': str(self.sharedDir),
+                                   'doSubmit': True})
+        task.execute(executor=EXECUTOR_THREAD)
+        self.assertTrue(task.isSuccess())
+        self.assertFalse(task.outData['isScratch'])
+
+    def test_copier(self):
+        copier = UtilsScratch.ScratchCopier(maxWorkers=1, maxPending=1)
+        listSharedDir = []
+        for index in range(3):
+            scratchDir = self.scratchDir / str(index)
+            (scratchDir / 'sub').mkdir(parents=True)
+            (scratchDir / 'sub' / 'result.txt').write_text(str(index))
+            (scratchDir / 'other.txt').write_text(str(index))
+            sharedDir = self.sharedDir / str(index)
+            sharedDir.mkdir()
+            listSharedDir.append(sharedDir)
+            copier.submit(scratchDir, sharedDir, ['**/result.txt'])
+        # Completion barrier
+        copier.wait()
+        self.assertEqual(copier.getNumberOfPending(), 0)
+        for index, sharedDir in enumerate(listSharedDir):
+            self.assertEqual(os.listdir(str(sharedDir)), ['sub'])
+            self.assertEqual((sharedDir / 'sub' / 'result.txt').read_text(),
+                             str(index))
+        self.assertEqual(os.listdir(str(self.scratchDir)), [])
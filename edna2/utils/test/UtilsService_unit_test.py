@@ -0,0 +1,97 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import os
+import sys
+import shutil
+import pathlib
+import tempfile
+import threading
+import unittest
+import subprocess
+
+from edna2.utils import UtilsService
+
+
+class UtilsServiceUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='UtilsService_'))
+        self.socketPath = self.tmpDir / 'edna2.sock'
+        self.server = UtilsService.TaskServer(socketPath=self.socketPath,
+                                              maxWorkers=2)
+        self.server.start()
+        self.thread = threading.Thread(target=self.server.serveForever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.stop()
+        self.thread.join(5)
+        shutil.rmtree(str(self.tmpDir), ignore_errors=True)
+
+    def test_executeTask(self):
+        self.assertTrue(UtilsService.isServerRunning(self.socketPath))
+        inData = {'name': 'service', 'workingDirectory': str(self.tmpDir)}
+        response = UtilsService.executeTask('HelloWorldTask', inData,
+                                            socketPath=self.socketPath,
+                                            timeout=30)
+        self.assertFalse(response['isFailure'])
+        self.assertEqual(response['outData'],
+                         {'results': 'Hello world service!'})
+
+    def test_unknownTask(self):
+        response = UtilsService.executeTask('NoSuchTask', {},
+                                            socketPath=self.socketPath,
+                                            timeout=30)
+        self.assertTrue(response['isFailure'])
+        self.assertTrue('error' in response)
+
+    def test_alreadyRunning(self):
+        server = UtilsService.TaskServer(socketPath=self.socketPath)
+        self.assertRaises(RuntimeError, server.start)
+
+    def test_stop(self):
+        self.server.stop()
+        self.thread.join(5)
+        self.assertFalse(self.socketPath.exists())
+        self.assertFalse(UtilsService.isServerRunning(self.socketPath))
+
+    def test_clientImports(self):
+        # A client only sending requests does not set up the logging
+        code = ('import sys\n'
+                'from edna2.utils import UtilsService\n'
+                'print(sorted(name for name in sys.modules\n'
+                '             if name.startswith("edna2.")))\n')
+        projectPath = pathlib.Path(__file__).parents[3]
+        env = dict(os.environ)
+        env['PYTHONPATH'] = str(projectPath)
+        pipes = subprocess.run([sys.executable, '-c', code],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               cwd=str(self.tmpDir), env=env)
+        self.assertEqual(pipes.returncode, 0, pipes.stderr.decode())
+        self.assertEqual(pipes.stdout.decode().strip(),
+                         "['edna2.utils', 'edna2.utils.UtilsConfig', "
+                         "'edna2.utils.UtilsService']")
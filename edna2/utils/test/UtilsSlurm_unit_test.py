@@ -0,0 +1,167 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import os
+import shutil
+import pathlib
+import tempfile
+import unittest
+
+from edna2.utils import UtilsSlurm
+
+from edna2.tasks.AbstractTask import AbstractTask
+from edna2.tasks.AbstractTask import EXECUTOR_THREAD
+
+# Runs the tasks of a job array locally and in the background
+FAKE_SBATCH = """#!/bin/bash
+for arg in "$@"; do
+    case $arg in
+        --array=*) range=${arg#--array=} ;;
+        --*) ;;
+        *) script=$arg ;;
+    esac
+done
+echo "$script" >> "$(dirname "$0")/sbatch_calls.txt"
+for index in $(seq 0 ${range#*-}); do
+    SLURM_ARRAY_TASK_ID=$index bash "$script" > /dev/null 2>&1 &
+done
+echo 4242
+"""
+
+
+class EchoTask(AbstractTask):
+
+    def run(self, inData):
+        listLine = []
+        self.runCommandLine('echo {0}'.format(inData['message']),
+                            doSubmit=True, lineCallback=listLine.append)
+        return {'log': self.getLog().strip(), 'lines': listLine}
+
+
+class UtilsSlurmUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = pathlib.Path(tempfile.mkdtemp(prefix='UtilsSlurm_'))
+        self.fakeSbatch = self.tmpDir / 'sbatch'
+        self.fakeSbatch.write_text(FAKE_SBATCH)
+        self.fakeSbatch.chmod(0o755)
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmpDir), ignore_errors=True)
+
+    def getSubmitter(self, submitter=None):
+        if submitter is None:
+            submitter = UtilsSlurm.SlurmSubmitter()
+        submitter.sbatch = str(self.fakeSbatch)
+        submitter.squeue = str(self.tmpDir / 'no_squeue')
+        submitter.scriptDirectory = str(self.tmpDir)
+        submitter.batchDelay = 0.2
+        submitter.pollInterval = 0.05
+        return submitter
+
+    def getNumberOfSbatchCalls(self):
+        with open(str(self.tmpDir / 'sbatch_calls.txt')) as f:
+            return len(f.readlines())
+
+    def test_getResources(self):
+        task = EchoTask(inData={})
+        resources = UtilsSlurm.getResources(task)
+        self.assertEqual(resources['cores'], 20)
+        resources = UtilsSlurm.getResources(
+            task, {'slurm': {'cores': '4', 'partition': 'test'}})
+        self.assertEqual(resources['cores'], 4)
+        self.assertEqual(resources['partition'], 'test')
+
+    def test_jobArray(self):
+        submitter = self.getSubmitter()
+        resources = UtilsSlurm.getResources(None)
+        listJob = []
+        for index in range(5):
+            workingDirectory = self.tmpDir / 'job{0}'.format(index)
+            workingDirectory.mkdir()
+            job = submitter.submit('Job', 'exit {0}'.format(index),
+                                   workingDirectory, resources)
+            listJob.append(job)
+        for index, job in enumerate(listJob):
+            self.assertEqual(job.wait(timeout=10), index)
+            self.assertEqual(job.jobId, '4242')
+        self.assertEqual(self.getNumberOfSbatchCalls(), 1)
+
+    def test_clusterDirectory(self):
+        # The compute nodes see the working directory under another path
+        submitter = self.getSubmitter()
+        submitter.scriptDirectory = None
+        workingDirectory = self.tmpDir / 'job'
+        workingDirectory.mkdir()
+        clusterDirectory = self.tmpDir / 'cluster_job'
+        clusterDirectory.symlink_to(workingDirectory)
+        job = submitter.submit('Job', 'exit 3', workingDirectory,
+                               UtilsSlurm.getResources(None),
+                               clusterDirectory=clusterDirectory)
+        self.assertEqual(job.exitCodePath,
+                         str(workingDirectory / 'Job_slurm.exitcode'))
+        self.assertEqual(job.clusterExitCodePath,
+                         str(clusterDirectory / 'Job_slurm.exitcode'))
+        self.assertEqual(job.wait(timeout=10), 3)
+        # The script is written on the submit host, run on the nodes
+        listScriptPath = list(workingDirectory.glob('*_slurm.sh'))
+        self.assertEqual(len(listScriptPath), 1)
+        script = listScriptPath[0].read_text()
+        self.assertIn('cd {0}\n'.format(clusterDirectory), script)
+        self.assertIn('mv {0}.tmp {0}\n'.format(job.clusterExitCodePath),
+                      script)
+        self.assertNotIn('cd {0}\n'.format(workingDirectory), script)
+
+    def test_maxArraySize(self):
+        submitter = self.getSubmitter()
+        submitter.maxArraySize = 2
+        resources = UtilsSlurm.getResources(None)
+        listJob = []
+        for index in range(3):
+            workingDirectory = self.tmpDir / 'job{0}'.format(index)
+            workingDirectory.mkdir()
+            listJob.append(submitter.submit('Job', 'true', workingDirectory,
+                                            resources))
+        for job in listJob:
+            self.assertEqual(job.wait(timeout=10), 0)
+        self.assertEqual(self.getNumberOfSbatchCalls(), 2)
+
+    def test_failedSubmission(self):
+        submitter = self.getSubmitter()
+        submitter.sbatch = 'false'
+        job = submitter.submit('Job', 'true', self.tmpDir,
+                               UtilsSlurm.getResources(None))
+        self.assertEqual(job.wait(timeout=10), 1)
+        self.assertIsNotNone(job.errorMessage)
+
+    def test_doSubmit(self):
+        self.getSubmitter(UtilsSlurm.getSubmitter())
+        task = EchoTask(inData={'message': 'Hello',
+                                'workingDirectory': str(self.tmpDir)})
+        # Thread executor: the submitter set up above is used
+        task.execute(executor=EXECUTOR_THREAD)
+        self.assertFalse(task.isFailure())
+        self.assertEqual(task.outData['log'], 'Hello')
+        self.assertEqual(task.outData['lines'], ['Hello'])
@@ -0,0 +1,118 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import os
+import sys
+import shutil
+import pathlib
+import tempfile
+import unittest
+import subprocess
+
+from edna2.utils import UtilsLogging
+from edna2.utils import UtilsTaskRegistry
+
+logger = UtilsLogging.getLogger()
+
+# Modules which must only be imported in the code paths needing them
+LIST_DEFERRED_MODULE = ['matplotlib', 'suds', 'h5py', 'fabio', 'requests']
+
+# CrystfelTasks depends on the autocryst library which needs numpy, h5py
+# and fabio at import
+LIST_EAGER_TASK_MODULE = ['CrystfelTasks']
+
+
+class UtilsTaskRegistryUnitTest(unittest.TestCase):
+
+    def test_indexUpToDate(self):
+        # If this test fails run: python -m edna2.utils.UtilsTaskRegistry
+        self.assertEqual(UtilsTaskRegistry.scanTasks(),
+                         UtilsTaskRegistry.getIndex())
+
+    def test_scanTasks(self):
+        tasksPath = pathlib.Path(tempfile.mkdtemp(prefix='UtilsTaskRegistry_'))
+        try:
+            (tasksPath / 'FirstTasks.py').write_text(
+                'from edna2.tasks import AbstractTask\n'
+                'class Helper(object):\n'
+                '    def run(self, inData):\n'
+                '        pass\n'
+                'class AbstractBaseTask(AbstractTask.AbstractTask):\n'
+                '    def run(self, inData):\n'
+                '        pass\n'
+                'class NoRunTask(AbstractTask.AbstractTask):\n'
+                '    pass\n')
+            (tasksPath / 'SecondTasks.py').write_text(
+                'from edna2.tasks.AbstractTask import AbstractTask\n'
+                'from FirstTasks import AbstractBaseTask, NoRunTask\n'
+                'class InheritedRunTask(AbstractBaseTask):\n'
+                '    pass\n'
+                'class RunTask(NoRunTask):\n'
+                '    def run(self, inData):\n'
+                '        pass\n')
+            self.assertEqual(UtilsTaskRegistry.scanTasks(tasksPath), {
+                'InheritedRunTask': 'SecondTasks',
+                'RunTask': 'SecondTasks'
+            })
+        finally:
+            shutil.rmtree(str(tasksPath), ignore_errors=True)
+
+    def test_getTaskClass(self):
+        TaskClass = UtilsTaskRegistry.getTaskClass('ControlDozor')
+        self.assertEqual(TaskClass.__name__, 'ControlDozor')
+        self.assertEqual(TaskClass.__module__, 'edna2.tasks.DozorTasks')
+        self.assertRaises(RuntimeError, UtilsTaskRegistry.getTaskClass,
+                          'NoSuchTask')
+
+    def test_importTime(self):
+        # Import all task modules with 'python -X importtime' and check
+        # that the heavy dependencies are not loaded
+        listModuleName = sorted(
+            set(UtilsTaskRegistry.getIndex().values()) -
+            set(LIST_EAGER_TASK_MODULE))
+        code = 'import importlib\n'
+        for moduleName in listModuleName:
+            code += "importlib.import_module('edna2.tasks.{0}')\n".format(
+                moduleName)
+        projectPath = pathlib.Path(__file__).parents[3]
+        env = dict(os.environ)
+        env['PYTHONPATH'] = str(projectPath)
+        pipes = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               cwd=str(projectPath), env=env)
+        self.assertEqual(pipes.returncode, 0, pipes.stderr.decode())
+        # Lines: 'import time: <self us> | <cumulative us> | <module>'
+        dictSelfTime = {}
+        for line in pipes.stderr.decode().splitlines():
+            if line.startswith('import time:') and '|' in line:
+                selfTime, _, name = line[len('import time:'):].split('|')
+                if selfTime.strip().isdigit():
+                    dictSelfTime[name.strip()] = int(selfTime)
+        listImported = sorted(name for name in dictSelfTime
+                              if name.split('.')[0] in LIST_DEFERRED_MODULE)
+        self.assertEqual(listImported, [])
+        totalTime = sum(dictSelfTime.values())
+        logger.info('Import time of the task modules: {0:.3f} s'.format(
+            totalTime / 1e6))
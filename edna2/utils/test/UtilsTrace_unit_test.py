@@ -0,0 +1,154 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import os
+import glob
+import json
+import shutil
+import pathlib
+import tempfile
+import unittest
+
+from edna2.tasks.AbstractTask import AbstractTask
+from edna2.tasks.AbstractTask import PERSIST_NONE
+from edna2.tasks.AbstractTask import EXECUTOR_INLINE
+from edna2.tasks.AbstractTask import EXECUTOR_THREAD
+from edna2.tasks.AbstractTask import EXECUTOR_PROCESS
+
+from edna2.tasks.HelloWorldTask import HelloWorldTask
+
+from edna2.utils import UtilsPath
+from edna2.utils import UtilsTrace
+
+
+class ChildTask(AbstractTask):
+
+    def run(self, inData):
+        self.runCommandLine('echo hello')
+        UtilsPath.waitForFile(self.getLogPath(), timeOut=1)
+        return {}
+
+
+class RootTask(AbstractTask):
+
+    def run(self, inData):
+        childTask = ChildTask(inData={
+            'workingDirectory': inData['workingDirectory']})
+        childTask.execute(executor=EXECUTOR_THREAD)
+        return {}
+
+
+class NoFileRootTask(AbstractTask):
+
+    def run(self, inData):
+        helloWorldTask = HelloWorldTask(inData={
+            'name': 'trace', 'workingDirectory': inData['childDirectory']})
+        helloWorldTask.setPersistInOutData(PERSIST_NONE)
+        helloWorldTask.execute(executor=EXECUTOR_INLINE)
+        return {}
+
+
+class UtilsTraceUnitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp(prefix='UtilsTrace_')
+        self.oldEdna2Config = os.environ.get('EDNA2_CONFIG', None)
+        self.oldEdna2Site = os.environ.get('EDNA2_SITE', None)
+        configPath = pathlib.Path(self.tmpDir) / 'trace_testconfig.ini'
+        configPath.write_text(
+            '[Trace]\nenabled = true\ndirectory = {0}\n'.format(self.tmpDir))
+        os.environ['EDNA2_CONFIG'] = self.tmpDir
+        os.environ['EDNA2_SITE'] = 'trace_testconfig'
+
+    def tearDown(self):
+        if self.oldEdna2Config is not None:
+            os.environ['EDNA2_CONFIG'] = self.oldEdna2Config
+        else:
+            del os.environ['EDNA2_CONFIG']
+        if self.oldEdna2Site is not None:
+            os.environ['EDNA2_SITE'] = self.oldEdna2Site
+        else:
+            del os.environ['EDNA2_SITE']
+        shutil.rmtree(self.tmpDir, ignore_errors=True)
+
+    def test_span(self):
+        # No current span: nothing recorded
+        with UtilsTrace.span('phase') as span:
+            self.assertIsNone(span)
+        self.assertIsNone(UtilsTrace.getCurrentContext())
+
+    def test_trace(self):
+        self.assertTrue(UtilsTrace.isEnabled())
+        task = RootTask(inData={'workingDirectory': self.tmpDir})
+        task.execute(executor=EXECUTOR_PROCESS)
+        self.assertTrue(task.isSuccess())
+        # Only the top-level task writes a trace
+        listTracePath = glob.glob(os.path.join(
+            self.tmpDir, '*', UtilsTrace.TRACE_FILE_NAME))
+        self.assertEqual(len(listTracePath), 1)
+        self.assertEqual(glob.glob(os.path.join(self.tmpDir, '*.jsonl')), [])
+        with open(listTracePath[0]) as f:
+            trace = json.load(f)
+        dictSpan = {}
+        for event in trace['traceEvents']:
+            if event['ph'] == 'X':
+                dictSpan.setdefault(event['name'], []).append(event)
+        for name in ['RootTask', 'ChildTask', 'validateInData',
+                     'createWorkingDirectory', 'command', 'waitForFile',
+                     'validateOutData', 'writeOutData']:
+            self.assertIn(name, dictSpan)
+        rootSpan = dictSpan['RootTask'][0]
+        childSpan = dictSpan['ChildTask'][0]
+        self.assertIsNone(rootSpan['args']['parentId'])
+        self.assertEqual(childSpan['args']['parentId'],
+                         rootSpan['args']['spanId'])
+        self.assertEqual(dictSpan['command'][0]['args']['parentId'],
+                         childSpan['args']['spanId'])
+        self.assertEqual(dictSpan['command'][0]['args']['command'], 'echo')
+        # The sub-task ran in another thread
+        self.assertEqual(
+            len([event for event in trace['traceEvents']
+                 if event['ph'] in ['s', 'f']]), 2)
+        self.assertGreaterEqual(childSpan['ts'], rootSpan['ts'])
+        self.assertLessEqual(childSpan['ts'] + childSpan['dur'],
+                             rootSpan['ts'] + rootSpan['dur'])
+        # The context was passed in inData
+        with open(os.path.join(os.path.dirname(listTracePath[0]),
+                               'inDataRootTask.json')) as f:
+            self.assertNotIn(UtilsTrace.TRACE_CONTEXT, json.load(f))
+        listInDataChild = glob.glob(os.path.join(
+            self.tmpDir, 'ChildTask_*', 'inDataChildTask.json'))
+        with open(listInDataChild[0]) as f:
+            self.assertIn(UtilsTrace.TRACE_CONTEXT, json.load(f))
+
+    def test_traceNoWorkingDirectory(self):
+        # A traced sub-task writing no files leaves no working directory
+        childDirectory = os.path.join(self.tmpDir, 'child')
+        os.mkdir(childDirectory)
+        task = NoFileRootTask(inData={'workingDirectory': self.tmpDir,
+                                      'childDirectory': childDirectory})
+        task.execute(executor=EXECUTOR_THREAD)
+        self.assertTrue(task.isSuccess())
+        self.assertEqual(os.listdir(childDirectory), [])
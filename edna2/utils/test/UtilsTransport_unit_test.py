@@ -0,0 +1,48 @@
+#
+# Copyright (c) European Synchrotron Radiation Facility (ESRF)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+# the Software, and to permit persons to whom the Software is furnished to do so,
+# subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+# FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+# COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+# IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+# CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+__authors__ = ["O. Svensson"]
+__license__ = "MIT"
+__date__ = "18/10/2026"
+
+import unittest
+
+from edna2.utils import UtilsTransport
+
+
+class UtilsTransportUnitTest(unittest.TestCase):
+
+    def test_packSmall(self):
+        data = b'{"results": "Hello world!"}'
+        message = UtilsTransport.pack(data)
+        self.assertEqual(message[0], UtilsTransport.TYPE_BYTES)
+        self.assertEqual(UtilsTransport.unpack(message), data)
+
+    @unittest.skipIf(UtilsTransport.shared_memory is None,
+                     'No multiprocessing.shared_memory available')
+    def test_packLarge(self):
+        data = b'0123456789' * 100000
+        message = UtilsTransport.pack(data, threshold=1000)
+        self.assertEqual(message[0], UtilsTransport.TYPE_SHARED_MEMORY)
+        self.assertEqual(UtilsTransport.unpack(message), data)
+        # The block is released after reading
+        with self.assertRaises(FileNotFoundError):
+            UtilsTransport.shared_memory.SharedMemory(name=message[1])